@@ -0,0 +1,225 @@
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import h5py
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import models
+
+from generate_datasets import TRANSFORMED_DATASET_NAMES
+from simulation.data.data_generator import to_model_input
+from simulation.data.executor import available_cpus
+from training import create_interpreter, dequantize_output, quantize_input
+
+#: The model files benchmarked in each model directory, from the least to the most quantized.
+MODEL_FILES = ["model.h5", "model.tflite", "model.quantized.tflite", "model.int8.tflite"]
+
+#: The benchmarked batch sizes: a single cell, a row of a Sudoku, a whole Sudoku and a training batch.
+BATCH_SIZES = (1, 9, 81, 256)
+
+#: The number of cells in a Sudoku, which are classified for each frame.
+CELLS_PER_FRAME = 81
+
+
+def load_cells(count: int, name=TRANSFORMED_DATASET_NAMES[-1]) -> np.ndarray:
+    """
+    Load real Sudoku cells from the test split of a dataset HDF5 file as model input. If the dataset has fewer cells,
+    they are repeated.
+
+    Args:
+        count(int): The number of cells.
+        name(str): The dataset file name without extension. (Default value = "validation_real_dataset")
+
+    Returns:
+        :py:class:`numpy.ndarray`: The cells as normalized float array of shape (count, 28, 28, 1).
+
+    """
+    with h5py.File(f"datasets/{name}.hdf5", "r") as f:
+        cells = f["test_x"][:count]
+    cells = np.resize(cells, (count,) + cells.shape[1:])
+    return to_model_input(cells)
+
+
+def keras_runner(path: str) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Create a function which runs a Keras model on a batch.
+
+    Args:
+        path(str): The path of the Keras model file.
+
+    Returns:
+        Callable[[numpy.ndarray], numpy.ndarray]: The function.
+
+    """
+    model = models.load_model(path, compile=False)
+    return lambda x: model.predict_on_batch(x)
+
+
+def tflite_runner(path: str, num_threads: int) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Create a function which runs a tf.lite model on a batch. The input tensor is resized when the batch size changes,
+    integer models are fed quantized input.
+
+    Args:
+        path(str): The path of the tf.lite model file.
+        num_threads(int): The number of interpreter threads.
+
+    Returns:
+        Callable[[numpy.ndarray], numpy.ndarray]: The function.
+
+    """
+    with open(path, "rb") as f:
+        interpreter = create_interpreter(f.read(), num_threads)
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()[0]
+    current_size = [0]
+
+    def run(x: np.ndarray) -> np.ndarray:
+        if x.shape[0] != current_size[0]:
+            interpreter.resize_tensor_input(input_details["index"], list(x.shape))
+            interpreter.allocate_tensors()
+            current_size[0] = x.shape[0]
+        interpreter.set_tensor(input_details["index"], quantize_input(x, input_details))
+        interpreter.invoke()
+        return dequantize_output(interpreter.get_tensor(output_details["index"]), output_details)
+
+    return run
+
+
+def measure(run: Callable[[np.ndarray], np.ndarray], x: np.ndarray, repeats=100, warmup=10) -> Dict[str, float]:
+    """
+    Measure the latency of running a model on a batch.
+
+    Args:
+        run(Callable[[numpy.ndarray], numpy.ndarray]): The function running the model.
+        x(:py:class:`numpy.ndarray`): The batch.
+        repeats(int): The number of measured runs. (Default value = 100)
+        warmup(int): The number of runs before measuring. (Default value = 10)
+
+    Returns:
+        dict[str, float]: The median and 99th percentile latency in milliseconds and the throughput in images per
+            second.
+
+    """
+    for _ in range(warmup):
+        run(x)
+    durations = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        run(x)
+        durations[i] = time.perf_counter() - start
+    return {
+        'p50_ms': float(np.percentile(durations, 50) * 1e3),
+        'p99_ms': float(np.percentile(durations, 99) * 1e3),
+        'throughput': float(x.shape[0] / durations.mean())
+    }
+
+
+def benchmark(
+        path: str,
+        batch_sizes: Sequence[int] = BATCH_SIZES,
+        threads: Optional[Sequence[int]] = None,
+        repeats=100
+) -> List[dict]:
+    """
+    Benchmark all models in a model directory on real cells. tf.lite models are measured for each thread count, the
+    Keras model only with the default TensorFlow threading, as it can not be changed after TensorFlow is initialized.
+
+    Args:
+        path(str): The model directory, as created by ``train_cnn`` or ``train_binary_model``.
+        batch_sizes(Sequence[int]): The batch sizes. (Default value = BATCH_SIZES)
+        threads(Sequence[int], optional): The interpreter thread counts. If None, use 1 up to the number of available
+            CPUs. (Default value = None)
+        repeats(int): The number of measured runs per configuration. (Default value = 100)
+
+    Returns:
+        list[dict]: One result per model, batch size and thread count.
+
+    """
+    threads = threads if threads is not None else range(1, available_cpus() + 1)
+    cells = load_cells(max(batch_sizes))
+    results = []
+    for file_name in MODEL_FILES:
+        model_path = os.path.join(path, file_name)
+        if not os.path.exists(model_path):
+            continue
+        if file_name.endswith(".h5"):
+            runners = [(None, keras_runner(model_path))]
+        else:
+            runners = [(num_threads, tflite_runner(model_path, num_threads)) for num_threads in threads]
+        for num_threads, run in runners:
+            for batch_size in batch_sizes:
+                result = measure(run, cells[:batch_size], repeats)
+                result.update(model=file_name, batch_size=batch_size, threads=num_threads)
+                results.append(result)
+                print(f"{path} {file_name} batch {batch_size} threads {num_threads}: {result['p50_ms']:.2f}ms p50, "
+                      f"{result['p99_ms']:.2f}ms p99, {result['throughput']:.0f} images/s")
+    return results
+
+
+def select_model(results: List[dict], budget_ms: float) -> Optional[dict]:
+    """
+    Select the least quantized tf.lite model which classifies the cells of a frame in one batch within the budget at
+    the 99th percentile, using the fewest threads. The Keras model is only benchmarked as reference.
+
+    Args:
+        results(list[dict]): The results of :py:func:`benchmark`.
+        budget_ms(float): The latency budget per frame in milliseconds.
+
+    Returns:
+        Optional[dict]: The result of the selected configuration, None if no configuration meets the budget.
+
+    """
+    candidates = [result for result in results
+                  if result['batch_size'] == CELLS_PER_FRAME and result['p99_ms'] <= budget_ms
+                  and result['model'].endswith(".tflite")]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda result: (MODEL_FILES.index(result['model']), result['threads']))
+
+
+def write_report(path: str, results: List[dict], budget_ms: float):
+    """
+    Write the benchmark results of a model directory as ``benchmark.json`` and ``benchmark.md`` into the directory.
+
+    Args:
+        path(str): The model directory.
+        results(list[dict]): The results of :py:func:`benchmark`.
+        budget_ms(float): The latency budget per frame in milliseconds.
+
+    Returns:
+        None
+
+    """
+    selected = select_model(results, budget_ms)
+    with open(os.path.join(path, "benchmark.json"), "w") as f:
+        json.dump({'budget_ms': budget_ms, 'selected': selected, 'results': results}, f, indent=2)
+
+    lines = [
+        f"# Inference benchmark: {path}",
+        "",
+        "| Model | Batch size | Threads | p50 (ms) | p99 (ms) | Throughput (images/s) |",
+        "|---|---:|---:|---:|---:|---:|"
+    ]
+    for result in results:
+        lines.append(f"| {result['model']} | {result['batch_size']} | {result['threads'] or 'default'} | "
+                     f"{result['p50_ms']:.2f} | {result['p99_ms']:.2f} | {result['throughput']:.0f} |")
+    lines.append("")
+    if selected is not None:
+        lines.append(f"Selected for the budget of {budget_ms:.1f} ms per {CELLS_PER_FRAME} cells: "
+                     f"{selected['model']} with {selected['threads']} threads ({selected['p99_ms']:.2f} ms p99).")
+    else:
+        lines.append(f"No model meets the budget of {budget_ms:.1f} ms per {CELLS_PER_FRAME} cells.")
+    with open(os.path.join(path, "benchmark.md"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+if __name__ == '__main__':
+    tf.get_logger().setLevel('ERROR')
+    budget = 1000 / 30  # ms per frame at 30 fps
+    for model_path in ["model_simple_finetuning/", "model_full_finetuning/", "model_empty_finetuning/",
+                       "model_hand_finetuning/"]:
+        if os.path.isdir(model_path):
+            write_report(model_path, benchmark(model_path), budget)
@@ -0,0 +1,148 @@
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import tensorflow as tf
+
+from benchmark import CELLS_PER_FRAME, tflite_runner
+from generate_datasets import load_datasets, TRANSFORMED_DATASET_NAMES
+from simulation.data.data_generator import BaseDataGenerator, SimpleDataGenerator
+from simulation.data.executor import available_cpus
+
+#: A function which runs a model on a batch of model input and returns its output.
+Predictor = Callable[[np.ndarray], np.ndarray]
+
+
+def bucketed(factory: Callable[[], Predictor], bucket=9) -> Predictor:
+    """
+    Wrap a model so it is only run on a few batch sizes. The input is padded to a multiple of the bucket size and each
+    padded size gets its own predictor, so a tf.lite interpreter never reallocates its tensors for a new batch size.
+
+    Args:
+        factory(Callable[[], Predictor]): A function which creates a new predictor.
+        bucket(int): The padded batch sizes are multiples of this. (Default value = 9)
+
+    Returns:
+        Predictor: The wrapped model.
+
+    """
+    predictors: Dict[int, Predictor] = {}
+
+    def predict(x: np.ndarray) -> np.ndarray:
+        count = x.shape[0]
+        size = -(-count // bucket) * bucket
+        if size not in predictors:
+            predictors[size] = factory()
+        if size != count:
+            x = np.concatenate([x, np.zeros((size - count,) + x.shape[1:], dtype=x.dtype)])
+        return predictors[size](x)[:count]
+
+    return predict
+
+
+class CascadePredictor:
+    """
+    Classifies Sudoku cells with a cascade of two models. The small binary empty model runs on all cells of a frame in
+    one batch. Only the cells it does not detect as empty are passed to the digit model, which is much larger. As most
+    cells of a Sudoku are empty, this saves most of the digit model's work.
+    """
+
+    def __init__(self, empty_model: Predictor, digit_model: Predictor, empty_threshold=0.5, empty_class=0):
+        """
+
+
+        Args:
+            empty_model(Predictor): The binary model, which outputs the probability of a cell being empty.
+            digit_model(Predictor): The digit model, which outputs a score for each class.
+            empty_threshold(float): Cells with an empty probability of at least this value are classified as empty
+                without running the digit model. (Default value = 0.5)
+            empty_class(int): The class of empty cells in the digit model. (Default value = 0)
+
+        """
+        self.empty_model = empty_model
+        self.digit_model = digit_model
+        self.empty_threshold = empty_threshold
+        self.empty_class = empty_class
+
+    def predict(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Classify cells.
+
+        Args:
+            cells(:py:class:`numpy.ndarray`): The cells as model input, usually the 81 cells of a frame.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The class of each cell.
+
+        """
+        empty = self.empty_model(cells).reshape(-1) >= self.empty_threshold
+        labels = np.full(cells.shape[0], self.empty_class, dtype=np.int64)
+        if not empty.all():
+            labels[~empty] = np.argmax(self.digit_model(cells[~empty]), axis=-1)
+        return labels
+
+
+def compare_with_full_model(cascade: CascadePredictor, test_generator: BaseDataGenerator) -> Dict[str, float]:
+    """
+    Compare the cascade with running the digit model on every cell. Each batch of the generator is classified as one
+    frame by both.
+
+    Both models are warmed up with every batch size up to the batch size of the generator before, so the creation of
+    predictors by :py:func:`bucketed` and other first-use costs are not timed.
+
+    Args:
+        cascade(CascadePredictor): The cascade.
+        test_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator for test files,
+            the batch size should be the number of cells per frame.
+
+    Returns:
+        dict[str, float]: The accuracy and mean latency per frame of both, and the fraction of skipped cells.
+
+    """
+    correct = {'cascade': 0, 'full': 0}
+    durations: Dict[str, List[float]] = {'cascade': [], 'full': []}
+    count, skipped = 0, 0
+    # Warm up every batch size the cascade can pass to the models
+    cells = test_generator[0][0]
+    for size in range(1, cells.shape[0] + 1):
+        cascade.empty_model(cells[:size])
+        cascade.digit_model(cells[:size])
+
+    for index in range(len(test_generator)):
+        cells, labels = test_generator[index]
+        start = time.perf_counter()
+        full = np.argmax(cascade.digit_model(cells), axis=-1)
+        durations['full'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        predicted = cascade.predict(cells)
+        durations['cascade'].append(time.perf_counter() - start)
+
+        correct['full'] += int(np.sum(full == labels))
+        correct['cascade'] += int(np.sum(predicted == labels))
+        skipped += int(np.sum(cascade.empty_model(cells).reshape(-1) >= cascade.empty_threshold))
+        count += labels.shape[0]
+
+    result = {f"{name}_accuracy": correct[name] / max(1, count) for name in correct}
+    result.update({f"{name}_latency_ms": float(np.mean(durations[name]) * 1e3) for name in durations})
+    result['skipped_cells'] = skipped / max(1, count)
+    result['latency_saving'] = 1 - result['cascade_latency_ms'] / result['full_latency_ms']
+    return result
+
+
+if __name__ == '__main__':
+    tf.get_logger().setLevel('ERROR')
+    num_threads = available_cpus()
+    validation = load_datasets([TRANSFORMED_DATASET_NAMES[-1]])[0]
+    test_generator = SimpleDataGenerator(
+        validation.test,
+        batch_size=CELLS_PER_FRAME,
+        shuffle=False,
+        to_simple_digit=True
+    )
+    cascade = CascadePredictor(
+        bucketed(lambda: tflite_runner("model_empty_finetuning/model.tflite", num_threads), CELLS_PER_FRAME),
+        bucketed(lambda: tflite_runner("model_simple_finetuning/model.tflite", num_threads))
+    )
+    for name, value in compare_with_full_model(cascade, test_generator).items():
+        print(f"{name}: {value:.4f}")
@@ -0,0 +1,190 @@
+import os
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import Model
+from tensorflow.keras import models
+
+from generate_datasets import load_datasets, save_datsets, TRANSFORMED_DATASET_NAMES
+from simulation.data.data_generator import to_model_input
+from simulation.data.dataset import CharacterDataset, CLASS_OUT
+from training import configure_devices, train_cnn
+
+#: The file names of the mined synthetic datasets, followed by the unchanged real datasets.
+MINED_DATASET_NAMES = [f"{name}_mined" for name in TRANSFORMED_DATASET_NAMES[:3]] + TRANSFORMED_DATASET_NAMES[3:]
+
+
+class MiningResult(NamedTuple):
+    """The result of :py:func:`select_hard_examples`."""
+    #: The indices of the kept samples in ascending order.
+    indices: np.ndarray
+    #: The number of misclassified samples.
+    misclassified: int
+    #: The number of correctly classified samples with a margin below the threshold.
+    low_margin: int
+    #: The number of samples kept from the remaining easy samples.
+    random: int
+
+
+def score_samples(
+        model: Model,
+        x: np.ndarray,
+        y: np.ndarray,
+        to_simple_digit=False,
+        batch_size=4096
+) -> np.ndarray:
+    """
+    Score samples with a trained model in large batches. The score of a sample is its margin: the probability of the
+    true class minus the highest probability of any other class. It is negative for misclassified samples.
+
+    Args:
+        model(Model): The trained model, which outputs logits.
+        x(:py:class:`numpy.ndarray`): The uint8 images.
+        y(:py:class:`numpy.ndarray`): The class labels of the 20 dataset classes.
+        to_simple_digit(bool): If True, the model classifies simple 9 + 1 class digits. Samples of the 'out' class
+            can not be scored then and get a margin of 1. (Default value = False)
+        batch_size(int): The number of images per model invocation. (Default value = 4096)
+
+    Returns:
+        :py:class:`numpy.ndarray`: The margin of each sample.
+
+    """
+    labels = y.astype(np.int64)
+    if to_simple_digit:
+        labels = np.where(labels > CLASS_OUT, labels - 10, np.where(labels == CLASS_OUT, -1, labels))
+    margins = np.ones(y.shape[0], dtype=np.float32)
+    for start in range(0, y.shape[0], batch_size):
+        batch = slice(start, start + batch_size)
+        probabilities = tf.nn.softmax(model.predict_on_batch(to_model_input(x[batch]))).numpy()
+        batch_labels = labels[batch]
+        rows = np.flatnonzero((batch_labels >= 0) & (batch_labels < probabilities.shape[1]))
+        true = probabilities[rows, batch_labels[rows]]
+        probabilities[rows, batch_labels[rows]] = -1
+        margins[start + rows] = true - probabilities[rows].max(axis=1)
+    return margins
+
+
+def select_hard_examples(
+        y: np.ndarray,
+        margins: np.ndarray,
+        margin_threshold=0.5,
+        random_fraction=0.1,
+        rng: Optional[np.random.Generator] = None
+) -> MiningResult:
+    """
+    Select the hard examples of a dataset: all misclassified samples and all samples with a margin below the
+    threshold. A random remainder of the easy samples is kept too, stratified by class, so the class distribution of
+    the easy samples is preserved and no class disappears from the dataset.
+
+    Args:
+        y(:py:class:`numpy.ndarray`): The class labels.
+        margins(:py:class:`numpy.ndarray`): The margins, as returned by :py:func:`score_samples`.
+        margin_threshold(float): Samples with a lower margin are kept. (Default value = 0.5)
+        random_fraction(float): The fraction of the easy samples of each class to keep. At least one sample of each
+            class is kept. (Default value = 0.1)
+        rng(:py:class:`numpy.random.Generator`, optional): The random generator. If None, use a generator seeded
+            with 0. (Default value = None)
+
+    Returns:
+        MiningResult: The kept indices and their composition.
+
+    """
+    rng = rng if rng is not None else np.random.default_rng(0)
+    hard = margins < margin_threshold
+    keep = hard.copy()
+    for cls in np.unique(y):
+        easy = np.flatnonzero(~hard & (y == cls))
+        if easy.shape[0] > 0:
+            count = max(1, int(round(random_fraction * easy.shape[0])))
+            keep[rng.choice(easy, count, replace=False)] = True
+    misclassified = int(np.sum(margins < 0))
+    return MiningResult(
+        indices=np.flatnonzero(keep),
+        misclassified=misclassified,
+        low_margin=int(np.sum(hard)) - misclassified,
+        random=int(np.sum(keep & ~hard))
+    )
+
+
+def mine_dataset(
+        model: Model,
+        dataset: CharacterDataset,
+        to_simple_digit=False,
+        margin_threshold=0.5,
+        random_fraction=0.1,
+        seed=0
+) -> CharacterDataset:
+    """
+    Reduce the training split of a dataset to its hard examples, see :py:func:`select_hard_examples`. The test split is
+    kept unchanged, so the validation during training stays comparable.
+
+    Args:
+        model(Model): The trained model, which outputs logits.
+        dataset(:py:class:`simulation.data.dataset.CharacterDataset`): The dataset.
+        to_simple_digit(bool): If True, the model classifies simple 9 + 1 class digits. (Default value = False)
+        margin_threshold(float): Samples with a lower margin are kept. (Default value = 0.5)
+        random_fraction(float): The fraction of the easy samples of each class to keep. (Default value = 0.1)
+        seed(int): The seed for choosing the easy samples. (Default value = 0)
+
+    Returns:
+        :py:class:`simulation.data.dataset.CharacterDataset`: The reduced dataset.
+
+    """
+    margins = score_samples(model, dataset.train_x, dataset.train_y, to_simple_digit)
+    result = select_hard_examples(dataset.train_y, margins, margin_threshold, random_fraction,
+                                  np.random.default_rng(seed))
+    print(f"Kept {result.indices.shape[0]} of {margins.shape[0]} samples: {result.misclassified} misclassified, "
+          f"{result.low_margin} low margin, {result.random} random")
+
+    mined = CharacterDataset(dataset.resolution)
+    mined.train_x = dataset.train_x[result.indices]
+    mined.train_y = dataset.train_y[result.indices]
+    mined.test_x = dataset.test_x
+    mined.test_y = dataset.test_y
+    return mined
+
+
+def mine_datasets(
+        model_path="model_full_finetuning/model.h5",
+        to_simple_digit=False,
+        margin_threshold=0.5,
+        random_fraction=0.1,
+        seed=0
+) -> Dict[str, int]:
+    """
+    Mine the synthetic transformed datasets with a trained model and save the reduced datasets under the names in
+    :py:data:`MINED_DATASET_NAMES`.
+
+    Args:
+        model_path(str): The path of the trained Keras model. (Default value = "model_full_finetuning/model.h5")
+        to_simple_digit(bool): If True, the model classifies simple 9 + 1 class digits. (Default value = False)
+        margin_threshold(float): Samples with a lower margin are kept. (Default value = 0.5)
+        random_fraction(float): The fraction of the easy samples of each class to keep. (Default value = 0.1)
+        seed(int): The seed for choosing the easy samples. (Default value = 0)
+
+    Returns:
+        dict[str, int]: The number of training samples of each mined dataset.
+
+    """
+    model = models.load_model(model_path, compile=False)
+    sizes = {}
+    for name, mined_name in zip(TRANSFORMED_DATASET_NAMES[:3], MINED_DATASET_NAMES[:3]):
+        print(f"Mining {name}..")
+        dataset = load_datasets([name])[0]
+        mined = mine_dataset(model, dataset, to_simple_digit, margin_threshold, random_fraction, seed)
+        save_datsets([(mined, mined_name)])
+        sizes[mined_name] = mined.train_y.shape[0]
+    return sizes
+
+
+if __name__ == '__main__':
+    tf.get_logger().setLevel('ERROR')
+    configure_devices()
+    if not all(os.path.exists(f"datasets/{name}.hdf5") for name in MINED_DATASET_NAMES):
+        print(mine_datasets("model_full_finetuning/model.h5"))
+    for name in MINED_DATASET_NAMES[:3]:
+        print(name, np.bincount(load_datasets([name])[0].train_y.astype(np.int64), minlength=20).tolist())
+
+    # The next training round on the mined datasets, evaluated on the real validation dataset as before
+    train_cnn("model_full_mined/", False, dataset_names=MINED_DATASET_NAMES)
@@ -0,0 +1,223 @@
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import tensorflow.keras as keras
+from tensorflow.keras import Model, Sequential
+from tensorflow.keras import layers
+
+
+class PruningSchedule(NamedTuple):
+    """
+    The schedule of structured pruning: the pruned fraction of channels and units of each layer grows polynomially
+    from 0 to the target fraction, from the beginning of *begin_epoch* until the end of *end_epoch* - 1.
+    """
+    #: The final fraction of pruned channels and units of each layer.
+    target: float = 0.5
+    #: The first pruning epoch.
+    begin_epoch: int = 0
+    #: The end of the schedule, the target fraction is pruned from epoch *end_epoch* - 1 on.
+    end_epoch: int = 5
+
+    def fraction(self, epoch: int) -> float:
+        """
+        Get the pruned fraction of an epoch.
+
+        Args:
+            epoch(int): The epoch.
+
+        Returns:
+            float: The fraction of channels and units to prune.
+
+        """
+        progress = np.clip((epoch - self.begin_epoch + 1) / max(1, self.end_epoch - self.begin_epoch), 0, 1)
+        return self.target * (1 - (1 - progress) ** 3)
+
+    @property
+    def epochs(self) -> int:
+        """
+        The number of epochs until the target fraction has been pruned and finetuned for one epoch. Early stopping must
+        not stop the training or restore weights before.
+
+        Returns:
+            int: The minimum number of pruning epochs.
+
+        """
+        return self.begin_epoch + max(1, self.end_epoch - self.begin_epoch)
+
+
+def prunable_layers(model: Model) -> List[int]:
+    """
+    Get the indices of the layers of a Sequential model which can be pruned: all convolutions and dense layers, except
+    for the output layer.
+
+    Args:
+        model(Model): The model.
+
+    Returns:
+        list[int]: The layer indices.
+
+    """
+    indices = [i for i, layer in enumerate(model.layers)
+               if type(layer) in (layers.Conv2D, layers.Dense)]
+    return indices[:-1] if indices and type(model.layers[indices[-1]]) is layers.Dense else indices
+
+
+def channel_norms(model: Model, index: int) -> np.ndarray:
+    """
+    Get the L1 norm of the kernel of each output channel or unit of a layer.
+
+    Args:
+        model(Model): The model.
+        index(int): The index of a convolution or dense layer.
+
+    Returns:
+        :py:class:`numpy.ndarray`: The norm of each output channel.
+
+    """
+    kernel = model.layers[index].get_weights()[0]
+    return np.abs(kernel).reshape(-1, kernel.shape[-1]).sum(axis=0)
+
+
+class ChannelPruning(keras.callbacks.Callback):
+    """
+    A callback which prunes the channels of the convolutions and the units of the dense layers of a Sequential model
+    with the lowest L1 kernel norm, following a :py:class:`PruningSchedule`. Pruned channels are masked: their kernel,
+    bias and the parameters of a directly following batch normalization are set to zero after each batch, so they
+    output zeros and :py:func:`strip_pruned` can remove them without changing the model output.
+
+    The model must be trained for at least :py:attr:`PruningSchedule.epochs` epochs without early stopping, e.g. with
+    the *min_epochs* of :py:func:`fit_resumable <training.fit_resumable>`, so the last pruning step is finetuned.
+    Otherwise, the target fraction is not reached.
+    """
+
+    def __init__(self, schedule: PruningSchedule):
+        """
+
+
+        Args:
+            schedule(PruningSchedule): The pruning schedule.
+
+        """
+        super().__init__()
+        self.schedule = schedule
+        self.masks: Dict[int, np.ndarray] = {}
+
+    def update_masks(self, fraction: float):
+        """
+        Prune the given fraction of channels of each prunable layer, which includes the already pruned channels.
+
+        Args:
+            fraction(float): The fraction of channels and units to prune.
+
+        Returns:
+            None
+
+        """
+        self.masks = {}
+        for index in prunable_layers(self.model):
+            norms = channel_norms(self.model, index)
+            count = min(int(fraction * norms.shape[0]), norms.shape[0] - 1)
+            mask = np.ones(norms.shape[0], dtype=bool)
+            mask[np.argsort(norms, kind='stable')[:count]] = False
+            self.masks[index] = mask
+        self.apply_masks()
+
+    def apply_masks(self):
+        """
+        Set the parameters of the pruned channels to zero.
+
+        Returns:
+            None
+
+        """
+        for index, mask in self.masks.items():
+            layer = self.model.layers[index]
+            layer.set_weights([weight * mask for weight in layer.get_weights()])
+            following = self.model.layers[index + 1]
+            if isinstance(following, layers.BatchNormalization):
+                # With zero gamma and beta, the moving statistics do not matter
+                gamma, beta, *statistics = following.get_weights()
+                following.set_weights([gamma * mask, beta * mask] + statistics)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        fraction = self.schedule.fraction(epoch)
+        if fraction > 0:
+            self.update_masks(fraction)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.apply_masks()
+
+    def on_epoch_end(self, epoch, logs=None):
+        if logs is not None:
+            logs['pruned'] = self.schedule.fraction(epoch)
+
+
+def strip_pruned(model: Sequential) -> Sequential:
+    """
+    Physically remove the pruned channels and units from a Sequential model, creating a smaller model with the same
+    output. A channel is removed if its kernel, bias and batch normalization parameters are all zero, so its output is
+    zero after the activation. The inputs of the following layers are sliced accordingly.
+
+    Supports the layer types of the models in :py:doc:`training.py <training.training.py>` and
+    :py:doc:`training_binary.py <training.training_binary.py>`. The convolutions must be channels last and all
+    activations of pruned layers must map zero to zero.
+
+    Args:
+        model(Sequential): The pruned model, e.g. by :py:class:`ChannelPruning`.
+
+    Returns:
+        Sequential: The model without the pruned channels.
+
+    """
+    prunable = set(prunable_layers(model))
+    keep = np.arange(model.input_shape[-1])
+    stripped = Sequential()
+    stripped.add(layers.InputLayer(input_shape=model.input_shape[1:]))
+    weights = []
+    for index, layer in enumerate(model.layers):
+        config = layer.get_config()
+        config.pop('batch_input_shape', None)
+        layer_weights = layer.get_weights()
+        if type(layer) in (layers.Conv2D, layers.Dense):
+            kernel = np.take(layer_weights[0], keep, axis=-2)
+            layer_weights = [kernel] + layer_weights[1:]
+            if index in prunable:
+                following = model.layers[index + 1]
+                parameters = [np.abs(weight).reshape(-1, weight.shape[-1]).sum(axis=0) for weight in layer_weights]
+                if isinstance(following, layers.BatchNormalization):
+                    parameters += [np.abs(weight) for weight in following.get_weights()[:2]]
+                keep = np.flatnonzero(np.sum(parameters, axis=0) > 0)
+                layer_weights = [weight[..., keep] for weight in layer_weights]
+                config['filters' if isinstance(layer, layers.Conv2D) else 'units'] = keep.shape[0]
+        elif isinstance(layer, layers.BatchNormalization):
+            layer_weights = [weight[keep] for weight in layer_weights]
+        elif isinstance(layer, layers.Flatten):
+            height, width, channels = layer.input_shape[1:]
+            keep = np.arange(height * width * channels).reshape(height, width, channels)[..., keep].ravel()
+        elif not isinstance(layer, (layers.Activation, layers.MaxPooling2D, layers.Dropout)):
+            raise ValueError(f"Can not strip pruned channels from a {type(layer).__name__} layer!")
+        stripped.add(type(layer).from_config(config))
+        weights.append(layer_weights)
+    for layer, layer_weights in zip(stripped.layers, weights):
+        layer.set_weights(layer_weights)
+    return stripped
+
+
+def max_output_difference(original: Model, stripped: Model, probe: Optional[np.ndarray] = None) -> float:
+    """
+    Compare the outputs of a stripped model and the masked model it was stripped from, which should be the same.
+
+    Args:
+        original(Model): The masked model.
+        stripped(Model): The stripped model.
+        probe(:py:class:`numpy.ndarray`, optional): The model input to compare on. If None, use random images.
+            (Default value = None)
+
+    Returns:
+        float: The maximum absolute difference of the outputs.
+
+    """
+    if probe is None:
+        probe = np.random.random((32,) + tuple(original.input_shape[1:])).astype(np.float32)
+    difference = np.asarray(original.predict_on_batch(probe)) - np.asarray(stripped.predict_on_batch(probe))
+    return float(np.max(np.abs(difference)))
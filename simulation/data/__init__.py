@@ -1,12 +1,20 @@
+from .batch_server import BatchServer
 from .character_renderer import CharacterRenderer, SingleFontCharacterRenderer
-from .data_generator import BalancedDataGenerator, SimpleDataGenerator
+from .data_generator import BalancedDataGenerator, ClassBalancedDataGenerator, SimpleDataGenerator, ToBinaryGenerator
 from .dataset import CharacterDataset, MNIST, FilteredMNIST, ClassSeparateMNIST, CuratedCharactersDataset, \
     ClassSeparateCuratedCharactersDataset, PrerenderedDigitDataset, PrerenderedCharactersDataset, ConcatDataset, \
     EmptyDataset, RealDataset, RealValidationDataset
+from .executor import Executor, SerialExecutor, ThreadExecutor, ProcessExecutor, set_default_executor, \
+    get_default_executor
+from .sampler import AliasTable, ClassBalancedSampler, block_shuffle
+from .view import DatasetView
 
 __all__ = [
     'CharacterRenderer', 'SingleFontCharacterRenderer', 'BalancedDataGenerator',
-    'SimpleDataGenerator', 'CharacterDataset', 'MNIST', 'FilteredMNIST', 'ClassSeparateMNIST',
+    'SimpleDataGenerator', 'ToBinaryGenerator', 'CharacterDataset', 'MNIST', 'FilteredMNIST', 'ClassSeparateMNIST',
     'CuratedCharactersDataset', 'ClassSeparateCuratedCharactersDataset', 'PrerenderedDigitDataset',
-    'PrerenderedCharactersDataset', 'ConcatDataset', 'EmptyDataset', 'RealDataset', 'RealValidationDataset'
+    'PrerenderedCharactersDataset', 'ConcatDataset', 'EmptyDataset', 'RealDataset', 'RealValidationDataset',
+    'Executor', 'SerialExecutor', 'ThreadExecutor', 'ProcessExecutor', 'set_default_executor', 'get_default_executor',
+    'DatasetView', 'ClassBalancedDataGenerator', 'AliasTable', 'ClassBalancedSampler',
+    'BatchServer', 'block_shuffle'
 ]
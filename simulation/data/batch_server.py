@@ -0,0 +1,319 @@
+"""
+A multi-process batch server for the data generators.
+
+Keras' ``workers``/``use_multiprocessing`` options pickle each batch back to the training process and do not keep the
+epoch state of the workers in sync. The :py:class:`BatchServer` instead forks worker processes which inherit the
+generator and the datasets, and which write finished batches into a ring buffer in shared memory. The training process
+only receives the index of the filled slot and reads the batch without copying it.
+
+The workers do not need to be notified of the end of an epoch: each request carries the generator state (seed, epoch
+and cursor), from which the workers recreate the sample order of the epoch.
+"""
+
+import multiprocessing as mp
+import queue
+import traceback
+import warnings
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from simulation.data.data_generator import BaseDataGenerator
+from simulation.data.executor import available_cpus, shared_empty
+
+#: A function applied to each batch of model input in the workers.
+Augmentation = Callable[[np.ndarray], np.ndarray]
+
+
+class BatchServer(BaseDataGenerator):
+    """
+    Serves the batches of a generator, which are prepared ahead of time by a pool of forked worker processes.
+
+    The server is a generator itself and can be used in place of the wrapped generator, including its state handling.
+    Batches are prefetched in order, so they should be requested in order too (``shuffle=False`` in ``model.fit``).
+    Requesting another batch is possible, but discards all prefetched batches.
+
+    The returned arrays are views of the ring buffer. They are only valid until the next batch is requested. The worker
+    processes are stopped by :py:meth:`close`, or by using the server as context manager.
+
+    """
+
+    def __init__(
+            self,
+            generator: BaseDataGenerator,
+            workers: Optional[int] = None,
+            slots: Optional[int] = None,
+            augment: Optional[Augmentation] = None
+    ):
+        """
+
+
+        Args:
+            generator(BaseDataGenerator): The generator to serve the batches of. Must have a ``batch_size``.
+            workers(int, optional): The number of worker processes. If None, use all available CPUs.
+                (Default value = None)
+            slots(int, optional): The number of slots of the ring buffer, at least 2. One slot holds the current batch,
+                the others are prefetched. If None, use twice the number of workers. (Default value = None)
+            augment(Callable[[numpy.ndarray], numpy.ndarray], optional): A function applied to each batch of model
+                input in the workers. The global numpy random state is seeded per batch from the generator state, so
+                the augmentation is reproducible. (Default value = None)
+
+        """
+        self.generator = generator
+        self.augment = augment
+        self.workers = workers if workers is not None else available_cpus()
+        self.slots = max(2, slots if slots is not None else 2 * self.workers)
+
+        self.processes: List[mp.Process] = []
+        self.fork = 'fork' in mp.get_all_start_methods()
+        if not self.fork:
+            warnings.warn("Forking is not supported on this platform, serving batches from the training process.")
+            return
+
+        # Allocate the ring buffer from the shape of the first batch
+        x, y = generator[0]
+        batch_size = generator.batch_size
+        self.x_ring = shared_empty((self.slots, batch_size) + x.shape[1:], x.dtype)
+        self.y_ring = shared_empty((self.slots, batch_size) + y.shape[1:], y.dtype)
+        self.sizes = shared_empty((self.slots,), np.int64)
+
+        context = mp.get_context('fork')
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.processes = [
+            context.Process(target=_serve, args=(generator, augment, self.tasks, self.results, self.x_ring,
+                                                 self.y_ring, self.sizes), daemon=True)
+            for _ in range(self.workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+        self.free: List[int] = list(range(self.slots))
+        #: The slots of all requested batches which are not finished yet.
+        self.pending: Dict[int, int] = {}
+        #: The slots of all finished batches which were not served yet.
+        self.ready: Dict[int, int] = {}
+        self.held: Optional[int] = None
+        self.next_index = 0
+
+    @property
+    def seed(self) -> int:
+        return self.generator.seed
+
+    @property
+    def epoch(self) -> int:
+        return self.generator.epoch
+
+    @property
+    def cursor(self) -> int:
+        return self.generator.cursor
+
+    @property
+    def num_batches(self) -> int:
+        return self.generator.num_batches
+
+    @property
+    def num_classes(self) -> int:
+        """The number of classes of the wrapped generator."""
+        return self.generator.num_classes
+
+    def __getitem__(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get one batch of data, prepared by the workers.
+
+        Args:
+            index(int): The batch number.
+
+        Returns:
+            Tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]: Views of the batch data and labels in the ring
+                buffer.
+
+        """
+        if not self.fork:
+            return self.generator[index]
+        if not 0 <= index < len(self):
+            raise IndexError(f"Batch index {index} out of range for {len(self)} batches.")
+
+        if self.held is not None:
+            self.free.append(self.held)
+            self.held = None
+        if index not in self.pending and index not in self.ready:
+            # Out of order access, restart prefetching at the requested batch
+            self._drain()
+            self.next_index = index
+        self._request()
+
+        while index not in self.ready:
+            self._receive()
+        slot = self.held = self.ready.pop(index)
+
+        # Release skipped batches and keep the workers busy
+        for skipped in [skipped for skipped in self.ready if skipped < index]:
+            self.free.append(self.ready.pop(skipped))
+        self._request()
+
+        size = self.sizes[slot]
+        return self.x_ring[slot, :size], self.y_ring[slot, :size]
+
+    def on_epoch_end(self):
+        self._reset()
+        self.generator.on_epoch_end()
+
+    def load_state_dict(self, state: Dict[str, int]):
+        self._reset()
+        self.generator.load_state_dict(state)
+
+    def get_data(self) -> np.ndarray:
+        return self.generator.get_data()
+
+    def get_labels(self) -> np.ndarray:
+        return self.generator.get_labels()
+
+    def _request(self):
+        """
+        Helper function to request batches from the workers, until all free slots are in use.
+
+        Returns:
+            None
+
+        """
+        state = self.generator.state_dict()
+        while self.free and self.next_index < len(self):
+            slot = self.free.pop()
+            self.pending[self.next_index] = slot
+            self.tasks.put((self.next_index, slot, state))
+            self.next_index += 1
+
+    def _receive(self):
+        """
+        Helper function to wait for the next finished batch.
+
+        Returns:
+            None
+
+        """
+        while True:
+            try:
+                index, error = self.results.get(timeout=1.)
+                break
+            except queue.Empty:
+                if not all(process.is_alive() for process in self.processes):
+                    self.close()
+                    raise RuntimeError("A batch server worker died unexpectedly.")
+        slot = self.pending.pop(index)
+        if error is not None:
+            self.free.append(slot)
+            raise RuntimeError(f"Failed to prepare batch {index}:\n{error}")
+        self.ready[index] = slot
+
+    def _drain(self):
+        """
+        Helper function to wait for all pending batches and discard all prefetched batches.
+
+        Returns:
+            None
+
+        """
+        while self.pending:
+            try:
+                self._receive()
+            except RuntimeError:
+                if not self.processes:
+                    raise
+        self.free.extend(self.ready.values())
+        self.ready.clear()
+
+    def _reset(self):
+        """
+        Helper function to discard all prefetched batches before the generator state changes.
+
+        Returns:
+            None
+
+        """
+        if not self.fork or not self.processes:
+            return
+        if self.held is not None:
+            self.free.append(self.held)
+            self.held = None
+        self._drain()
+        self.next_index = 0
+
+    def close(self):
+        """
+        Stop all worker processes.
+
+        Returns:
+            None
+
+        """
+        processes, self.processes = self.processes, []
+        for _ in processes:
+            self.tasks.put(None)
+        for process in processes:
+            process.join(timeout=5.)
+            if process.is_alive():
+                process.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, 'processes', None):
+            self.close()
+
+
+def _serve(
+        generator: BaseDataGenerator,
+        augment: Optional[Augmentation],
+        tasks: mp.Queue,
+        results: mp.Queue,
+        x_ring: np.ndarray,
+        y_ring: np.ndarray,
+        sizes: np.ndarray
+):
+    """
+    The main loop of the :py:class:`BatchServer` workers.
+
+    Args:
+        generator(BaseDataGenerator): The forked copy of the generator.
+        augment(Callable[[numpy.ndarray], numpy.ndarray], optional): The augmentation function.
+        tasks(:py:class:`multiprocessing.Queue`): The queue of (index, slot, state) requests, None to stop.
+        results(:py:class:`multiprocessing.Queue`): The queue of (index, error) results.
+        x_ring(:py:class:`numpy.ndarray`): The shared data ring buffer.
+        y_ring(:py:class:`numpy.ndarray`): The shared label ring buffer.
+        sizes(:py:class:`numpy.ndarray`): The shared sizes of the batches in the ring buffer.
+
+    Returns:
+        None
+
+    """
+    # Each worker is busy on its own, avoid oversubscription through OpenCV's internal threads
+    cv2.setNumThreads(1)
+    current_state = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        index, slot, state = task
+        try:
+            # Only recreate the sample order when the epoch changed
+            if state != current_state:
+                generator.load_state_dict(state)
+                current_state = state
+            x, y = generator[index]
+            if augment is not None:
+                np.random.seed(np.random.SeedSequence([state['seed'], state['epoch'], state['cursor'] + index])
+                               .generate_state(1)[0])
+                x = augment(x)
+            size = x.shape[0]
+            x_ring[slot, :size] = x
+            y_ring[slot, :size] = y
+            sizes[slot] = size
+            results.put((index, None))
+        except Exception:
+            results.put((index, traceback.format_exc()))
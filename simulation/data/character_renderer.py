@@ -4,16 +4,15 @@ A module for the rendering of characters using TrueType fonts.
 .. codeauthor:: Manuel Stoeckel <manuel.stoeckel@stud.uni-frankfurt.de>
 """
 
-import os
 from pathlib import Path
 from typing import Union, Tuple
 
 import cv2
 import numpy as np
 from PIL import ImageFont, ImageDraw, Image
-from p_tqdm import p_map
 
 from simulation import Color
+from simulation.data.executor import Executor, get_executor
 from simulation.data.fonts import Font
 
 
@@ -60,7 +59,7 @@ class CharacterRenderer:
         char_img = np.array(char_img)
         return char_img
 
-    def prerender_all(self, base_dir=Path("."), mode='RGBA'):
+    def prerender_all(self, base_dir=Path("."), mode='RGBA', executor: Union[Executor, str, None] = None):
         """
         Render all characters of the :py:attr:`char_list` and save the images with the given mode.
 
@@ -68,6 +67,8 @@ class CharacterRenderer:
             base_dir(Path, optional): The base path of the project. The images will be saved in the directory
                 '{base_path}/datasets/characters/' in a separate folder for each character. (Default value = Path("."))
             mode(str, optional): The Pillow image mode to use for the output image. (Default value = 'RGBA')
+            executor(Union[Executor, str, None], optional): The executor to use, see
+                :py:func:`get_executor() <simulation.data.executor.get_executor>`. (Default value = None)
 
         Returns:
             None
@@ -100,7 +101,7 @@ class CharacterRenderer:
                 output_dir.mkdir(exist_ok=True)
                 cv2.imwrite(str(output_dir / f"{font_list.index(font)}.png"), char_img)
 
-        p_map(_prerender_font, font_list, desc="Rendering fonts", num_cpus=os.cpu_count())
+        get_executor(executor).map(_prerender_font, font_list, desc="Rendering fonts")
 
 
 class SingleFontCharacterRenderer(CharacterRenderer):
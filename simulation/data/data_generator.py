@@ -1,16 +1,119 @@
+import json
+import os
 import warnings
 from abc import abstractmethod, ABCMeta
-from typing import Tuple, Iterable, Union, List
+from typing import Dict, Tuple, Iterable, Iterator, Union, List, Optional
 
 import numpy as np
 import tensorflow.keras as keras
 
+from simulation.data.dataset import CLASS_OUT
+from simulation.data.sampler import ClassBalancedSampler, ClassWeights, block_shuffle
+from simulation.data.view import DatasetView, as_view
+
+#: A dataset given to a generator, either as (data, labels) tuple or as view.
+Dataset = Union[Tuple[np.ndarray, np.ndarray], DatasetView]
+
+
+def to_model_input(images: np.ndarray, flatten=False) -> np.ndarray:
+    """
+    Convert gathered uint8 images to normalized float input for the models.
+
+    Args:
+        images(:py:class:`numpy.ndarray`): An array of grayscale images.
+        flatten(bool, optional): If True, flatten the images. Else, add a channel axis. (Default value = False)
+
+    Returns:
+        :py:class:`numpy.ndarray`: The images as float32 array scaled to 0..1.
+
+    """
+    data = images.astype(np.float32)
+    data /= 255.
+    if flatten:
+        return data.reshape(data.shape[0], -1)
+    return data[:, :, :, np.newaxis]
+
 
 class BaseDataGenerator(keras.utils.Sequence, metaclass=ABCMeta):
     """
     Abstract base class for all character data generators.
+
+    All randomness of a generator is derived from its :py:attr:`seed` and the current :py:attr:`epoch`, so its state
+    can be saved with :py:meth:`state_dict` and restored with :py:meth:`load_state_dict` to resume training on the same
+    sample order. The :py:attr:`cursor` is the number of batches of the current epoch which were already trained on.
+    They are skipped until the end of the epoch.
     """
 
+    #: The seed of all random number generators.
+    seed: int = 0
+    #: The current epoch.
+    epoch: int = 0
+    #: The number of skipped batches at the beginning of the current epoch.
+    cursor: int = 0
+
+    def _init_state(self, seed: Optional[int] = None):
+        """
+        Helper function to initialize the state of the generator.
+
+        Args:
+            seed(int, optional): The seed of the random number generators. If None, a random seed is chosen.
+                (Default value = None)
+
+        """
+        self.seed = int(seed) if seed is not None else int(np.random.SeedSequence().entropy % 2 ** 32)
+        self.epoch = 0
+        self.cursor = 0
+
+    @property
+    def rng(self) -> np.random.Generator:
+        """A new random number generator for the current epoch."""
+        return np.random.default_rng([self.seed, self.epoch])
+
+    @property
+    @abstractmethod
+    def num_batches(self) -> int:
+        """The number of batches of a whole epoch."""
+        pass
+
+    def __len__(self) -> int:
+        """Denotes the number of remaining batches in this epoch"""
+        return self.num_batches - self.cursor
+
+    def on_epoch_end(self):
+        self.epoch += 1
+        self.cursor = 0
+        self.shuffle_indices()
+
+    def shuffle_indices(self):
+        """Create the sample order of the current epoch. Called at the start of each epoch."""
+        pass
+
+    def state_dict(self) -> Dict[str, int]:
+        """
+        Get the state of this generator.
+
+        Returns:
+            dict[str, int]: The seed, epoch and batch cursor of this generator.
+
+        """
+        return {'seed': self.seed, 'epoch': self.epoch, 'cursor': self.cursor}
+
+    def load_state_dict(self, state: Dict[str, int]):
+        """
+        Restore the state of this generator. The sample order of the restored epoch is recreated from the seed.
+
+        Args:
+            state(dict[str, int]): A state created by :py:meth:`state_dict`.
+
+        Returns:
+            None
+
+        """
+        self.seed = int(state['seed'])
+        self.epoch = int(state['epoch'])
+        self.cursor = int(state.get('cursor', 0))
+        self.shuffle_indices()
+
     @abstractmethod
     def get_data(self) -> np.ndarray:
         """
@@ -31,6 +134,40 @@ class BaseDataGenerator(keras.utils.Sequence, metaclass=ABCMeta):
         """
         pass
 
+    def gather(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Get the data of the given samples. The indices refer to the order of :py:meth:`get_data` and
+        :py:meth:`get_labels`. Subclasses should override this, the default implementation gets all data.
+
+        Args:
+            indices(:py:class:`numpy.ndarray`): The indices of the samples.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The data of the samples as a float array.
+
+        """
+        return self.get_data()[indices]
+
+    def iterate_samples(self, batch_size: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Iterate over all samples of this generator exactly once, in the order of :py:meth:`get_labels`. Unlike the
+        batches of an epoch, the samples are neither shuffled nor balanced, so this is the way to evaluate a model on
+        the complete data with constant memory.
+
+        Args:
+            batch_size(int, optional): The number of samples per chunk. If None, use the batch size of this generator.
+                (Default value = None)
+
+        Returns:
+            Iterator[tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]]: Chunks of data and labels.
+
+        """
+        batch_size = batch_size if batch_size is not None else self.batch_size
+        labels = self.get_labels()
+        for start in range(0, labels.shape[0], batch_size):
+            indices = np.arange(start, min(start + batch_size, labels.shape[0]))
+            yield self.gather(indices), labels[indices]
+
 
 class BalancedDataGenerator(BaseDataGenerator):
     """
@@ -39,22 +176,26 @@ class BalancedDataGenerator(BaseDataGenerator):
     * truncate: trims all datasets to the length of the shortest dataset for each epoch,
     * repeat: all datasets shorter than the longest dataset will be repeated during each epoch.
 
+    The datasets are not copied, images are gathered from them for each batch.
+
     """
 
     def __init__(
             self,
-            *datasets: Tuple[np.ndarray, np.ndarray],
+            *datasets: Dataset,
             batch_size=32,
             shuffle=True,
             flatten=False,
             truncate=True,
-            num_classes=20
+            num_classes=20,
+            seed: int = None
     ):
         """
         
 
         Args:
-            datasets: A sequence of tuples, one for each dataset containing (data, labels).
+            datasets: A sequence of (data, labels) tuples or
+                :py:class:`DatasetView <simulation.data.view.DatasetView>` instances, one for each dataset.
             batch_size(int, optional): The batch size. Should be divisible by the number of datasets.
                 (Default value = 32)
             shuffle(bool, optional): If True, shuffle the datasets at the end of each epoch. (Default value = True)
@@ -63,11 +204,12 @@ class BalancedDataGenerator(BaseDataGenerator):
                 Else, they will be repeated. (Default value = True)
             num_classes(int, optional): The number of classes in the datasets. If None, will be inferred from the data.
                 (Default value = 20)
+            seed(int, optional): The seed for shuffling. If None, a random seed is chosen. (Default value = None)
 
         """
-        self.datasets = [dataset[0] for dataset in datasets]
-        self.labels = [dataset[1] for dataset in datasets]
-        self.lengths = [dataset[1].shape[0] for dataset in datasets]
+        self.datasets: List[DatasetView] = [as_view(dataset) for dataset in datasets]
+        self.labels = [dataset.labels for dataset in self.datasets]
+        self.lengths = [len(dataset) for dataset in self.datasets]
 
         self.shuffle = shuffle
         self.flatten = flatten
@@ -89,7 +231,8 @@ class BalancedDataGenerator(BaseDataGenerator):
             print(f"Dataset sizes are different, {s_data_align} datasets.")
 
         self.indices: List[np.ndarray] = []
-        self.on_epoch_end()
+        self._init_state(seed)
+        self.shuffle_indices()
 
     @property
     def num_datasets(self) -> int:
@@ -106,8 +249,8 @@ class BalancedDataGenerator(BaseDataGenerator):
         """The minimum length of all datasets."""
         return min(self.lengths)
 
-    def __len__(self) -> int:
-        """Denotes the number of batches per epoch"""
+    @property
+    def num_batches(self) -> int:
         if self.truncate:
             return int(np.ceil(self.min_len * self.num_datasets / self.batch_size))
         else:
@@ -126,6 +269,7 @@ class BalancedDataGenerator(BaseDataGenerator):
 
         """
         # Generate indices of the batch
+        index += self.cursor
         indices = [dataset_indices[index * self.mini_batch_size:(index + 1) * self.mini_batch_size]
                    for dataset_indices in self.indices]
         indices[-1] = self.indices[-1][index * self.last_mini_batch_size:(index + 1) * self.last_mini_batch_size]
@@ -134,18 +278,12 @@ class BalancedDataGenerator(BaseDataGenerator):
         xs, ys = self._data_generation(indices)
 
         # Stack data, convert images to float and scale to 0..1
-        x = np.vstack(xs).astype(np.float32) / 255.
+        x = to_model_input(np.concatenate(xs), self.flatten)
         y = np.hstack(ys)
 
-        if self.flatten:
-            shape = x.shape
-            x = x.reshape(-1, shape[1] * shape[2])
-        else:
-            x = x[:, :, :, np.newaxis]
-
         return x, y
 
-    def on_epoch_end(self):
+    def shuffle_indices(self):
         """
         Shuffles the datasets and chooses new indices according to the balancing strategy.
         
@@ -165,8 +303,9 @@ class BalancedDataGenerator(BaseDataGenerator):
             self.indices = [np.arange(self.max_len) % len(dataset) for dataset in self.datasets]
 
         if self.shuffle:
+            rng = self.rng
             for dataset_indices in self.indices:
-                np.random.shuffle(dataset_indices)
+                rng.shuffle(dataset_indices)
 
     def _data_generation(self, indices: List[np.ndarray]) -> Tuple[Tuple[np.ndarray, ...], Tuple[np.ndarray, ...]]:
         """
@@ -181,24 +320,25 @@ class BalancedDataGenerator(BaseDataGenerator):
         """
         xs, ys = [], []
         for i in range(self.num_datasets):
-            xs.append(self.datasets[i][indices[i]])
+            xs.append(self.datasets[i].gather(indices[i]))
             ys.append(self.labels[i][indices[i]])
         return tuple(xs), tuple(ys)
 
+    def gather(self, indices: np.ndarray) -> np.ndarray:
+        offsets = np.cumsum([0] + self.lengths)
+        out = np.empty(indices.shape + self.datasets[0].shape[1:], dtype=self.datasets[0].sources[0].dtype)
+        dataset_ids = np.searchsorted(offsets, indices, side='right') - 1
+        for i, dataset in enumerate(self.datasets):
+            mask = dataset_ids == i
+            if mask.any():
+                out[mask] = dataset.gather(indices[mask] - offsets[i])
+        return to_model_input(out, self.flatten)
+
     def get_data(self):
-        data = np.vstack(tuple([dataset[0] for dataset in self.datasets]))
-        data = data[:, :, :, np.newaxis]
-        data = data.astype(np.float32) / 255.
-        if self.flatten:
-            data = data.squeeze()
-            shape = data.shape
-            data = data.reshape(-1, shape[1] * shape[2])
-        else:
-            data = data[:, :, :, np.newaxis]
-        return data
+        return to_model_input(np.concatenate([dataset.gather() for dataset in self.datasets]), self.flatten)
 
     def get_labels(self):
-        return np.hstack(tuple([dataset[1] for dataset in self.datasets]))
+        return np.hstack(self.labels)
 
 
 class ToBinaryGenerator(BalancedDataGenerator):
@@ -207,11 +347,14 @@ class ToBinaryGenerator(BalancedDataGenerator):
     of classes to match. Matched classes will be given the label *1*, others *0*. This converted data will then be split
     into two datasets by class from which a :py:class:`BalancedDataGenerator` is constructed.
 
+    Conversion and splitting only create :py:class:`DatasetView <simulation.data.view.DatasetView>` instances, the
+    data itself is not copied.
+
     """
 
     def __init__(
             self,
-            *datasets: Tuple[np.ndarray, np.ndarray],
+            *datasets: Dataset,
             classes_to_match: Union[int, Iterable[int]] = 0,
             classes_to_drop: Union[int, Iterable[int]] = None,
             **kwargs
@@ -220,85 +363,177 @@ class ToBinaryGenerator(BalancedDataGenerator):
         
 
         Args:
-            datasets(tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]): A sequence of datasets to convert to
-                binary.
+            datasets(tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]): A sequence of (data, labels)
+                datasets to convert to binary.
             classes_to_match(Union[int, Iterable[int]]): The class or classes to match as binary class 1.
                 (Default value = 0)
             classes_to_drop(Union[int, Iterable[int]]): The classes to drop from the dataset. (Default value = None)
             kwargs: Arbitrary :py:class:`BalancedDataGenerator` arguments.
 
         """
-        self.data = np.vstack(tuple([dataset[0] for dataset in datasets]))
-        self.all_labels = np.hstack(tuple([dataset[1] for dataset in datasets]))
+        self.view = DatasetView(*datasets)
 
         # Remove instances of classes to drop
         if classes_to_drop is not None:
-            keep_indices = np.logical_not(self.get_matching_indices(classes_to_drop))
+            self.view = self.view.drop(_as_list(classes_to_drop))
 
-            self.data = self.data[keep_indices]
-            self.all_labels = self.all_labels[keep_indices]
+        # Assign new binary labels with a lookup table, matched classes may be absent from the data
+        classes_to_match = _as_list(classes_to_match)
+        size = max([int(self.view.source_labels.max(initial=0))] + classes_to_match) + 1
+        lut = np.zeros(size, dtype=self.view.source_labels.dtype)
+        lut[classes_to_match] = 1
+        self.view = self.view.remap(lut)
+        self.all_labels = self.view.labels
 
         # Split all datasets into matching and other data
-        matched_indices = self.get_matching_indices(classes_to_match)
-        other_indices = np.logical_not(matched_indices)
+        super().__init__(self.view.filter([1]), self.view.filter([0]), num_classes=1, **kwargs)
 
-        # Assign new binary labels
-        self.all_labels[matched_indices] = 1
-        self.all_labels[other_indices] = 0
+    def get_matching_indices(self, classes_to_match: Union[int, Iterable[int]]) -> np.ndarray:
+        """
+        Get a mask of all samples with the given original classes.
 
-        matched_data = (self.data[matched_indices], self.all_labels[matched_indices])
-        other_data = (self.data[other_indices], self.all_labels[other_indices])
-        super().__init__(matched_data, other_data, num_classes=1, **kwargs)
+        Args:
+            classes_to_match(Union[int, Iterable[int]]): The class or classes to match.
 
-    def get_matching_indices(self, classes_to_match):
-        if isinstance(classes_to_match, int):
-            matched_indices = self.all_labels == classes_to_match
-        else:
-            iterator = iter(classes_to_match)
-            matched_indices = self.all_labels == iterator.__next__()
-            for cls in iterator:
-                matched_indices = np.logical_or(matched_indices, self.all_labels == cls)
-        return matched_indices
+        Returns:
+            :py:class:`numpy.ndarray`: A boolean mask over all samples of this generator.
 
-    def _data_generation(self, indices):
-        xs, ys = [], []
-        for i in range(self.num_datasets):
-            xs.append(self.datasets[i][indices[i]])
-            ys.append(self.labels[i][indices[i]])
-        return xs, ys
+        """
+        return np.isin(self.view.original_labels, _as_list(classes_to_match))
+
+    def gather(self, indices: np.ndarray) -> np.ndarray:
+        return to_model_input(self.view.gather(indices), self.flatten)
 
     def get_data(self):
-        data = self.data.astype(np.float32) / 255.
-        if self.flatten:
-            data = data.squeeze()
-            shape = data.shape
-            data = data.reshape(-1, shape[1] * shape[2])
-        else:
-            data = data[:, :, :, np.newaxis]
-        return data
+        return to_model_input(self.view.gather(), self.flatten)
 
     def get_labels(self):
         return self.all_labels
 
 
+class ClassBalancedDataGenerator(BaseDataGenerator):
+    """
+    This generator balances the classes instead of the datasets. All input datasets are combined into a single
+    :py:class:`DatasetView <simulation.data.view.DatasetView>`, each batch is drawn with replacement by a
+    :py:class:`ClassBalancedSampler <simulation.data.sampler.ClassBalancedSampler>` according to the target class
+    weights.
+
+    Each batch is drawn from its own random number generator seeded by the generator seed, the epoch and the batch
+    index, so batches do not depend on the order in which they are requested.
+
+    """
+
+    def __init__(
+            self,
+            *datasets: Dataset,
+            batch_size=32,
+            steps_per_epoch: int = None,
+            class_weights: ClassWeights = None,
+            flatten=False,
+            num_classes=20,
+            seed: int = None
+    ):
+        """
+
+
+        Args:
+            datasets: A sequence of (data, labels) tuples or
+                :py:class:`DatasetView <simulation.data.view.DatasetView>` instances.
+            batch_size(int, optional): The batch size. (Default value = 32)
+            steps_per_epoch(int, optional): The number of batches per epoch. If None, an epoch has as many samples as
+                all datasets combined. (Default value = None)
+            class_weights(Union[numpy.ndarray, dict[int, float]], optional): The target weight of each class. If None,
+                all classes present in the datasets are drawn equally often. (Default value = None)
+            flatten(bool, optional): If True, flatten the datasets. (Default value = False)
+            num_classes(int, optional): The number of classes in the datasets. If None, will be inferred from the data.
+                (Default value = 20)
+            seed(int, optional): The seed of the random number generators. If None, a random seed is chosen.
+                (Default value = None)
+
+        """
+        self.datasets: List[DatasetView] = [as_view(dataset) for dataset in datasets]
+        #: The start offset of each dataset in the combined labels.
+        self.offsets = np.cumsum([0] + [len(dataset) for dataset in self.datasets])
+        self.labels = np.hstack([dataset.labels for dataset in self.datasets])
+        self.sampler = ClassBalancedSampler(self.labels, class_weights)
+
+        self.flatten = flatten
+        self.batch_size = batch_size
+        self.steps_per_epoch = steps_per_epoch if steps_per_epoch is not None \
+            else int(np.ceil(self.offsets[-1] / batch_size))
+        self.num_classes = num_classes if num_classes is not None else self.sampler.classes.shape[0]
+        self._init_state(seed)
+
+    @property
+    def num_batches(self) -> int:
+        return self.steps_per_epoch
+
+    def __getitem__(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generate one batch of data.
+
+        Args:
+            index(int): The batch number.
+
+        Returns:
+            Tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]: A tuple of a 4-dimensional array and the class
+                label array.
+
+        """
+        rng = np.random.default_rng([self.seed, self.epoch, index + self.cursor])
+        indices = self.sampler.draw(self.batch_size, rng)
+        return to_model_input(self._gather(indices), self.flatten), self.labels[indices]
+
+    def _gather(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Helper function to gather images from all datasets given indices into the combined labels.
+
+        Args:
+            indices(:py:class:`numpy.ndarray`): The indices of the samples.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The images.
+
+        """
+        if len(self.datasets) == 1:
+            return self.datasets[0].gather(indices)
+        out = np.empty(indices.shape + self.datasets[0].shape[1:], dtype=self.datasets[0].sources[0].dtype)
+        dataset_ids = np.searchsorted(self.offsets, indices, side='right') - 1
+        for i, dataset in enumerate(self.datasets):
+            mask = dataset_ids == i
+            if mask.any():
+                out[mask] = dataset.gather(indices[mask] - self.offsets[i])
+        return out
+
+    def gather(self, indices: np.ndarray) -> np.ndarray:
+        return to_model_input(self._gather(indices), self.flatten)
+
+    def get_data(self):
+        return to_model_input(np.concatenate([dataset.gather() for dataset in self.datasets]), self.flatten)
+
+    def get_labels(self):
+        return self.labels
+
+
 class SimpleDataGenerator(BaseDataGenerator):
     """
-    A simple data generator which does not do any balancing. All input datasets are concatenated into a single array for
-    both data and labels.
-    
-    They are also immediately converted to normalized float arrays, giving a possible performance increase in
-    comparison to :py:class:`BalancedDataGenerator`.
+    A simple data generator which does not do any balancing. All input datasets are combined into a single
+    :py:class:`DatasetView <simulation.data.view.DatasetView>`, the images are gathered and converted to normalized
+    floats for each batch.
 
     """
 
     def __init__(
             self,
-            *datasets: Tuple[np.ndarray, np.ndarray],
+            *datasets: Dataset,
             batch_size=32,
             shuffle=True,
             flatten=False,
             to_simple_digit=False,
-            no_zero=False
+            no_zero=False,
+            seed: int = None,
+            block_size: int = None,
+            shuffle_window=8
     ):
         """
         
@@ -313,45 +548,41 @@ class SimpleDataGenerator(BaseDataGenerator):
                 handwritten digits to the class of machine written digits. (Default value = False)
             no_zero(bool, optional): If True and :py:data:`to_simple_digit` is True too, remove all 0-class entries
                 from the datasets. (Default value = False)
+            seed(int, optional): The seed for shuffling. If None, a random seed is chosen. (Default value = None)
+            block_size(int, optional): If given, shuffle contiguous blocks of this many samples instead of single
+                samples, see :py:func:`block_shuffle <simulation.data.sampler.block_shuffle>`. This reads
+                memory-mapped data mostly sequentially. (Default value = None)
+            shuffle_window(int, optional): The number of consecutive blocks whose samples are shuffled together, if
+                :py:data:`block_size` is given. (Default value = 8)
 
         """
-        self.data = np.vstack(tuple([dataset[0] for dataset in datasets]))
-
-        # Convert images to float and scale to 0..1
-        self.data = self.data.astype(np.float32) / 255.
-
-        if flatten:
-            shape = self.data.shape
-            self.data = self.data.reshape(-1, shape[1] * shape[2])
-        else:
-            self.data = self.data[:, :, :, np.newaxis]
-
-        self.labels = np.hstack(tuple([dataset[1] for dataset in datasets]))
+        self.view = DatasetView(*datasets)
 
         self.shuffle = shuffle
         self.flatten = flatten
         self.batch_size = batch_size
+        self.block_size = block_size
+        self.shuffle_window = shuffle_window
 
         if to_simple_digit:
-            indices = np.logical_and(self.labels > 9, self.labels != 10)
-            self.labels[indices] -= 10
-            indices = self.labels != 10
-            self.data = self.data[indices]
-            self.labels = self.labels[indices]
+            # Drop the out class and map handwritten digits to the machine written digit classes
+            self.view = self.view.drop([CLASS_OUT]).remap({cls: cls - 10 for cls in range(11, 20)})
             if no_zero:
-                self.labels -= 1
+                self.view = self.view.drop([0]).remap({cls: cls - 1 for cls in range(1, 10)})
                 self.num_classes = 9
             else:
                 self.num_classes = 10
         else:
             self.num_classes = 20
+        self.labels = self.view.labels
 
         self.indices: np.ndarray = np.empty(0, dtype=np.int64)
-        self.on_epoch_end()
+        self._init_state(seed)
+        self.shuffle_indices()
 
-    def __len__(self):
-        """Denotes the number of batches per epoch"""
-        return int(np.ceil(self.data.shape[0] / self.batch_size))
+    @property
+    def num_batches(self) -> int:
+        return int(np.ceil(len(self.view) / self.batch_size))
 
     def __getitem__(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
         """
@@ -366,21 +597,148 @@ class SimpleDataGenerator(BaseDataGenerator):
 
         """
         # Generate indices of the batch
+        index += self.cursor
         indices = self.indices[index * self.batch_size:(index + 1) * self.batch_size]
 
         # Generate data
-        x = self.data[indices]
+        x = to_model_input(self.view.gather(indices), self.flatten)
         y = self.labels[indices]
 
         return x, y
 
-    def on_epoch_end(self):
-        self.indices = np.arange(self.data.shape[0])
-        if self.shuffle:
-            np.random.shuffle(self.indices)
+    def shuffle_indices(self):
+        if self.shuffle and self.block_size is not None:
+            self.indices = block_shuffle(len(self.view), self.rng, self.block_size, self.shuffle_window)
+        elif self.shuffle:
+            self.indices = self.rng.permutation(len(self.view))
+        else:
+            self.indices = np.arange(len(self.view))
+
+    def gather(self, indices: np.ndarray) -> np.ndarray:
+        return to_model_input(self.view.gather(indices), self.flatten)
 
     def get_data(self):
-        return self.data
+        return to_model_input(self.view.gather(), self.flatten)
 
     def get_labels(self):
         return self.labels
+
+
+class GeneratorCheckpoint(keras.callbacks.Callback):
+    """
+    A callback which checkpoints the model weights together with the state of the training generator, so an
+    interrupted training can be resumed on the same sample order.
+
+    The weights are saved in the TensorFlow checkpoint format, which includes the optimizer state. Two weight slots are
+    used alternately and the state file is only replaced after the weights were written, so an interruption while
+    saving never corrupts the last complete checkpoint.
+
+    The batch cursor is only meaningful if the batches are requested in order, so the model must be trained with
+    ``shuffle=False``, the generator shuffles the samples itself.
+
+    A fingerprint of the training configuration is saved with each checkpoint. Checkpoints with a different
+    fingerprint are ignored, so a changed training is not resumed from a stale checkpoint.
+
+    """
+
+    def __init__(self, generator: BaseDataGenerator, filepath: str, save_freq=100, fingerprint: Optional[str] = None):
+        """
+
+
+        Args:
+            generator(BaseDataGenerator): The training generator.
+            filepath(str): The path prefix of the checkpoint files.
+            save_freq(int, optional): Save a checkpoint every this many batches. A checkpoint is always saved at the
+                end of each epoch. If 0, only save at the end of epochs. (Default value = 100)
+            fingerprint(str, optional): The fingerprint of the training configuration. (Default value = None)
+
+        """
+        super().__init__()
+        self.generator = generator
+        self.filepath = filepath
+        self.save_freq = save_freq
+        self.fingerprint = fingerprint
+        self.epoch = 0
+        self.slot = 0
+
+    @property
+    def state_path(self) -> str:
+        """The path of the state file."""
+        return self.filepath + ".json"
+
+    def load(self, model: keras.Model = None) -> Optional[dict]:
+        """
+        Load the last checkpoint, if there is one with the same fingerprint, and restore the generator state and the
+        model weights.
+
+        Args:
+            model(:py:class:`tensorflow.keras.Model`, optional): The model to restore the weights of. If None, use the
+                model this callback is attached to. (Default value = None)
+
+        Returns:
+            Optional[dict]: The checkpoint state, None if there is no matching checkpoint.
+
+        """
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path) as fp:
+            state = json.load(fp)
+        if state.get('fingerprint') != self.fingerprint:
+            warnings.warn(f"Ignoring the checkpoint {self.filepath} of a different training configuration!")
+            return None
+        (model if model is not None else self.model).load_weights(state['weights'])
+        self.generator.load_state_dict(state['generator'])
+        self.slot = state['slot'] + 1
+        return state
+
+    def save(self, epoch: int, cursor: int, finished=False):
+        """
+        Save a checkpoint.
+
+        Args:
+            epoch(int): The current epoch.
+            cursor(int): The number of batches trained on in the current epoch.
+            finished(bool, optional): If True, mark the training as finished. (Default value = False)
+
+        Returns:
+            None
+
+        """
+        weights = f"{self.filepath}.weights-{self.slot % 2}"
+        self.model.save_weights(weights)
+        state = {
+            'generator': dict(self.generator.state_dict(), epoch=epoch, cursor=cursor),
+            'weights': weights,
+            'slot': self.slot,
+            'finished': finished,
+            'fingerprint': self.fingerprint
+        }
+        with open(self.state_path + ".tmp", 'w') as fp:
+            json.dump(state, fp)
+        os.replace(self.state_path + ".tmp", self.state_path)
+        self.slot += 1
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch = epoch
+
+    def on_train_batch_end(self, batch, logs=None):
+        cursor = self.generator.cursor + batch + 1
+        if self.save_freq and cursor % self.save_freq == 0 and cursor < self.generator.num_batches:
+            self.save(self.epoch, cursor)
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.save(epoch + 1, 0)
+
+
+def _as_list(classes: Union[int, Iterable[int]]) -> List[int]:
+    """
+    Helper function to convert a class or an iterable of classes to a list.
+
+    Args:
+        classes(Union[int, Iterable[int]]): The class or classes.
+
+    Returns:
+        list[int]: The classes as list.
+
+    """
+    return [classes] if isinstance(classes, (int, np.integer)) else list(classes)
@@ -3,16 +3,18 @@ import os
 import sys
 import tarfile
 import zipfile
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Union, Tuple, Optional
+from typing import Callable, Dict, Iterator, List, Union, Tuple, Optional
 
 import cv2
 import numpy as np
-from p_tqdm import p_map
 from sklearn.datasets import fetch_openml
 from tqdm import tqdm, trange
 
+from simulation.data.executor import DEFAULT_CHUNK_SIZE, Executor, get_executor
 from simulation.transforms import ImageTransform
+from simulation.transforms.batch import resize_batch
 
 DATASETS_HOME = "datasets/"
 
@@ -49,6 +51,61 @@ def strip_file_ext(path: str):
         return path
 
 
+def is_constant(data: np.ndarray) -> bool:
+    """
+    Checks if an array of images stores only a single image, which is repeated using a stride of zero (see
+    :py:func:`numpy.broadcast_to`). Such arrays are read-only.
+
+    Args:
+        data(:py:class:`numpy.ndarray`): An array of images.
+
+    Returns:
+        bool: True if the array is constant along its first axis.
+
+    """
+    return data.ndim > 0 and data.shape[0] > 0 and data.strides[0] == 0
+
+
+def broadcast_images(image: np.ndarray, count: int) -> np.ndarray:
+    """
+    Create a constant array of images, which repeats a single image without storing it multiple times.
+
+    Args:
+        image(:py:class:`numpy.ndarray`): A batch of one image.
+        count(int): The number of images.
+
+    Returns:
+        :py:class:`numpy.ndarray`: A read-only array of :py:data:`count` images.
+
+    """
+    return np.broadcast_to(image, (count,) + image.shape[1:])
+
+
+def constant_image(data: np.ndarray, chunk_size=4096) -> Optional[np.ndarray]:
+    """
+    Checks if all images in an array are identical, either because the array is constant (see :py:func:`is_constant`)
+    or by comparing their contents.
+
+    Args:
+        data(:py:class:`numpy.ndarray`): An array of images.
+        chunk_size(int, optional): The number of images compared at once. The comparison stops at the first chunk
+            containing a different image. (Default value = 4096)
+
+    Returns:
+        Optional[numpy.ndarray]: The image as a batch of one image if all images are identical, else None.
+
+    """
+    if data.shape[0] == 0:
+        return None
+    image = np.array(data[:1])
+    if is_constant(data):
+        return image
+    for start in range(0, data.shape[0], chunk_size):
+        if not (data[start:start + chunk_size] == image).all():
+            return None
+    return image
+
+
 def char_is_valid_number(char: Union[int, str]):
     """
     Checks if a character is among the first 9 digits, excluding 0.
@@ -85,6 +142,11 @@ class CharacterDataset:
         * :py:class:`RealDataset`
         * :py:class:`RealValidationDataset`
 
+    If :py:attr:`lazy` is set to True, the operations :py:meth:`resize`, :py:meth:`invert`, :py:meth:`cvt_color` and
+    :py:meth:`induce_alpha` are only recorded. They are run fused on chunks of images once :py:attr:`train_x` or
+    :py:attr:`test_x` is accessed (or :py:meth:`materialize` is called), so no intermediate copies of the whole dataset
+    are created. :py:meth:`iter_chunks` processes the images without keeping the results at all.
+
     """
     digit_offset = 0
 
@@ -99,6 +161,10 @@ class CharacterDataset:
         self.inter_down = INTER_DOWN_FAST if fast_resize else INTER_DOWN_HIGH
         self.inter_up = INTER_UP_FAST if fast_resize else INTER_UP_HIGH
 
+        #: If True, defer operations until the images are accessed.
+        self.lazy = False
+        self._pending: List[Callable[[np.ndarray], np.ndarray]] = list()
+
         self.train_x: np.ndarray = np.empty(0, dtype=np.uint8)
         self.train_y: np.ndarray = np.empty(0, dtype=int)
         self.test_x: np.ndarray = np.empty(0, dtype=np.uint8)
@@ -125,7 +191,113 @@ class CharacterDataset:
         return self.train_x[item]
 
     def __len__(self):
-        return self.train_x.shape[0]
+        # Deferred operations never change the number of images
+        return self._train_x.shape[0]
+
+    @property
+    def train_x(self) -> np.ndarray:
+        """The training images. Runs all deferred operations first."""
+        if self._pending:
+            self.materialize()
+        return self._train_x
+
+    @train_x.setter
+    def train_x(self, value: np.ndarray):
+        self._train_x = value
+
+    @property
+    def test_x(self) -> np.ndarray:
+        """The test images. Runs all deferred operations first."""
+        if self._pending:
+            self.materialize()
+        return self._test_x
+
+    @test_x.setter
+    def test_x(self, value: np.ndarray):
+        self._test_x = value
+
+    def _defer(self, operation: Callable[..., np.ndarray], **kwargs):
+        """
+        Record an operation for deferred execution. The operation is run on chunks of images with all progress bars and
+        nested parallelism disabled.
+
+        Args:
+            operation(Callable[..., numpy.ndarray]): One of the static helper methods of this class.
+            **kwargs: The arguments for the operation, except the images.
+
+        Returns:
+            None
+
+        """
+        self._pending.append(partial(operation, verbose=False, **kwargs))
+
+    @staticmethod
+    def _run_operations(data: np.ndarray, operations: List[Callable[[np.ndarray], np.ndarray]]) -> np.ndarray:
+        """
+        Helper function to run deferred operations on a chunk of images.
+
+        Args:
+            data(:py:class:`numpy.ndarray`): A chunk of images.
+            operations(List[Callable[[numpy.ndarray], numpy.ndarray]]): The deferred operations.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The processed images.
+
+        """
+        # Some operations work in place, the original images must not be modified
+        data = np.array(data)
+        for operation in operations:
+            data = operation(data)
+        return data
+
+    def materialize(self, executor: Union[Executor, str, None] = None):
+        """
+        Run all deferred operations. Each chunk of images passes through all operations at once and is written to a
+        single new array per split, so at most the original and the final images are in memory at the same time.
+
+        Args:
+            executor(Union[Executor, str, None], optional): The executor to use, see
+                :py:func:`get_executor() <simulation.data.executor.get_executor>`. (Default value = None)
+
+        Returns:
+            None
+
+        """
+        operations, self._pending = self._pending, list()
+        if not operations:
+            return
+        executor = get_executor(executor)
+        fn = partial(self._run_operations, operations=operations)
+        for name in ['_train_x', '_test_x']:
+            data = getattr(self, name)
+            # Drop the reference first, so the original images can be freed as soon as possible
+            setattr(self, name, None)
+            if data.shape[0] == 0:
+                data = fn(data)
+            elif is_constant(data):
+                data = broadcast_images(fn(data[:1]), data.shape[0])
+            else:
+                data = executor.map_chunks(fn, data, desc="Running deferred operations")
+            setattr(self, name, data)
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE, test=False) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Iterate over chunks of images and labels, running all deferred operations on each chunk. The dataset itself is
+        not modified and the processed images are not kept.
+
+        Args:
+            chunk_size(int, optional): The number of images per chunk.
+                (Default value = :py:data:`DEFAULT_CHUNK_SIZE <simulation.data.executor.DEFAULT_CHUNK_SIZE>`)
+            test(bool, optional): If True, iterate over the test split. (Default value = False)
+
+        Returns:
+            Iterator[Tuple[numpy.ndarray, numpy.ndarray]]: The chunks of images and labels.
+
+        """
+        data, labels = (self._test_x, self.test_y) if test else (self._train_x, self.train_y)
+        operations = list(self._pending)
+        for start in range(0, data.shape[0], chunk_size):
+            yield self._run_operations(data[start:start + chunk_size], operations), labels[start:start + chunk_size]
 
     def get_label(self, char: int):
         """
@@ -158,13 +330,15 @@ class CharacterDataset:
         transforms = list(transforms)
         self.transforms.append(transforms)
 
-    def apply_transforms(self, keep=True, clear=True):
+    def apply_transforms(self, keep=True, clear=True, executor: Union[Executor, str, None] = None):
         """
         Apply all sequences of transforms added previously.
 
         Args:
             keep(bool, optional): If True, keep the original images in the dataset (Default value = True)
             clear(bool, optional): If True, clear the list of transforms at the end of (Default value = True)
+            executor(Union[Executor, str, None], optional): The executor to use, see
+                :py:func:`get_executor() <simulation.data.executor.get_executor>`. (Default value = None)
 
         Returns:
             None
@@ -172,6 +346,7 @@ class CharacterDataset:
         """
         if not self.transforms:
             return
+        executor = get_executor(executor)
         n_train = self.train_x.shape[0]
         n_test = self.test_x.shape[0]
         n_transforms = len(self.transforms)
@@ -184,28 +359,17 @@ class CharacterDataset:
         if keep:
             new_train_x[:n_train] = self.train_x
             new_test_x[:n_test] = self.test_x
+        # Datasets of identical images (like EmptyDataset) need deterministic transforms only once
+        train_image = constant_image(self.train_x)
+        test_image = constant_image(self.test_x)
         for i, transforms in enumerate(
                 tqdm(self.transforms, desc="Applying transforms", position=0, smoothing=0),
                 start=int(keep)
         ):
-            def _apply_transforms(img):
-                for transform in transforms:
-                    img = transform.apply(img)
-                return img
-
-            train_x_i = p_map(
-                _apply_transforms, list(self.train_x), desc="Processing images (1/2)",
-                position=1, leave=False, disable=False,
-                num_cpus=os.cpu_count()
-            )
-            test_x_i = p_map(
-                _apply_transforms, list(self.test_x), desc="Processing images (2/2)",
-                position=1, leave=False, disable=False,
-                num_cpus=os.cpu_count()
-            )
-
-            new_train_x[n_train * i:n_train * (i + 1)] = train_x_i
-            new_test_x[n_test * i:n_test * (i + 1)] = test_x_i
+            self._get_transformed(self.train_x, transforms, new_train_x[n_train * i:n_train * (i + 1)], executor,
+                                  train_image, desc="Processing images (1/2)")
+            self._get_transformed(self.test_x, transforms, new_test_x[n_test * i:n_test * (i + 1)], executor,
+                                  test_image, desc="Processing images (2/2)")
 
         # save new data
         self.train_x: np.ndarray = new_train_x
@@ -218,12 +382,61 @@ class CharacterDataset:
         if clear:
             self.transforms.clear()
 
-    def resize(self, resolution=28):
+    @staticmethod
+    def _get_transformed(
+            data: np.ndarray,
+            transforms: List[ImageTransform],
+            out: np.ndarray,
+            executor: Executor,
+            image: Optional[np.ndarray] = None,
+            desc: str = None
+    ):
+        """
+        Helper function to apply a sequence of transforms to all images in :py:data:`data`.
+
+        If all images are identical, the leading deterministic transforms are applied to a single image only. The
+        remaining transforms are applied to a constant array of the result, so only their random parameters vary.
+
+        Args:
+            data(:py:class:`numpy.ndarray`): An array of images.
+            transforms(List[ImageTransform]): The sequence of transforms.
+            out(:py:class:`numpy.ndarray`): The array to write the transformed images to.
+            executor(Executor): The executor to use.
+            image(:py:class:`numpy.ndarray`, optional): If all images in :py:data:`data` are identical, a batch of one
+                of them, see :py:func:`constant_image`. (Default value = None)
+            desc(str, optional): The description of the progress bar. (Default value = None)
+
+        Returns:
+            None
+
+        """
+        if image is not None:
+            deterministic = 0
+            while deterministic < len(transforms) and transforms[deterministic].deterministic:
+                image = transforms[deterministic].apply_batch(image)
+                deterministic += 1
+            transforms = transforms[deterministic:]
+            data = broadcast_images(image, data.shape[0])
+            if not transforms:
+                out[:] = data
+                return
+
+        def _apply_transforms(imgs):
+            for transform in transforms:
+                imgs = transform.apply_batch(imgs)
+            return imgs
+
+        # Transforms are applied to chunks of images, so they can use their vectorized batch implementations
+        executor.map_chunks(_apply_transforms, data, out=out, desc=desc, position=1, leave=False)
+
+    def resize(self, resolution=28, executor: Union[Executor, str, None] = None):
         """
         Resize all images in the data set to the given resolution.
 
         Args:
             resolution(int, optional): The new transforms width/height. (Default value = 28)
+            executor(Union[Executor, str, None], optional): The executor to use, see
+                :py:func:`get_executor() <simulation.data.executor.get_executor>`. (Default value = None)
 
         Returns:
             None
@@ -232,12 +445,21 @@ class CharacterDataset:
         if resolution == self.resolution:
             return
         interpolation = self.inter_down if resolution < self.resolution else self.inter_up
-        self.train_x = self._get_resized(self.train_x, resolution, interpolation)
-        self.test_x = self._get_resized(self.test_x, resolution, interpolation)
+        if self.lazy:
+            self._defer(self._get_resized, resolution=resolution, interpolation=interpolation, executor='serial')
+        else:
+            self.train_x = self._get_resized(self.train_x, resolution, interpolation, executor)
+            self.test_x = self._get_resized(self.test_x, resolution, interpolation, executor)
         self.resolution = resolution
 
     @staticmethod
-    def _get_resized(data: np.ndarray, resolution: int, interpolation: int) -> np.ndarray:
+    def _get_resized(
+            data: np.ndarray,
+            resolution: int,
+            interpolation: int,
+            executor: Union[Executor, str, None] = None,
+            verbose=True
+    ) -> np.ndarray:
         """
         Helper function to resize all images in :py:data:`data` to the given :py:data:`resolution` with the given
         :py:data:`iterpolation` method.
@@ -246,76 +468,88 @@ class CharacterDataset:
             data(:py:class:`numpy.ndarray`): An array of images.
             resolution(int): The desired width/height of the images.
             interpolation(interpolation: int): A OpenCV interpolation method code.
+            executor(Union[Executor, str, None], optional): The executor to use, see
+                :py:func:`get_executor() <simulation.data.executor.get_executor>`. (Default value = None)
+            verbose(bool, optional): If False, do not show a progress bar. (Default value = True)
 
         Returns:
             :py:class:`numpy.ndarray`: The resized images as an numpy array.
 
         """
+        if is_constant(data):
+            # All images are identical, so only one of them has to be resized
+            return broadcast_images(CharacterDataset._get_resized(np.array(data[:1]), resolution, interpolation,
+                                                                  'serial', False), data.shape[0])
 
-        def _do_resize(img: np.ndarray) -> np.ndarray:
+        def _do_resize(imgs: np.ndarray) -> np.ndarray:
             """
-            Helper function for resizing images in parallel.
+            Helper function for resizing chunks of images in parallel.
 
             Args:
-            img(:py:class:`numpy.ndarray`): The image to resize.
+            imgs(:py:class:`numpy.ndarray`): The images to resize.
 
             Returns:
-            :py:class:`numpy.ndarray`: The resized image
+            :py:class:`numpy.ndarray`: The resized images
 
             """
-            img = cv2.resize(img, (resolution, resolution), interpolation=interpolation)
-            return img
+            return resize_batch(imgs, (resolution, resolution), interpolation)
 
         # Allocate an array for the shape with the new resolution
         num_digits = data.shape[0]
-        if data.shape.__len__() == 4:
-            shape = tuple([num_digits] + [resolution, resolution] + [data.shape[3]])
-        else:
-            shape = (num_digits, resolution, resolution)
-        new_digits = np.zeros(shape, dtype=np.uint8)
-
-        # Run the resize operation on all images in parallel
-        resized_images = p_map(_do_resize, [data[i] for i in range(num_digits)],
-                               desc="Resizing images",
-                               num_cpus=os.cpu_count())
-        # Copy the resized images to the newly allocated array
-        for i, img in enumerate(resized_images):
-            new_digits[i] = img
+        new_digits = np.empty((num_digits, resolution, resolution) + data.shape[3:], dtype=np.uint8)
 
-        return new_digits
+        # Run the resize operation on all images in parallel, writing the results to the newly allocated array
+        return get_executor(executor).map_chunks(_do_resize, data, out=new_digits, desc="Resizing images",
+                                                 disable=not verbose)
 
-    def cvt_color(self, mode=cv2.COLOR_GRAY2BGRA):
+    def cvt_color(self, mode=cv2.COLOR_GRAY2BGRA, executor: Union[Executor, str, None] = None):
         """
         Convert all images in the dataset to the specified colorspace.
         If mode is 'cv2.COLOR_GRAY2BGRA', optimized code is used, which also assigns correct alpha values.
 
         Args:
             mode(int, optional): The OpenCV color space conversion code. (Default value = cv2.COLOR_GRAY2BGRA)
+            executor(Union[Executor, str, None], optional): The executor to use, see
+                :py:func:`get_executor() <simulation.data.executor.get_executor>`. (Default value = None)
 
         Returns:
             None
 
         """
-        self.train_x = self._get_with_colorspace(self.train_x, mode)
-        self.test_x = self._get_with_colorspace(self.test_x, mode)
+        if self.lazy:
+            self._defer(self._get_with_colorspace, mode=mode, executor='serial')
+        else:
+            self.train_x = self._get_with_colorspace(self.train_x, mode, executor)
+            self.test_x = self._get_with_colorspace(self.test_x, mode, executor)
 
     @staticmethod
-    def _get_with_colorspace(data: np.ndarray, mode: int) -> np.ndarray:
+    def _get_with_colorspace(
+            data: np.ndarray,
+            mode: int,
+            executor: Union[Executor, str, None] = None,
+            verbose=True
+    ) -> np.ndarray:
         """
         Helper function to convert all images in :py:data:`data` to the given colorspace.
 
         Args:
             data(:py:class:`numpy.ndarray`): An array of images.
             mode(int): An OpenCV colorspace code.
+            executor(Union[Executor, str, None], optional): The executor to use, see
+                :py:func:`get_executor() <simulation.data.executor.get_executor>`. (Default value = None)
+            verbose(bool, optional): If False, do not show a progress bar. (Default value = True)
 
         Returns:
             :py:class:`numpy.ndarray`: The images in the new colorspace as an numpy array.
 
         """
+        if is_constant(data):
+            return broadcast_images(CharacterDataset._get_with_colorspace(np.array(data[:1]), mode, 'serial', False),
+                                    data.shape[0])
         if mode == cv2.COLOR_GRAY2BGRA:
             # If mode is grayscale to RGBA, use optimized code instead of ordinary cvtColor
             # Also assigns correct alpha values
-            tq = tqdm(desc="Changing colorspace", total=data.shape[0])
+            tq = tqdm(desc="Changing colorspace", total=data.shape[0], disable=not verbose)
             shape = data.shape
             # Invert the original data and save as new alpha information
             alpha = cv2.bitwise_not(data)
@@ -327,8 +561,8 @@ class CharacterDataset:
             return data
         else:
             # Otherwise use cvtColor in parallel
-            def _do_cvtcolor(img):
-                return cv2.cvtColor(img, mode)
+            def _do_cvtcolor(imgs):
+                return np.stack([cv2.cvtColor(img, mode) for img in imgs])
 
             # Allocate an array for the shape of the new colorspace
             num_digits = data.shape[0]
@@ -336,15 +570,9 @@ class CharacterDataset:
             shape = tuple([num_digits] + shape)
             new_digits = np.zeros(shape, dtype=np.uint8)
 
-            # Run the color transformation in parallel
-            recolored_images = p_map(_do_cvtcolor, [data[i] for i in range(num_digits)],
-                                     desc="Changing colorspace",
-                                     num_cpus=os.cpu_count())
-            # Copy the new images into the array
-            for i, img in enumerate(recolored_images):
-                new_digits[i] = img
-
-            return new_digits
+            # Run the color transformation in parallel, writing the results to the newly allocated array
+            return get_executor(executor).map_chunks(_do_cvtcolor, data, out=new_digits, desc="Changing colorspace",
+                                                     disable=not verbose)
 
     def invert(self):
         """
@@ -354,22 +582,29 @@ class CharacterDataset:
              None
 
         """
-        self.train_x = self._get_inverted(self.train_x)
-        self.test_x = self._get_inverted(self.test_x)
+        if self.lazy:
+            self._defer(self._get_inverted)
+        else:
+            self.train_x = self._get_inverted(self.train_x)
+            self.test_x = self._get_inverted(self.test_x)
 
     @staticmethod
-    def _get_inverted(data: np.ndarray) -> np.ndarray:
+    def _get_inverted(data: np.ndarray, verbose=True) -> np.ndarray:
         """
         Helper function to invert all images in :py:data:`data`.
 
         Args:
             data(:py:class:`numpy.ndarray`): An array of images to invert.
+            verbose(bool, optional): If False, do not show a progress bar. (Default value = True)
 
         Returns:
             :py:class:`numpy.ndarray`: The inverted images.
 
         """
-        tq = tqdm(desc="Inverting images", total=data.shape[0])
+        if is_constant(data):
+            # Constant arrays are read-only, so invert a copy of the single image
+            return broadcast_images(cv2.bitwise_not(np.array(data[:1])), data.shape[0])
+        tq = tqdm(desc="Inverting images", total=data.shape[0], disable=not verbose)
         cv2.bitwise_not(data, data)
         tq.update(data.shape[0])
 
@@ -396,8 +631,12 @@ class CharacterDataset:
         """
         if all(p is None for p in [average_color, alpha_zero_value, max_of_channel]):
             average_color = (0, 1, 2)
-        self.train_x = self._get_with_alpha(self.train_x, average_color, alpha_zero_value, max_of_channel, invert)
-        self.test_x = self._get_with_alpha(self.test_x, average_color, alpha_zero_value, max_of_channel, invert)
+        if self.lazy:
+            self._defer(self._get_with_alpha, average_color=average_color, alpha_zero_value=alpha_zero_value,
+                        max_of_channel=max_of_channel, invert=invert)
+        else:
+            self.train_x = self._get_with_alpha(self.train_x, average_color, alpha_zero_value, max_of_channel, invert)
+            self.test_x = self._get_with_alpha(self.test_x, average_color, alpha_zero_value, max_of_channel, invert)
 
     @staticmethod
     def _get_with_alpha(
@@ -405,7 +644,8 @@ class CharacterDataset:
             average_color=None,
             alpha_zero_value: int = None,
             max_of_channel: Tuple[int] = None,
-            invert=True
+            invert=True,
+            verbose=True
     ) -> np.ndarray:
         """
         Helper function to induce the alpha for all images in :py:data:`data`.
@@ -419,12 +659,17 @@ class CharacterDataset:
             max_of_channel(Union[Tuple[int], List[int], None]): If given, set the alpha value to the maximum value of
                 the given color channels. (Default value = None)
             invert(bool, optional): If True, invert the alpha values. Default: True.
+            verbose(bool, optional): If False, do not show a progress bar. (Default value = True)
 
         Returns:
             :py:class:`numpy.ndarray`: The images with new alpha values.
 
         """
-        tq = tqdm(desc="Inducing alpha", total=data.shape[0])
+        if is_constant(data):
+            return broadcast_images(CharacterDataset._get_with_alpha(np.array(data[:1]), average_color,
+                                                                     alpha_zero_value, max_of_channel, invert, False),
+                                    data.shape[0])
+        tq = tqdm(desc="Inducing alpha", total=data.shape[0], disable=not verbose)
         if average_color is not None:
             # Compute the average across all given color channels
             alpha = np.average(data[:, :, :, average_color], axis=3)
@@ -737,7 +982,13 @@ class PrerenderedCharactersDataset(CuratedCharactersDataset):
 
 
 class ConcatDataset(CharacterDataset):
-    """Concatenates multiple datasets by copy into a single one. Old datasets can be removed afterwards."""
+    """
+    Concatenates multiple datasets by copy into a single one. Old datasets can be removed afterwards.
+
+    If all images of all datasets are the same single constant image (like in :py:class:`EmptyDataset`), the
+    concatenation is constant too and does not store the images.
+
+    """
 
     def __init__(self, *datasets: CharacterDataset, delete=True):
         """
@@ -760,6 +1011,15 @@ class ConcatDataset(CharacterDataset):
             test_size += d.test_x.shape[0]
         super(ConcatDataset, self).__init__(res)
 
+        image = self._common_constant_image(datasets)
+        if image is not None:
+            self.train_x: np.ndarray = broadcast_images(image, train_size)
+            self.train_y: np.ndarray = np.concatenate([d.train_y for d in datasets]).astype(int)
+            self.test_x: np.ndarray = broadcast_images(image, test_size)
+            self.test_y: np.ndarray = np.concatenate([d.test_y for d in datasets]).astype(int)
+            self._index_labels()
+            return
+
         self.train_x: np.ndarray = np.zeros((train_size, res, res), dtype=np.uint8)
         self.train_y: np.ndarray = np.zeros(train_size, dtype=int)
         self.test_x: np.ndarray = np.zeros((test_size, res, res), dtype=np.uint8)
@@ -779,12 +1039,48 @@ class ConcatDataset(CharacterDataset):
             if delete:
                 del d
 
+        self._index_labels()
+
+    def _index_labels(self):
+        """
+        Helper function to create the indices of all images by class.
+
+        Returns:
+            None
+
+        """
         self.train_indices_by_number = {i: np.flatnonzero(self.train_y == i) for i in range(0, 20)}
         self.test_indices_by_number = {i: np.flatnonzero(self.test_y == i) for i in range(0, 20)}
 
+    @staticmethod
+    def _common_constant_image(datasets: Tuple[CharacterDataset, ...]) -> Optional[np.ndarray]:
+        """
+        Helper function to check if all given datasets are constant with the same image.
+
+        Args:
+            datasets(Tuple[CharacterDataset, ...]): The datasets.
+
+        Returns:
+            Optional[numpy.ndarray]: The common image as a batch of one image, or None.
+
+        """
+        splits = [x for d in datasets for x in (d.train_x, d.test_x) if x.shape[0] > 0]
+        if not splits or not all(is_constant(x) for x in splits):
+            return None
+        image = np.array(splits[0][:1])
+        if image.ndim != 3 or not all(np.array_equal(x[:1], image) for x in splits):
+            return None
+        return image
+
 
 class EmptyDataset(CharacterDataset):
-    """A dataset of empty (black/zero-valued) images."""
+    """
+    A dataset of empty (black/zero-valued) images.
+
+    The images are not stored, :py:attr:`train_x` and :py:attr:`test_x` are read-only constant arrays (see
+    :py:func:`is_constant`) of a single zero image.
+
+    """
 
     def __init__(self, resolution, size=1000):
         """
@@ -799,7 +1095,7 @@ class EmptyDataset(CharacterDataset):
         super().__init__(resolution)
 
     def _load(self):
-        data = np.zeros((self.size, self.resolution, self.resolution), dtype=np.uint8)
+        data = broadcast_images(np.zeros((1, self.resolution, self.resolution), dtype=np.uint8), self.size)
         labels = np.full(self.size, CLASS_EMPTY, dtype=int)
         self._split(data, labels)
 
@@ -0,0 +1,383 @@
+"""
+Executors run dataset operations on many images in parallel.
+
+All executors share the same interface: :py:meth:`Executor.map` applies a function to a list of items and
+:py:meth:`Executor.map_chunks` applies a function to chunks of an array of images, collecting the results in a single
+output array. The executor used by the dataset operations can be chosen per call, or globally with
+:py:func:`set_default_executor`.
+"""
+
+import math
+import multiprocessing as mp
+import os
+import warnings
+from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.sharedctypes import RawArray
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+#: The default number of images per chunk in :py:meth:`Executor.map_chunks`.
+DEFAULT_CHUNK_SIZE = 256
+
+
+def available_cpus() -> int:
+    """
+    Get the number of CPUs this process may actually use. In contrast to :py:func:`os.cpu_count`, this respects the CPU
+    affinity mask and the CPU quota of the cgroup (v1 or v2) the process runs in, as set by container runtimes.
+
+    Returns:
+        int: The number of usable CPUs, at least 1.
+
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, int(math.ceil(quota)))
+    return max(1, cpus)
+
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """
+    Helper function which reads the CPU quota of the current cgroup.
+
+    Returns:
+        Optional[float]: The quota in CPUs, or None if there is no quota.
+
+    """
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: a quota of -1 means unlimited
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class Executor(metaclass=ABCMeta):
+    """Abstract base class for executors."""
+
+    #: If True, :py:meth:`map_chunks` writes directly into a given output array.
+    writes_in_place = True
+
+    def __init__(self, workers: Optional[int] = None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+
+
+        Args:
+            workers(int, optional): The number of workers. If None, use :py:func:`available_cpus`.
+                (Default value = None)
+            chunk_size(int, optional): The number of images per chunk in :py:meth:`map_chunks`.
+                (Default value = :py:data:`DEFAULT_CHUNK_SIZE`)
+
+        """
+        self.workers = workers if workers is not None else available_cpus()
+        self.chunk_size = chunk_size
+
+    @abstractmethod
+    def imap(self, fn: Callable, items: Sequence) -> Iterator:
+        """
+        Apply a function to all items, yielding the results in order.
+
+        Args:
+            fn(Callable): The function.
+            items(Sequence): The items.
+
+        Returns:
+            Iterator: The results.
+
+        """
+        pass
+
+    def map(self, fn: Callable, items: Iterable, desc: str = None, **tqdm_kwargs) -> List:
+        """
+        Apply a function to all items with a progress bar.
+
+        Args:
+            fn(Callable): The function.
+            items(Iterable): The items.
+            desc(str, optional): The description of the progress bar. (Default value = None)
+            **tqdm_kwargs: Further arguments for the :py:class:`tqdm.tqdm` progress bar.
+
+        Returns:
+            list: The results in the order of the items.
+
+        """
+        items = list(items)
+        return list(tqdm(self.imap(fn, items), total=len(items), desc=desc, **tqdm_kwargs))
+
+    def empty(self, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        """
+        Allocate an output array, which all workers of this executor can write to.
+
+        Args:
+            shape(tuple[int, ...]): The shape of the array.
+            dtype: The dtype of the array.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The uninitialized array.
+
+        """
+        return np.empty(shape, dtype=dtype)
+
+    def map_chunks(
+            self,
+            fn: Callable[[np.ndarray], np.ndarray],
+            data: np.ndarray,
+            out: Optional[np.ndarray] = None,
+            desc: str = None,
+            **tqdm_kwargs
+    ) -> np.ndarray:
+        """
+        Apply a function to chunks of :py:attr:`chunk_size` images and collect the results in a single array. The
+        function must return one result for each image of a chunk, all with the same shape and dtype.
+
+        Args:
+            fn(Callable[[numpy.ndarray], numpy.ndarray]): The function.
+            data(:py:class:`numpy.ndarray`): The images.
+            out(:py:class:`numpy.ndarray`, optional): The array to write the results to. If None, a new array is
+                allocated. (Default value = None)
+            desc(str, optional): The description of the progress bar. (Default value = None)
+            **tqdm_kwargs: Further arguments for the :py:class:`tqdm.tqdm` progress bar.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The results.
+
+        """
+        count = data.shape[0]
+        if count == 0:
+            return out if out is not None else data.copy()
+        chunk_size = self.chunk_size
+
+        with tqdm(total=count, desc=desc, **tqdm_kwargs) as tq:
+            # Run the first chunk in the calling thread to get the shape and dtype of the results
+            first = fn(data[:chunk_size])
+            shape = (count,) + first.shape[1:]
+            if out is not None and self.writes_in_place:
+                target = out
+            else:
+                target = self.empty(shape, first.dtype)
+            target[:first.shape[0]] = first
+            tq.update(first.shape[0])
+
+            def _run_chunk(start):
+                stop = min(start + chunk_size, count)
+                target[start:stop] = fn(data[start:stop])
+                return stop - start
+
+            for done in self.imap(_run_chunk, range(chunk_size, count, chunk_size)):
+                tq.update(done)
+
+        if out is not None and target is not out:
+            out[:] = target
+            return out
+        return target
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(workers={self.workers}, chunk_size={self.chunk_size})"
+
+
+class SerialExecutor(Executor):
+    """Runs everything in the calling thread. Useful for debugging and profiling."""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+
+
+        Args:
+            chunk_size(int, optional): The number of images per chunk in :py:meth:`map_chunks`.
+                (Default value = :py:data:`DEFAULT_CHUNK_SIZE`)
+
+        """
+        super().__init__(1, chunk_size)
+
+    def imap(self, fn: Callable, items: Sequence) -> Iterator:
+        return map(fn, items)
+
+
+class ThreadExecutor(Executor):
+    """
+    Runs functions on a pool of threads. OpenCV and most of numpy release the GIL, so threads are usually the fastest
+    option for image operations, as no data has to be copied between processes.
+
+    """
+
+    def imap(self, fn: Callable, items: Sequence) -> Iterator:
+        if len(items) == 0:
+            return
+        with ThreadPoolExecutor(min(self.workers, len(items))) as pool:
+            yield from pool.map(fn, items)
+
+
+#: The function and items of the task of a :py:class:`ProcessExecutor` worker, only set in the worker processes.
+_process_task: Optional[Tuple[Callable, Sequence]] = None
+
+
+def _init_process_worker(fn: Callable, items: Sequence):
+    """
+    Initializer of the :py:class:`ProcessExecutor` workers. The arguments are inherited by the forked workers, not
+    pickled.
+
+    Args:
+        fn(Callable): The function of the task.
+        items(Sequence): The items of the task.
+
+    Returns:
+        None
+
+    """
+    global _process_task
+    _process_task = (fn, items)
+    # Forked workers inherit the random state, so they would all produce the same random numbers
+    np.random.seed()
+    # Each worker is busy on its own, avoid oversubscription through OpenCV's internal threads
+    cv2.setNumThreads(1)
+
+
+def _run_process_item(index: int):
+    """
+    Run the current :py:class:`ProcessExecutor` task on a single item.
+
+    Args:
+        index(int): The index of the item.
+
+    Returns:
+        The result of the task's function.
+
+    """
+    fn, items = _process_task
+    return fn(items[index])
+
+
+class ProcessExecutor(Executor):
+    """
+    Runs functions on a pool of forked processes.
+
+    Functions and data are not pickled, but inherited by the forked workers, so closures and large arrays can be used
+    freely. The results of :py:meth:`map_chunks` are written to shared memory. Only the return values of
+    :py:meth:`map` have to be pickled.
+
+    If the platform does not support forking, a :py:class:`ThreadExecutor` is used instead.
+
+    """
+    writes_in_place = False
+
+    def __init__(self, workers: Optional[int] = None, chunk_size=DEFAULT_CHUNK_SIZE):
+        super().__init__(workers, chunk_size)
+        self.fork = 'fork' in mp.get_all_start_methods()
+        if not self.fork:
+            warnings.warn("Forking is not supported on this platform, using threads instead.")
+
+    def imap(self, fn: Callable, items: Sequence) -> Iterator:
+        if len(items) == 0:
+            return
+        if not self.fork:
+            yield from ThreadExecutor(self.workers).imap(fn, items)
+            return
+        # Each pool gets its own task through the initializer, so several tasks can be iterated at the same time
+        context = mp.get_context('fork')
+        with context.Pool(min(self.workers, len(items)), initializer=_init_process_worker,
+                          initargs=(fn, items)) as pool:
+            yield from pool.imap(_run_process_item, range(len(items)))
+
+    def empty(self, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        if not self.fork:
+            return super().empty(shape, dtype)
+        return shared_empty(shape, dtype)
+
+
+def shared_empty(shape: Tuple[int, ...], dtype) -> np.ndarray:
+    """
+    Allocate an uninitialized array in shared memory, which is shared with processes forked afterwards.
+
+    Args:
+        shape(tuple[int, ...]): The shape of the array.
+        dtype: The data type of the array.
+
+    Returns:
+        :py:class:`numpy.ndarray`: The array.
+
+    """
+    dtype = np.dtype(dtype)
+    buffer = RawArray('b', max(1, int(np.prod(shape)) * dtype.itemsize))
+    return np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+
+#: Executor classes by name, see :py:func:`get_executor`.
+EXECUTORS = {
+    'serial': SerialExecutor,
+    'thread': ThreadExecutor,
+    'process': ProcessExecutor,
+}
+
+_default_executor: Optional[Executor] = None
+
+
+def set_default_executor(executor: Union[Executor, str, None]):
+    """
+    Set the executor used by all dataset operations, which are not given an executor explicitly.
+
+    Args:
+        executor(Union[Executor, str, None]): The executor, or one of the names in :py:data:`EXECUTORS`. If None,
+            reset to the default, a :py:class:`ThreadExecutor` with :py:func:`available_cpus` workers.
+
+    Returns:
+        None
+
+    """
+    global _default_executor
+    _default_executor = get_executor(executor) if executor is not None else None
+
+
+def get_default_executor() -> Executor:
+    """
+    Get the executor used by all dataset operations, which are not given an executor explicitly.
+
+    Returns:
+        Executor: The default executor.
+
+    """
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = ThreadExecutor()
+    return _default_executor
+
+
+def get_executor(executor: Union[Executor, str, None] = None) -> Executor:
+    """
+    Resolve the executor argument of a dataset operation.
+
+    Args:
+        executor(Union[Executor, str, None], optional): An executor, one of the names in :py:data:`EXECUTORS`, or None
+            for the default executor. (Default value = None)
+
+    Returns:
+        Executor: The executor.
+
+    """
+    if executor is None:
+        return get_default_executor()
+    if isinstance(executor, str):
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor '{executor}', expected one of {list(EXECUTORS.keys())}")
+        return EXECUTORS[executor]()
+    return executor
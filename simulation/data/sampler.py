@@ -0,0 +1,240 @@
+"""
+Samplers which draw indices of training samples.
+
+The :py:class:`ClassBalancedSampler` draws class balanced samples from per-class index tables. Each draw takes constant
+time and no per-epoch index arrays are necessary, so its memory does not depend on the size of the largest dataset or
+class.
+
+:py:func:`block_shuffle` creates an almost random sample order which reads memory-mapped data mostly sequentially.
+Running this module benchmarks it against a full permutation.
+"""
+
+import os
+import tempfile
+import time
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+#: The size of a memory page in bytes, the unit in which memory-mapped data is read.
+PAGE_SIZE = 4096
+
+#: The type of class weights accepted by :py:class:`ClassBalancedSampler`.
+ClassWeights = Union[np.ndarray, Dict[int, float]]
+
+
+class AliasTable:
+    """
+    Walker's alias method for drawing from a discrete distribution in constant time per sample.
+
+    :sources: https://en.wikipedia.org/wiki/Alias_method
+
+    """
+
+    def __init__(self, weights: np.ndarray):
+        """
+
+
+        Args:
+            weights(:py:class:`numpy.ndarray`): The non-negative weights of the outcomes. Need not be normalized.
+
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim != 1 or weights.size == 0 or (weights < 0).any() or weights.sum() <= 0:
+            raise ValueError("The weights must be a non-empty vector of non-negative values with a positive sum.")
+        size = weights.shape[0]
+        scaled = weights * size / weights.sum()
+
+        #: The probability of keeping the drawn column instead of taking its alias.
+        self.probabilities = np.ones(size, dtype=np.float64)
+        #: The alias of each column.
+        self.aliases = np.arange(size)
+
+        small = [i for i in range(size) if scaled[i] < 1.]
+        large = [i for i in range(size) if scaled[i] >= 1.]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= 1. - scaled[less]
+            (small if scaled[more] < 1. else large).append(more)
+        # Remaining columns are full up to rounding errors
+
+    def __len__(self):
+        return self.probabilities.shape[0]
+
+    def draw(self, count: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Draw outcomes.
+
+        Args:
+            count(int): The number of outcomes to draw.
+            rng(:py:class:`numpy.random.Generator`): The random number generator.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The drawn outcomes as indices into the weights.
+
+        """
+        columns = rng.integers(0, len(self), size=count)
+        keep = rng.random(count) < self.probabilities[columns]
+        return np.where(keep, columns, self.aliases[columns])
+
+
+class ClassBalancedSampler:
+    """
+    Draws sample indices so that the classes follow given target weights, uniform over all present classes by default.
+
+    Samples are drawn with replacement: first a class (uniformly or with an :py:class:`AliasTable`), then a sample of
+    that class uniformly from a per-class index table. The index tables are a single sorted index array, so the memory
+    is proportional to the number of samples and independent of the class distribution.
+
+    """
+
+    def __init__(self, labels: np.ndarray, class_weights: Optional[ClassWeights] = None):
+        """
+
+
+        Args:
+            labels(:py:class:`numpy.ndarray`): The labels of all samples.
+            class_weights(Union[numpy.ndarray, dict[int, float]], optional): The target weight of each class, as array
+                indexed by class or as dict. Classes without samples are never drawn. If None, all present classes
+                have the same weight. (Default value = None)
+
+        """
+        labels = np.asarray(labels)
+        if labels.size == 0:
+            raise ValueError("Cannot sample from an empty dataset.")
+        #: The indices of all samples, sorted by class.
+        self.order = np.argsort(labels, kind='stable')
+        #: The classes present in the labels.
+        self.classes, starts, self.counts = np.unique(labels[self.order], return_index=True, return_counts=True)
+        self.starts = starts.astype(np.int64)
+
+        if class_weights is None:
+            self.table = None
+        else:
+            if isinstance(class_weights, dict):
+                weights = np.array([class_weights.get(int(cls), 0.) for cls in self.classes], dtype=np.float64)
+            else:
+                class_weights = np.asarray(class_weights, dtype=np.float64)
+                present = self.classes < class_weights.shape[0]
+                weights = np.where(present, class_weights[np.minimum(self.classes, class_weights.shape[0] - 1)], 0.)
+            self.table = AliasTable(weights)
+
+    @property
+    def probabilities(self) -> np.ndarray:
+        """The probability of drawing each class in :py:attr:`classes`."""
+        if self.table is None:
+            return np.full(self.classes.shape[0], 1. / self.classes.shape[0])
+        # The probability of each outcome, combined from its own column and the columns it is the alias of
+        size = len(self.table)
+        probabilities = self.table.probabilities / size
+        np.add.at(probabilities, self.table.aliases, (1. - self.table.probabilities) / size)
+        return probabilities
+
+    def draw(self, count: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Draw sample indices.
+
+        Args:
+            count(int): The number of samples to draw.
+            rng(:py:class:`numpy.random.Generator`): The random number generator.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The indices of the drawn samples.
+
+        """
+        if self.table is None:
+            classes = rng.integers(0, self.classes.shape[0], size=count)
+        else:
+            classes = self.table.draw(count, rng)
+        offsets = (rng.random(count) * self.counts[classes]).astype(np.int64)
+        return self.order[self.starts[classes] + offsets]
+
+
+def block_shuffle(count: int, rng: np.random.Generator, block_size: int, window=1) -> np.ndarray:
+    """
+    Create a block shuffled sample order. The samples are split into contiguous blocks of the given size and the order
+    of the blocks is shuffled. Then the samples are shuffled within windows of consecutive blocks of the new order.
+
+    Larger blocks read the data more sequentially, while larger windows mix the samples of more blocks within each
+    batch. A block size of 1 is a full permutation.
+
+    Args:
+        count(int): The number of samples.
+        rng(:py:class:`numpy.random.Generator`): The random number generator.
+        block_size(int): The number of samples per block.
+        window(int, optional): The number of consecutive blocks whose samples are shuffled together.
+            (Default value = 1)
+
+    Returns:
+        :py:class:`numpy.ndarray`: The sample order, a permutation of all indices.
+
+    """
+    blocks = -(-count // block_size)
+    indices = (rng.permutation(blocks)[:, np.newaxis] * block_size + np.arange(block_size)).ravel()
+    indices = indices[indices < count]
+    if window > 1:
+        # Sort by window number with random ties, which shuffles the samples within each window
+        keys = np.arange(indices.shape[0]) // (block_size * window) + rng.random(indices.shape[0])
+        indices = indices[np.argsort(keys)]
+    return indices
+
+
+def page_reads(order: np.ndarray, batch_size: int, sample_bytes: int, page_size=PAGE_SIZE) -> int:
+    """
+    Count the memory pages read when contiguously stored samples are gathered in batches of the given order.
+
+    Args:
+        order(:py:class:`numpy.ndarray`): The sample order.
+        batch_size(int): The batch size.
+        sample_bytes(int): The size of a sample in bytes.
+        page_size(int, optional): The page size in bytes. (Default value = PAGE_SIZE)
+
+    Returns:
+        int: The sum of the number of distinct pages read by each batch.
+
+    """
+    order = np.asarray(order, dtype=np.int64)
+    first = order * sample_bytes // page_size
+    spans = ((order + 1) * sample_bytes - 1) // page_size - first + 1
+    pages = np.repeat(first, spans) + (np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans))
+    batches = np.repeat(np.arange(order.shape[0]) // batch_size, spans)
+    return np.unique(batches * (int(pages.max()) + 1) + pages).shape[0]
+
+
+def _benchmark(count=200000, shape=(28, 28), batch_size=256, block_size=64, window=8):
+    """
+    Helper function to compare a full permutation with block shuffling on a memory-mapped dataset.
+
+    Returns:
+        None
+
+    """
+    rng = np.random.default_rng(0)
+    sample_bytes = int(np.prod(shape))
+    orders = {
+        'permutation': rng.permutation(count),
+        f'block_shuffle(block_size={block_size}, window={window})': block_shuffle(count, rng, block_size, window)
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "data.npy")
+        data = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(count,) + shape)
+        data[:] = 1
+        data.flush()
+        del data
+
+        print(f"{count} samples of {sample_bytes} bytes, batch size {batch_size}")
+        for name, order in orders.items():
+            data = np.load(path, mmap_mode='r')
+            start = time.perf_counter()
+            for i in range(0, count, batch_size):
+                data[np.sort(order[i:i + batch_size])].sum()
+            duration = time.perf_counter() - start
+            reads = page_reads(order, batch_size, sample_bytes)
+            print(f"{name}: {reads / -(-count // batch_size):.1f} page reads per batch, {duration:.2f}s (page cache)")
+            del data
+
+
+if __name__ == '__main__':
+    _benchmark()
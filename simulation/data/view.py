@@ -0,0 +1,214 @@
+"""
+Zero-copy views of datasets.
+
+A :py:class:`DatasetView` combines one or more (data, labels) datasets with an index array, a label lookup table and a
+class filter. The images are only gathered when a batch is requested, so differently filtered and labelled variants of
+the same data (like the 20-class, 10-class and binary training variants) all share a single copy of the images.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+#: The type of label mappings accepted by :py:class:`DatasetView`.
+LabelMap = Union[np.ndarray, Dict[int, int]]
+
+
+class DatasetView:
+    """A lazily filtered and relabelled view of one or more datasets."""
+
+    def __init__(
+            self,
+            *datasets: Tuple[np.ndarray, np.ndarray],
+            indices: Optional[np.ndarray] = None,
+            label_map: Optional[LabelMap] = None,
+            classes: Optional[Iterable[int]] = None
+    ):
+        """
+
+
+        Args:
+            datasets(tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]): A sequence of (data, labels) tuples.
+                The data arrays are referenced, not copied.
+            indices(:py:class:`numpy.ndarray`, optional): The indices of the samples in the view, relative to the
+                concatenation of all datasets. If None, use all samples. (Default value = None)
+            label_map(Union[numpy.ndarray, dict[int, int]], optional): A mapping of the original labels to new labels,
+                either as lookup table or dict. Labels missing in a dict are kept. (Default value = None)
+            classes(Iterable[int], optional): If given, only keep samples with these original labels. Applied before
+                the label mapping. (Default value = None)
+
+        """
+        self.sources = [dataset[0] for dataset in datasets]
+        #: The start offset of each dataset in the concatenation of all datasets.
+        self.offsets = np.cumsum([0] + [dataset[1].shape[0] for dataset in datasets])
+        #: The original labels of all datasets.
+        self.source_labels: np.ndarray = np.concatenate([np.asarray(dataset[1]) for dataset in datasets]) \
+            if datasets else np.empty(0, dtype=int)
+
+        self.indices: np.ndarray = np.arange(self.offsets[-1]) if indices is None else np.asarray(indices)
+        self.lut: Optional[np.ndarray] = None
+        if classes is not None:
+            self.indices = self.indices[np.isin(self.source_labels[self.indices], list(classes))]
+        if label_map is not None:
+            self.lut = self.remap(label_map).lut
+
+    def _copy(self, indices: np.ndarray, lut: Optional[np.ndarray]) -> 'DatasetView':
+        """
+        Helper function to create a new view of the same datasets.
+
+        Args:
+            indices(:py:class:`numpy.ndarray`): The indices of the new view.
+            lut(:py:class:`numpy.ndarray`, optional): The label lookup table of the new view.
+
+        Returns:
+            DatasetView: The new view.
+
+        """
+        view = DatasetView.__new__(DatasetView)
+        view.sources = self.sources
+        view.offsets = self.offsets
+        view.source_labels = self.source_labels
+        view.indices = indices
+        view.lut = lut
+        return view
+
+    def __len__(self) -> int:
+        return self.indices.shape[0]
+
+    def __getitem__(self, item) -> Tuple[np.ndarray, np.ndarray]:
+        return self.gather(item), self.labels[item]
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """The shape of the images in this view as if they were stored in a single array."""
+        sample_shape = self.sources[0].shape[1:] if self.sources else ()
+        return (len(self),) + sample_shape
+
+    @property
+    def original_labels(self) -> np.ndarray:
+        """The labels of all samples in this view before remapping."""
+        return self.source_labels[self.indices]
+
+    @property
+    def labels(self) -> np.ndarray:
+        """The (remapped) labels of all samples in this view."""
+        labels = self.original_labels
+        return self.lut[labels] if self.lut is not None else labels
+
+    def filter(self, classes: Iterable[int]) -> 'DatasetView':
+        """
+        Create a view which only contains samples with the given (remapped) labels.
+
+        Args:
+            classes(Iterable[int]): The labels to keep.
+
+        Returns:
+            DatasetView: The filtered view.
+
+        """
+        return self._copy(self.indices[np.isin(self.labels, list(classes))], self.lut)
+
+    def drop(self, classes: Iterable[int]) -> 'DatasetView':
+        """
+        Create a view without the samples with the given (remapped) labels.
+
+        Args:
+            classes(Iterable[int]): The labels to drop.
+
+        Returns:
+            DatasetView: The filtered view.
+
+        """
+        return self._copy(self.indices[np.isin(self.labels, list(classes), invert=True)], self.lut)
+
+    def remap(self, label_map: LabelMap) -> 'DatasetView':
+        """
+        Create a view with remapped labels. The mapping is applied to the current labels of this view.
+
+        Args:
+            label_map(Union[numpy.ndarray, dict[int, int]]): A lookup table or dict of the current labels to the new
+                labels.
+
+        Returns:
+            DatasetView: The relabelled view.
+
+        """
+        # The lookup table must cover all labels the current labels can take
+        domain = self.lut if self.lut is not None else self.source_labels
+        size = int(domain.max()) + 1 if domain.size else 0
+        if isinstance(label_map, dict):
+            lut = np.arange(max([size] + [key + 1 for key in label_map.keys()]))
+            for key, value in label_map.items():
+                lut[key] = value
+        else:
+            lut = np.asarray(label_map)
+            if lut.shape[0] < size:
+                lut = np.concatenate([lut, np.arange(lut.shape[0], size)])
+        # Compose the lookup tables, so the labels are still remapped in a single step
+        if self.lut is not None:
+            lut = lut[self.lut]
+        return self._copy(self.indices, lut)
+
+    def subset(self, indices: np.ndarray) -> 'DatasetView':
+        """
+        Create a view of a subset of the samples of this view.
+
+        Args:
+            indices(:py:class:`numpy.ndarray`): Indices or a boolean mask relative to this view.
+
+        Returns:
+            DatasetView: The new view.
+
+        """
+        return self._copy(self.indices[indices], self.lut)
+
+    def gather(self, item=slice(None), out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Gather the images of the given samples of this view from the underlying datasets.
+
+        Args:
+            item(Union[int, slice, numpy.ndarray], optional): The samples of this view to gather.
+                (Default value = slice(None))
+            out(:py:class:`numpy.ndarray`, optional): The array to write the images to. If None, a new array is
+                allocated. (Default value = None)
+
+        Returns:
+            :py:class:`numpy.ndarray`: The images.
+
+        """
+        indices = self.indices[item]
+        if np.ndim(indices) == 0:
+            source = int(np.searchsorted(self.offsets, indices, side='right')) - 1
+            return self.sources[source][indices - self.offsets[source]]
+
+        if len(self.sources) == 1:
+            if out is None:
+                return self.sources[0][indices]
+            out[:] = self.sources[0][indices]
+            return out
+        if out is None:
+            out = np.empty(indices.shape + self.shape[1:], dtype=self.sources[0].dtype)
+        source_ids = np.searchsorted(self.offsets, indices, side='right') - 1
+        for source, data in enumerate(self.sources):
+            mask = source_ids == source
+            if mask.any():
+                out[mask] = data[indices[mask] - self.offsets[source]]
+        return out
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(samples={len(self)}, sources={len(self.sources)}, " \
+               f"remapped={self.lut is not None})"
+
+
+def as_view(dataset: Union[Tuple[np.ndarray, np.ndarray], DatasetView]) -> DatasetView:
+    """
+    Get a view of a dataset.
+
+    Args:
+        dataset(Union[tuple[numpy.ndarray, numpy.ndarray], DatasetView]): A (data, labels) tuple or a view.
+
+    Returns:
+        DatasetView: The dataset itself, if it is a view. Else, a new view of the dataset.
+
+    """
+    return dataset if isinstance(dataset, DatasetView) else DatasetView(dataset)
@@ -0,0 +1,99 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+from simulation.data import CharacterDataset
+from simulation.transforms import *
+from simulation.transforms.batch import pack_mosaic, unpack_mosaic, resize_batch
+
+
+class BatchTransformTests(TestCase):
+    def setUp(self):
+        self.imgs = np.random.randint(0, 256, (300, 28, 28), dtype=np.uint8)
+
+    def assert_batch_equals_single(self, transform, imgs=None):
+        imgs = self.imgs if imgs is None else imgs
+        expected = np.stack([transform.apply(img) for img in imgs])
+        np.testing.assert_array_equal(transform.apply_batch(imgs), expected)
+
+    def test_mosaic_roundtrip(self):
+        mosaic = pack_mosaic(self.imgs, 2)
+        self.assertEqual(mosaic.shape, (300 * 32, 32))
+        np.testing.assert_array_equal(unpack_mosaic(mosaic, 300, 2), self.imgs)
+
+    def test_filters(self):
+        for transform in [BoxBlur(), BoxBlur(4), GaussianBlur(), GaussianBlur(5, iterations=2), GaussianBlur(0, 1.5),
+                          Dilate(), Dilate(size=(5, 5), iterations=2), SharpenFilter(), ReliefFilter(), EdgeFilter(),
+                          UnsharpMaskingFilter3x3(), UnsharpMaskingFilter5x5()]:
+            with self.subTest(transform=transform.__class__.__name__):
+                self.assert_batch_equals_single(transform)
+
+    def test_color_images(self):
+        imgs = np.random.randint(0, 256, (10, 28, 28, 4), dtype=np.uint8)
+        self.assert_batch_equals_single(GaussianBlur(), imgs)
+        self.assert_batch_equals_single(Rescale((14, 14)), imgs)
+
+    def test_rescale(self):
+        for transform in [Rescale((14, 14)), Rescale((92, 92), cv2.INTER_LINEAR, cv2.INTER_AREA),
+                          RescaleIntermediateTransforms((14, 14), [Dilate(), JPEGEncode()])]:
+            with self.subTest(transform=transform.__class__.__name__):
+                self.assert_batch_equals_single(transform)
+
+    def test_resize_batch_into_target(self):
+        out = np.zeros((300, 20, 20), dtype=np.uint8)
+        resize_batch(self.imgs, (20, 20), cv2.INTER_AREA, out=out)
+        np.testing.assert_array_equal(out[17], cv2.resize(self.imgs[17], (20, 20), interpolation=cv2.INTER_AREA))
+
+    def test_resize_batch(self):
+        for source, size, interpolation, max_channels in [
+            (28, 14, cv2.INTER_AREA, None), (56, 28, cv2.INTER_AREA, None), (128, 32, cv2.INTER_AREA, None),
+            (96, 32, cv2.INTER_NEAREST, None), (28, 14, cv2.INTER_LINEAR, None), (28, 20, cv2.INTER_AREA, None),
+            (14, 28, cv2.INTER_CUBIC, None), (14, 28, cv2.INTER_LINEAR, 4)
+        ]:
+            with self.subTest(source=source, size=size, interpolation=interpolation):
+                imgs = np.random.randint(0, 256, (50, source, source), dtype=np.uint8)
+                expected = np.stack([cv2.resize(img, (size, size), interpolation=interpolation) for img in imgs])
+                result = resize_batch(imgs, (size, size), interpolation, max_channels=max_channels)
+                np.testing.assert_array_equal(result, expected)
+
+    def test_dataset_resize(self):
+        imgs = np.random.randint(0, 256, (300, 56, 56, 4), dtype=np.uint8)
+        dataset = CharacterDataset(56, fast_resize=True)
+        dataset.train_x, dataset.train_y = imgs, np.arange(300)
+        dataset.test_x, dataset.test_y = imgs[:0], np.arange(0)
+        dataset.resize(28)
+        self.assertEqual(dataset.test_x.shape, (0, 28, 28, 4))
+        np.testing.assert_array_equal(dataset.train_x[123], cv2.resize(imgs[123], (28, 28), interpolation=cv2.INTER_AREA))
+
+    def test_default_batch_implementation(self):
+        transform = GaussianNoise()
+        self.assertEqual(transform.apply_batch(self.imgs).shape, self.imgs.shape)
+        self.assertEqual(transform.apply_batch(self.imgs[:0]).shape, (0, 28, 28))
+
+    def test_dataset_apply_transforms(self):
+        dataset = CharacterDataset(28)
+        dataset.train_x, dataset.train_y = self.imgs, np.arange(300)
+        dataset.test_x, dataset.test_y = self.imgs[:30], np.arange(30)
+        dataset.add_transforms(Dilate())
+        dataset.add_transforms(GaussianBlur(), JPEGEncode())
+        dataset.apply_transforms()
+        self.assertEqual(dataset.train_x.shape, (900, 28, 28))
+        np.testing.assert_array_equal(dataset.train_x[:300], self.imgs)
+        np.testing.assert_array_equal(dataset.train_x[300:600], Dilate().apply_batch(self.imgs))
+        np.testing.assert_array_equal(dataset.test_y, np.tile(np.arange(30), 3))
+
+    def test_embed_batch(self):
+        for transform in [EmbedInRectangle(), EmbedInGrid(), EmbedInGrid(0.3, 2)]:
+            with self.subTest(transform=transform.__class__.__name__):
+                np.random.seed(0)
+                batch = transform.apply_batch(self.imgs)
+                np.random.seed(0)
+                offset = np.array(transform.get_template((28, 28))[1].shape) - 28
+                offsets_x = np.random.randint(0, offset[0], 300)
+                offsets_y = np.random.randint(0, offset[1], 300)
+                for i in [0, 150, 299]:
+                    grid_image, offset_x, offset_y = transform.expand_image(self.imgs[i])
+                    transform.draw_overlay(grid_image, offset_x, offset_y)
+                    expected = grid_image[offsets_x[i]:offsets_x[i] + 28, offsets_y[i]:offsets_y[i] + 28]
+                    np.testing.assert_array_equal(batch[i], expected)
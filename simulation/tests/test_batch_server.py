@@ -0,0 +1,68 @@
+from unittest import TestCase
+
+import numpy as np
+
+from simulation.data import BalancedDataGenerator, BatchServer, SimpleDataGenerator
+
+
+def _invert(x: np.ndarray) -> np.ndarray:
+    return np.where(np.random.random((x.shape[0], 1, 1, 1)) < 0.5, 1 - x, x)
+
+
+class BatchServerTests(TestCase):
+    def setUp(self):
+        self.first = (np.random.randint(0, 256, (45, 6, 6), dtype=np.uint8), np.arange(45) % 5)
+        self.second = (np.random.randint(0, 256, (20, 6, 6), dtype=np.uint8), np.arange(20) % 5 + 5)
+
+    def assertSameBatches(self, server, generator):
+        self.assertEqual(len(server), len(generator))
+        for i in range(len(generator)):
+            x, y = server[i]
+            expected_x, expected_y = generator[i]
+            np.testing.assert_array_equal(x, expected_x)
+            np.testing.assert_array_equal(y, expected_y)
+
+    def test_simple_generator(self):
+        generator = SimpleDataGenerator(self.first, self.second, batch_size=8, seed=1)
+        with BatchServer(SimpleDataGenerator(self.first, self.second, batch_size=8, seed=1), workers=2,
+                         slots=3) as server:
+            for _ in range(2):
+                self.assertSameBatches(server, generator)
+                server.on_epoch_end()
+                generator.on_epoch_end()
+            self.assertEqual(server.state_dict(), generator.state_dict())
+
+            # Out of order access restarts prefetching
+            np.testing.assert_array_equal(server[5][1], generator[5][1])
+            np.testing.assert_array_equal(server[1][1], generator[1][1])
+
+            state = {'seed': 1, 'epoch': 4, 'cursor': 3}
+            server.load_state_dict(state)
+            generator.load_state_dict(state)
+            self.assertSameBatches(server, generator)
+
+    def test_balanced_generator(self):
+        generator = BalancedDataGenerator(self.first, self.second, batch_size=10, truncate=False, flatten=True, seed=2)
+        with BatchServer(BalancedDataGenerator(self.first, self.second, batch_size=10, truncate=False, flatten=True,
+                                               seed=2), workers=1, slots=2) as server:
+            self.assertSameBatches(server, generator)
+            self.assertEqual(server.num_classes, 20)
+
+    def test_augmentation(self):
+        make = lambda: BatchServer(SimpleDataGenerator(self.first, batch_size=16, seed=3), workers=2, augment=_invert)
+        with make() as server, make() as other:
+            generator = SimpleDataGenerator(self.first, batch_size=16, seed=3)
+            for i in range(len(server)):
+                x, y = server[i]
+                np.testing.assert_array_equal(x, other[i][0])
+                expected = generator[i][0]
+                self.assertTrue(np.all((x == expected) | (x == 1 - expected)))
+                np.testing.assert_array_equal(y, generator[i][1])
+
+    def test_worker_error(self):
+        def fail(x):
+            raise ValueError("augmentation failed")
+
+        with BatchServer(SimpleDataGenerator(self.first, batch_size=16), workers=1, augment=fail) as server:
+            with self.assertRaises(RuntimeError):
+                _ = server[0]
@@ -0,0 +1,74 @@
+from unittest import TestCase, mock
+
+import numpy as np
+
+from cascade import bucketed, CascadePredictor, compare_with_full_model
+from simulation.data import SimpleDataGenerator
+
+
+def _digit_model(x: np.ndarray) -> np.ndarray:
+    # Scores of 10 classes, the class is encoded in the first pixel of a cell
+    return np.eye(10)[np.rint(x[:, 0, 0, 0] * 255).astype(np.int64) % 10]
+
+
+class CascadeTests(TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def digit_model(x):
+            self.calls.append(x.shape[0])
+            return _digit_model(x)
+
+        self.cells = np.zeros((6, 4, 4, 1), dtype=np.float32)
+        self.cells[:, 0, 0, 0] = np.array([0, 3, 0, 7, 9, 0]) / 255
+        self.empty_probability = np.array([0.9, 0.1, 0.6, 0.4, 0.2, 0.5])
+        self.cascade = CascadePredictor(lambda x: self.empty_probability[:x.shape[0], np.newaxis], digit_model)
+
+    def test_threshold(self):
+        np.testing.assert_array_equal(self.cascade.predict(self.cells), [0, 3, 0, 7, 9, 0])
+        # Only the cells below the threshold are passed to the digit model
+        self.assertEqual(self.calls, [3])
+
+        self.cascade.empty_threshold = 0.95
+        self.calls.clear()
+        np.testing.assert_array_equal(self.cascade.predict(self.cells), [0, 3, 0, 7, 9, 0])
+        self.assertEqual(self.calls, [6])
+
+    def test_empty_frame(self):
+        self.empty_probability[:] = 1
+        self.cascade.empty_class = 10
+        np.testing.assert_array_equal(self.cascade.predict(self.cells), [10] * 6)
+        self.assertEqual(self.calls, [])
+
+    def test_bucketed(self):
+        created = []
+
+        def factory():
+            created.append(True)
+            return lambda x: (self.assertEqual(x.shape[0] % 3, 0), _digit_model(x))[1]
+
+        predict = bucketed(factory, bucket=3)
+        for count in (1, 2, 3, 4, 6, 5):
+            np.testing.assert_array_equal(predict(self.cells[:count]), _digit_model(self.cells[:count]))
+        self.assertEqual(len(created), 2)
+
+    def test_compare_with_full_model(self):
+        events = []
+
+        def factory():
+            events.append('create')
+            return _digit_model
+
+        cascade = CascadePredictor(lambda x: (x[:, 0, 0, 0] == 0).astype(np.float32), bucketed(factory, bucket=2))
+        labels = np.arange(24) % 4
+        x = np.zeros((24, 4, 4), dtype=np.uint8)
+        x[:, 0, 0] = labels
+        generator = SimpleDataGenerator((x, labels), batch_size=6, shuffle=False)
+        with mock.patch('cascade.time.perf_counter', side_effect=lambda: events.append('time') or len(events)):
+            result = compare_with_full_model(cascade, generator)
+        # All predictors are created during the warm up, none while timing
+        self.assertEqual(events.count('create'), 3)
+        self.assertNotIn('create', events[events.index('time'):])
+        self.assertEqual(result['cascade_accuracy'], 1)
+        self.assertEqual(result['full_accuracy'], 1)
+        self.assertEqual(result['skipped_cells'], 0.25)
@@ -0,0 +1,131 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import tensorflow.keras as keras
+
+from simulation.data import BalancedDataGenerator, ClassBalancedDataGenerator, SimpleDataGenerator, ToBinaryGenerator
+from simulation.data.data_generator import GeneratorCheckpoint
+
+
+class _Interrupt(Exception):
+    pass
+
+
+class _InterruptAt(keras.callbacks.Callback):
+    def __init__(self, epoch, batch):
+        super().__init__()
+        self.epoch, self.batch = epoch, batch
+        self.current = 0
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.current = epoch
+
+    def on_train_batch_end(self, batch, logs=None):
+        if (self.current, batch) == (self.epoch, self.batch):
+            raise _Interrupt()
+
+
+class GeneratorStateTests(TestCase):
+    def setUp(self):
+        self.first = (np.random.randint(0, 256, (40, 4, 4), dtype=np.uint8), np.arange(40) % 4)
+        self.second = (np.random.randint(0, 256, (25, 4, 4), dtype=np.uint8), np.arange(25) % 4 + 4)
+        self.generators = [
+            lambda seed: SimpleDataGenerator(self.first, self.second, batch_size=8, flatten=True, seed=seed),
+            lambda seed: BalancedDataGenerator(self.first, self.second, batch_size=8, flatten=True, truncate=False,
+                                               num_classes=8, seed=seed),
+            lambda seed: ClassBalancedDataGenerator(self.first, self.second, batch_size=8, flatten=True,
+                                                    num_classes=8, seed=seed)
+        ]
+
+    def test_seeded_order(self):
+        for make in self.generators:
+            first, second = make(7), make(7)
+            for generator in (first, second):
+                generator.on_epoch_end()
+            np.testing.assert_array_equal(first[2][1], second[2][1])
+            self.assertEqual(first.state_dict(), {'seed': 7, 'epoch': 1, 'cursor': 0})
+
+    def test_resume_mid_epoch(self):
+        for make in self.generators:
+            generator = make(11)
+            for _ in range(3):
+                generator.on_epoch_end()
+            expected = [generator[i] for i in range(len(generator))]
+
+            resumed = make(0)
+            resumed.load_state_dict({'seed': 11, 'epoch': 3, 'cursor': 2})
+            self.assertEqual(len(resumed), len(expected) - 2)
+            for i in range(len(resumed)):
+                np.testing.assert_array_equal(resumed[i][0], expected[i + 2][0])
+                np.testing.assert_array_equal(resumed[i][1], expected[i + 2][1])
+            resumed.on_epoch_end()
+            self.assertEqual(len(resumed), len(expected))
+            self.assertEqual(resumed.state_dict(), {'seed': 11, 'epoch': 4, 'cursor': 0})
+
+    def test_checkpoint(self):
+        def make_model():
+            model = keras.Sequential([keras.layers.InputLayer(input_shape=(16,)), keras.layers.Dense(8)])
+            model.compile(loss=keras.losses.SparseCategoricalCrossentropy(from_logits=True), optimizer='adam')
+            return model
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint")
+            generator = self.generators[0](5)
+            model = make_model()
+            checkpoint = GeneratorCheckpoint(generator, path, save_freq=3)
+            with self.assertRaises(_Interrupt):
+                model.fit(generator, epochs=3, shuffle=False, verbose=0,
+                          callbacks=[checkpoint, _InterruptAt(1, 4)])
+
+            resumed = self.generators[0](0)
+            restored = make_model()
+            state = GeneratorCheckpoint(resumed, path).load(restored)
+            self.assertFalse(state['finished'])
+            self.assertEqual(resumed.state_dict(), {'seed': 5, 'epoch': 1, 'cursor': 3})
+            self.assertEqual(len(resumed), generator.num_batches - 3)
+            for weights, restored_weights in zip(model.get_weights(), restored.get_weights()):
+                self.assertEqual(weights.shape, restored_weights.shape)
+
+            expected = self.generators[0](5)
+            expected.on_epoch_end()
+            np.testing.assert_array_equal(resumed[0][1], expected[3][1])
+
+    def test_checkpoint_fingerprint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint")
+            model = keras.Sequential([keras.layers.InputLayer(input_shape=(16,)), keras.layers.Dense(8)])
+            checkpoint = GeneratorCheckpoint(self.generators[0](5), path, fingerprint="a")
+            checkpoint.set_model(model)
+            checkpoint.save(2, 0, finished=True)
+
+            self.assertTrue(GeneratorCheckpoint(self.generators[0](0), path, fingerprint="a").load(model)['finished'])
+            resumed = self.generators[0](0)
+            with self.assertWarns(UserWarning):
+                self.assertIsNone(GeneratorCheckpoint(resumed, path, fingerprint="b").load(model))
+            self.assertEqual(resumed.state_dict(), {'seed': 0, 'epoch': 0, 'cursor': 0})
+
+
+class ToBinaryGeneratorTests(TestCase):
+    def setUp(self):
+        self.x = np.random.randint(0, 256, (40, 4, 4), dtype=np.uint8)
+        self.y = np.arange(40) % 20
+
+    def test_match_absent_class(self):
+        generator = ToBinaryGenerator((self.x, self.y), classes_to_match=[0, 25], batch_size=4, truncate=False)
+        np.testing.assert_array_equal(generator.all_labels, (self.y == 0).astype(self.y.dtype))
+        np.testing.assert_array_equal(generator.get_matching_indices([0, 25]), self.y == 0)
+
+    def test_match_class_missing_from_split(self):
+        generator = ToBinaryGenerator((self.x[self.y < 5], self.y[self.y < 5]), classes_to_match=range(1, 10),
+                                      batch_size=4, truncate=False)
+        np.testing.assert_array_equal(generator.all_labels, (self.y[self.y < 5] > 0).astype(self.y.dtype))
+
+    def test_iterate_samples(self):
+        # The truncating generator only yields 2 * 10 samples per epoch
+        generator = ToBinaryGenerator((self.x, self.y), classes_to_match=[1, 2], batch_size=4)
+        chunks = list(generator.iterate_samples(7))
+        self.assertEqual([chunk[0].shape[0] for chunk in chunks], [7, 7, 7, 7, 7, 5])
+        np.testing.assert_array_equal(np.concatenate([x for x, _ in chunks]), generator.get_data())
+        np.testing.assert_array_equal(np.concatenate([y for _, y in chunks]), generator.get_labels())
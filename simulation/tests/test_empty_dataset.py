@@ -0,0 +1,82 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+from simulation.data import EmptyDataset, ConcatDataset, CharacterDataset, DatasetView
+from simulation.data.dataset import is_constant, constant_image
+from simulation.transforms import ImageTransform, GaussianNoise, Dilate
+
+
+class CountingTransform(ImageTransform):
+    deterministic = True
+
+    def __init__(self):
+        self.count = 0
+
+    def apply(self, img: np.ndarray) -> np.ndarray:
+        self.count += 1
+        return cv2.bitwise_not(img)
+
+
+class EmptyDatasetTests(TestCase):
+    def test_storage_is_constant(self):
+        dataset = EmptyDataset(28, 12000)
+        self.assertEqual(len(dataset), 10800)
+        self.assertTrue(is_constant(dataset.train_x))
+        self.assertTrue(is_constant(dataset.test_x))
+        self.assertEqual(dataset.train_x.base.nbytes, 28 * 28)
+        self.assertFalse(dataset[[1, 5, 9]].any())
+        self.assertFalse(DatasetView(dataset.train).gather(np.arange(10)).any())
+
+    def test_operations_stay_constant(self):
+        dataset = EmptyDataset(56, 100)
+        dataset.resize(28)
+        dataset.invert()
+        dataset.cvt_color(cv2.COLOR_GRAY2BGRA)
+        dataset.induce_alpha()
+        self.assertTrue(is_constant(dataset.train_x))
+        self.assertEqual(dataset.train_x.shape, (90, 28, 28, 4))
+        np.testing.assert_array_equal(dataset.train_x[17, ..., :3], 255)
+        np.testing.assert_array_equal(dataset.train_x[17, ..., 3], 0)
+
+    def test_lazy_operations_stay_constant(self):
+        dataset = EmptyDataset(56, 100)
+        dataset.lazy = True
+        dataset.resize(28)
+        dataset.invert()
+        self.assertTrue(is_constant(dataset.train_x))
+        np.testing.assert_array_equal(dataset.test_x, 255)
+
+    def test_deterministic_transforms_run_once(self):
+        dataset = EmptyDataset(28, 1000)
+        counting = CountingTransform()
+        dataset.add_transforms(counting, GaussianNoise())
+        dataset.add_transforms(Dilate())
+        dataset.apply_transforms()
+        self.assertEqual(counting.count, 2)
+        self.assertEqual(dataset.train_x.shape, (2700, 28, 28))
+        self.assertFalse(dataset.train_x[:900].any())
+        # The random transform still varies per sample
+        self.assertGreater(len(np.unique(dataset.train_x[900:1800].reshape(900, -1), axis=0)), 1)
+        self.assertFalse(dataset.train_x[1800:].any())
+
+    def test_constant_image_by_content(self):
+        self.assertIsNotNone(constant_image(np.zeros((10, 28, 28), dtype=np.uint8), chunk_size=3))
+        data = np.zeros((10, 28, 28), dtype=np.uint8)
+        data[9, 3, 3] = 1
+        self.assertIsNone(constant_image(data, chunk_size=3))
+
+    def test_concat(self):
+        concat = ConcatDataset(EmptyDataset(28, 100), EmptyDataset(28, 50))
+        self.assertTrue(is_constant(concat.train_x))
+        self.assertEqual(concat.train_x.shape, (135, 28, 28))
+        self.assertEqual(concat.train_indices_by_number[0].shape[0], 135)
+
+        other = CharacterDataset(28)
+        other.train_x, other.train_y = np.full((10, 28, 28), 7, dtype=np.uint8), np.full(10, 3)
+        other.test_x, other.test_y = np.full((2, 28, 28), 7, dtype=np.uint8), np.full(2, 3)
+        mixed = ConcatDataset(other, EmptyDataset(28, 100))
+        self.assertFalse(is_constant(mixed.train_x))
+        self.assertEqual(mixed.train_x.shape, (100, 28, 28))
+        self.assertFalse(mixed.train_x[10:].any())
@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+from simulation.data import CharacterDataset, SerialExecutor, ThreadExecutor, ProcessExecutor, set_default_executor, \
+    get_default_executor
+from simulation.data.executor import available_cpus, get_executor
+from simulation.transforms import GaussianBlur
+
+
+class ExecutorTests(TestCase):
+    executors = [SerialExecutor(chunk_size=7), ThreadExecutor(2, chunk_size=7), ProcessExecutor(2, chunk_size=7)]
+
+    def test_map(self):
+        offset = 3
+        for executor in self.executors:
+            with self.subTest(executor=executor):
+                # Closures must work with every backend
+                self.assertEqual(executor.map(lambda x: x + offset, range(20), disable=True), list(range(3, 23)))
+
+    def test_map_chunks(self):
+        data = np.random.randint(0, 256, (50, 16, 16), dtype=np.uint8)
+        expected = np.stack([cv2.resize(img, (8, 8), interpolation=cv2.INTER_AREA) for img in data])
+
+        def _resize(imgs):
+            return np.stack([cv2.resize(img, (8, 8), interpolation=cv2.INTER_AREA) for img in imgs])
+
+        for executor in self.executors:
+            with self.subTest(executor=executor):
+                np.testing.assert_array_equal(executor.map_chunks(_resize, data, disable=True), expected)
+                out = np.zeros((50, 8, 8), dtype=np.uint8)
+                result = executor.map_chunks(_resize, data, out=out, disable=True)
+                self.assertIs(result, out)
+                np.testing.assert_array_equal(out, expected)
+
+    def test_empty_input(self):
+        for executor in self.executors:
+            with self.subTest(executor=executor):
+                self.assertEqual(executor.map(abs, [], disable=True), [])
+                self.assertEqual(executor.map_chunks(lambda x: x, np.zeros((0, 4, 4)), disable=True).shape, (0, 4, 4))
+
+    def test_processes_are_reseeded(self):
+        data = np.zeros((4, 1), dtype=np.float)
+        np.random.seed(0)
+        result = ProcessExecutor(2, chunk_size=1).map_chunks(lambda x: np.random.random(x.shape), data, disable=True)
+        self.assertEqual(len(np.unique(result)), 4)
+
+    def test_interleaved_process_tasks(self):
+        executor = ProcessExecutor(2, chunk_size=1)
+        first, second = executor.imap(lambda x: x + 1, range(4)), executor.imap(lambda x: x * 10, range(4))
+        self.assertEqual([(a, b) for a, b in zip(first, second)], [(1, 0), (2, 10), (3, 20), (4, 30)])
+        # A nested task in the consumer of a running task
+        nested = [executor.map(lambda y: x + y, range(2), disable=True) for x in executor.imap(abs, [-1, 2])]
+        self.assertEqual(nested, [[1, 2], [2, 3]])
+
+    def test_available_cpus(self):
+        self.assertGreaterEqual(available_cpus(), 1)
+
+    def test_default_executor(self):
+        try:
+            set_default_executor('serial')
+            self.assertIsInstance(get_default_executor(), SerialExecutor)
+            self.assertIs(get_executor(), get_default_executor())
+            self.assertIsInstance(get_executor('process'), ProcessExecutor)
+            with self.assertRaises(ValueError):
+                get_executor('gpu')
+        finally:
+            set_default_executor(None)
+        self.assertIsInstance(get_default_executor(), ThreadExecutor)
+
+
+class DatasetExecutorTests(TestCase):
+    def test_apply_transforms(self):
+        data = np.random.randint(0, 256, (40, 28, 28), dtype=np.uint8)
+        results = []
+        for executor in ['serial', 'thread', 'process']:
+            dataset = CharacterDataset(28)
+            dataset.train_x, dataset.train_y = data.copy(), np.arange(40)
+            dataset.test_x, dataset.test_y = data[:10].copy(), np.arange(10)
+            dataset.add_transforms(GaussianBlur())
+            dataset.apply_transforms(executor=executor)
+            dataset.resize(14, executor=executor)
+            results.append(dataset.train_x)
+        self.assertEqual(results[0].shape, (80, 14, 14))
+        np.testing.assert_array_equal(results[0], results[1])
+        np.testing.assert_array_equal(results[0], results[2])
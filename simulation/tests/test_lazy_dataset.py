@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+from simulation.data import CharacterDataset
+
+
+class LazyDatasetTests(TestCase):
+    @staticmethod
+    def create_dataset(lazy):
+        dataset = CharacterDataset(56)
+        dataset.lazy = lazy
+        imgs = np.random.RandomState(0).randint(0, 256, (600, 56, 56), dtype=np.uint8)
+        dataset.train_x, dataset.train_y = imgs[:500], np.arange(500)
+        dataset.test_x, dataset.test_y = imgs[500:], np.arange(100)
+        return dataset
+
+    @staticmethod
+    def run_pipeline(dataset):
+        dataset.resize(28)
+        dataset.invert()
+        dataset.cvt_color(cv2.COLOR_GRAY2BGRA)
+        dataset.induce_alpha(max_of_channel=(0, 1, 2))
+
+    def test_fused_matches_eager(self):
+        eager, lazy = self.create_dataset(False), self.create_dataset(True)
+        self.run_pipeline(eager)
+        self.run_pipeline(lazy)
+        self.assertEqual(len(lazy._pending), 4)
+        self.assertEqual(lazy.resolution, 28)
+        self.assertEqual(len(lazy), 500)
+        self.assertEqual(lazy._train_x.shape, (500, 56, 56))
+
+        chunks = list(lazy.iter_chunks(chunk_size=128, test=True))
+        self.assertEqual(len(chunks), 1)
+        np.testing.assert_array_equal(chunks[0][0], eager.test_x)
+
+        np.testing.assert_array_equal(lazy.train_x, eager.train_x)
+        self.assertFalse(lazy._pending)
+        np.testing.assert_array_equal(lazy.test_x, eager.test_x)
+        self.assertEqual(lazy.train_x.shape, (500, 28, 28, 4))
+
+    def test_original_images_are_not_modified(self):
+        dataset = self.create_dataset(True)
+        original = dataset._train_x
+        backup = original.copy()
+        dataset.invert()
+        dataset.materialize()
+        np.testing.assert_array_equal(original, backup)
+        np.testing.assert_array_equal(dataset.train_x, 255 - backup)
@@ -0,0 +1,51 @@
+import pickle
+from unittest import TestCase
+
+import numpy as np
+
+from simulation.transforms import MemoizedTransform, JPEGEncode, GaussianNoise, Dilate
+
+
+class MemoizedTransformTests(TestCase):
+    def test_hits_on_identical_inputs(self):
+        transform = MemoizedTransform(JPEGEncode())
+        empty = np.zeros((28, 28), dtype=np.uint8)
+        first = transform.apply(empty)
+        for _ in range(9):
+            np.testing.assert_array_equal(transform.apply(empty.copy()), first)
+        self.assertEqual(transform.misses, 1)
+        self.assertEqual(transform.hits, 9)
+        self.assertAlmostEqual(transform.hit_rate, 0.9)
+
+    def test_results_match_wrapped_transform(self):
+        transform = MemoizedTransform(Dilate())
+        img = np.random.randint(0, 256, (28, 28), dtype=np.uint8)
+        np.testing.assert_array_equal(transform.apply(img), Dilate().apply(img))
+        np.testing.assert_array_equal(transform.apply(img), Dilate().apply(img))
+
+    def test_cached_output_is_not_aliased(self):
+        transform = MemoizedTransform(Dilate())
+        img = np.zeros((28, 28), dtype=np.uint8)
+        transform.apply(img)[:] = 255
+        self.assertFalse(transform.apply(img).any())
+
+    def test_lru_eviction(self):
+        transform = MemoizedTransform(Dilate(), maxsize=2)
+        images = [np.full((28, 28), i, dtype=np.uint8) for i in range(3)]
+        for img in images:
+            transform.apply(img)
+        transform.apply(images[0])
+        self.assertEqual(transform.hits, 0)
+        transform.apply(images[2])
+        self.assertEqual(transform.hits, 1)
+
+    def test_warns_for_random_transforms(self):
+        with self.assertWarns(UserWarning):
+            MemoizedTransform(GaussianNoise())
+
+    def test_pickle_drops_cache(self):
+        transform = MemoizedTransform(JPEGEncode())
+        transform.apply(np.zeros((28, 28), dtype=np.uint8))
+        restored = pickle.loads(pickle.dumps(transform))
+        restored.apply(np.zeros((28, 28), dtype=np.uint8))
+        self.assertEqual(restored.misses, 2)
@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+import numpy as np
+import tensorflow.keras as keras
+from tensorflow.keras import layers
+
+from mining import score_samples, select_hard_examples
+from simulation.data.dataset import CLASS_OUT
+
+
+class MiningTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.y = np.repeat(np.arange(4), 50)
+        self.margins = rng.uniform(-1, 1, 200)
+        # Class 3 has only easy samples
+        self.margins[self.y == 3] = rng.uniform(0.6, 1, 50)
+
+    def test_select_hard_examples(self):
+        result = select_hard_examples(self.y, self.margins, margin_threshold=0.5, random_fraction=0.1,
+                                      rng=np.random.default_rng(1))
+        kept = np.zeros(200, dtype=bool)
+        kept[result.indices] = True
+        self.assertTrue(np.all(kept[self.margins < 0.5]))
+        self.assertTrue(np.all(np.diff(result.indices) > 0))
+        for cls in range(4):
+            self.assertGreaterEqual(np.sum(kept & (self.y == cls) & (self.margins >= 0.5)), 1)
+        self.assertEqual(np.sum(kept[self.y == 3]), 5)
+
+        self.assertEqual(result.misclassified, np.sum(self.margins < 0))
+        self.assertEqual(result.low_margin, np.sum((self.margins >= 0) & (self.margins < 0.5)))
+        self.assertEqual(result.misclassified + result.low_margin + result.random, result.indices.shape[0])
+
+    def test_keep_one_easy_sample(self):
+        result = select_hard_examples(self.y, self.margins, random_fraction=0)
+        self.assertEqual(result.random, 4)
+
+    def test_score_samples(self):
+        # A model predicting fixed logits, which favour the lower classes
+        logits = np.linspace(2, 0, 10).astype(np.float32)
+        model = keras.Sequential([
+            layers.InputLayer(input_shape=(28, 28, 1)),
+            layers.Flatten(),
+            layers.Dense(10, kernel_initializer='zeros', bias_initializer=keras.initializers.Constant(logits))
+        ])
+        probabilities = np.exp(logits) / np.sum(np.exp(logits))
+        y = np.array([0, 3, CLASS_OUT, 13, 19])
+        x = np.zeros((5, 28, 28), dtype=np.uint8)
+
+        margins = score_samples(model, x, y, to_simple_digit=True, batch_size=2)
+        expected = [probabilities[0] - probabilities[1], probabilities[3] - probabilities[0], 1,
+                    probabilities[3] - probabilities[0], probabilities[9] - probabilities[0]]
+        np.testing.assert_allclose(margins, expected, rtol=1e-5)
+        self.assertEqual(margins[2], 1)
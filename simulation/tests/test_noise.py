@@ -0,0 +1,92 @@
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+import numpy as np
+
+from simulation.transforms import GaussianNoise, UniformNoise, SpeckleNoise, PoissonNoise
+from simulation.transforms.noise import NoiseBank
+
+
+class NoiseBankTests(TestCase):
+    def test_windows_come_from_field(self):
+        bank = NoiseBank(lambda shape: np.arange(np.prod(shape)).reshape(shape), (64, 64), reuse=None)
+        noise = bank.draw(100, (28, 28))
+        self.assertEqual(noise.shape, (100, 28, 28))
+        self.assertEqual(noise.dtype, np.float32)
+        # Every window is a (possibly flipped or transposed) block of the field
+        for window in noise[:10]:
+            corner = window.min()
+            x, y = divmod(int(corner), 64)
+            block = bank._field[x:x + 28, y:y + 28]
+            self.assertEqual(np.sort(window, axis=None).tolist(), np.sort(block, axis=None).tolist())
+
+    def test_reuse_regenerates_field(self):
+        calls = []
+
+        def sampler(shape):
+            calls.append(shape)
+            return np.zeros(shape)
+
+        bank = NoiseBank(sampler, (64, 64), reuse=10)
+        for _ in range(5):
+            bank.draw(4, (28, 28))
+        self.assertEqual(len(calls), 3)
+
+    def test_shared_by_threads(self):
+        calls = []
+
+        def sampler(shape):
+            calls.append(shape)
+            time.sleep(0.001)
+            return np.zeros(shape)
+
+        bank = NoiseBank(sampler, (64, 64), reuse=10)
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: bank.draw(2, (28, 28)).shape, range(80)))
+        self.assertEqual(results, [(2, 28, 28)] * 80)
+        # Every field serves exactly five draws
+        self.assertEqual(len(calls), 16)
+
+    def test_field_is_not_pickled(self):
+        transform = GaussianNoise(bank_shape=(64, 64))
+        transform.apply(np.zeros((28, 28), dtype=np.uint8))
+        self.assertIsNone(pickle.loads(pickle.dumps(transform)).bank._field)
+
+    def test_noise_statistics(self):
+        for transform in [GaussianNoise(sigma=4.), GaussianNoise(sigma=4., bank_shape=(256, 256))]:
+            noise = transform.get_noise((512, 28, 28))
+            self.assertEqual(noise.dtype, np.float32)
+            self.assertAlmostEqual(float(noise.std()), 4., delta=0.2)
+
+    def test_apply_batch(self):
+        imgs = np.full((64, 28, 28), 128, dtype=np.uint8)
+        for transform in [GaussianNoise(), UniformNoise(), SpeckleNoise(sigma=64.),
+                          GaussianNoise(bank_shape=(128, 128)), UniformNoise(bank_shape=(128, 128)),
+                          SpeckleNoise(sigma=64., bank_shape=(128, 128))]:
+            with self.subTest(transform=transform.__class__.__name__):
+                result = transform.apply_batch(imgs)
+                self.assertEqual(result.dtype, np.uint8)
+                self.assertEqual(result.shape, imgs.shape)
+                self.assertFalse(np.array_equal(result[0], result[1]))
+
+
+class PoissonNoiseTests(TestCase):
+    @staticmethod
+    def reference(img):
+        img = img.astype(np.float) / 255.
+        noise = 2 ** np.ceil(np.log2(len(np.unique(img))))
+        noisy = np.random.poisson(img * noise) / float(noise) * 255
+        return np.clip(noisy, 0, 255).astype(np.uint8)
+
+    def test_batch_matches_reference(self):
+        imgs = np.random.randint(0, 256, (30, 28, 28), dtype=np.uint8)
+        imgs[:10] //= 64
+        imgs[10:20] = 0
+        np.random.seed(0)
+        expected = np.stack([self.reference(img) for img in imgs])
+        np.random.seed(0)
+        np.testing.assert_array_equal(PoissonNoise().apply_batch(imgs), expected)
+        np.random.seed(0)
+        np.testing.assert_array_equal(np.stack([PoissonNoise().apply(img) for img in imgs]), expected)
@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+import numpy as np
+
+from simulation.transforms import GammaCorrection, Quantize, IntensityRemap
+
+
+class LookupTableTransformTests(TestCase):
+    def setUp(self):
+        self.imgs = np.random.randint(0, 256, (16, 28, 28), dtype=np.uint8)
+
+    def test_gamma(self):
+        transform = GammaCorrection(0.5)
+        expected = np.rint(255. * (self.imgs / 255.) ** 0.5).astype(np.uint8)
+        np.testing.assert_array_equal(transform.apply(self.imgs[0]), expected[0])
+        np.testing.assert_array_equal(transform.apply_batch(self.imgs), expected)
+
+    def test_quantize(self):
+        result = Quantize(4).apply_batch(self.imgs)
+        self.assertEqual(result.dtype, np.uint8)
+        self.assertTrue(set(np.unique(result)).issubset({0, 85, 170, 255}))
+        np.testing.assert_array_equal(Quantize(256).apply_batch(self.imgs), self.imgs)
+
+    def test_remap(self):
+        result = IntensityRemap(64, 192).apply_batch(self.imgs)
+        self.assertGreaterEqual(result.min(), 64)
+        self.assertLessEqual(result.max(), 192)
+        np.testing.assert_array_equal(IntensityRemap().apply_batch(self.imgs), self.imgs)
+
+    def test_color_and_float_input(self):
+        transform = GammaCorrection(2.0)
+        color = np.random.randint(0, 256, (4, 28, 28, 3), dtype=np.uint8)
+        result = transform.apply_batch(color)
+        self.assertEqual(result.shape, color.shape)
+        np.testing.assert_array_equal(result[1], transform.apply(color[1]))
+        np.testing.assert_array_equal(transform.apply(self.imgs[0].astype(np.float)), transform.apply(self.imgs[0]))
+
+    def test_update_lut(self):
+        transform = GammaCorrection(1.0)
+        transform.gamma = 2.0
+        transform.update_lut()
+        np.testing.assert_array_equal(transform.apply_batch(self.imgs), GammaCorrection(2.0).apply_batch(self.imgs))
@@ -0,0 +1,90 @@
+from unittest import TestCase
+
+import numpy as np
+import tensorflow.keras as keras
+from tensorflow.keras import layers
+
+from pruning import ChannelPruning, max_output_difference, PruningSchedule, prunable_layers, strip_pruned
+from training import build_cnn
+
+
+def _mask(model: keras.Model, fraction: float) -> ChannelPruning:
+    pruning = ChannelPruning(PruningSchedule(fraction))
+    pruning.set_model(model)
+    pruning.update_masks(fraction)
+    return pruning
+
+
+class PruningTests(TestCase):
+    def test_schedule(self):
+        schedule = PruningSchedule(0.5, begin_epoch=1, end_epoch=4)
+        self.assertEqual(schedule.fraction(0), 0)
+        self.assertLess(schedule.fraction(1), schedule.fraction(2))
+        self.assertEqual(schedule.fraction(3), 0.5)
+        self.assertEqual(schedule.epochs, 4)
+        self.assertEqual(PruningSchedule(0.5, begin_epoch=2, end_epoch=2).epochs, 3)
+
+    def test_strip_cnn(self):
+        model = build_cnn(20)
+        # Random batch normalization statistics, so the masked parameters have to cancel them
+        for layer in model.layers:
+            if isinstance(layer, layers.BatchNormalization):
+                layer.set_weights([np.random.uniform(0.5, 2, weight.shape) for weight in layer.get_weights()])
+        self.assertEqual(model.count_params(), 133716)
+        _mask(model, 0.5)
+
+        stripped = strip_pruned(model)
+        self.assertEqual(stripped.count_params(), 34484)
+        self.assertEqual([layer.output_shape for layer in stripped.layers if isinstance(layer, layers.Conv2D)],
+                         [(None, 28, 28, 8), (None, 12, 12, 16), (None, 4, 4, 32), (None, 2, 2, 64)])
+        self.assertEqual(max_output_difference(model, stripped), 0.0)
+
+    def test_strip_flatten(self):
+        model = keras.Sequential([
+            layers.InputLayer(input_shape=(6, 6, 1)),
+            layers.Conv2D(8, (3, 3), activation='relu'),
+            layers.Flatten(),
+            layers.Dense(16, activation='relu'),
+            layers.Dense(3)
+        ])
+        pruning = _mask(model, 0.25)
+        self.assertEqual(prunable_layers(model), [0, 2])
+        self.assertEqual([int(np.sum(mask)) for mask in pruning.masks.values()], [6, 12])
+
+        stripped = strip_pruned(model)
+        # The flattened features of the removed channels are removed from the dense kernel at every position
+        self.assertEqual(stripped.layers[2].get_weights()[0].shape, (4 * 4 * 6, 12))
+        self.assertEqual(max_output_difference(model, stripped), 0.0)
+
+    def test_pruning_callback(self):
+        model = keras.Sequential([
+            layers.InputLayer(input_shape=(6, 6, 1)),
+            layers.Conv2D(8, (3, 3)),
+            layers.BatchNormalization(),
+            layers.Activation('relu'),
+            layers.Flatten(),
+            layers.Dense(3)
+        ])
+        model.compile(loss=keras.losses.SparseCategoricalCrossentropy(from_logits=True), optimizer='adam')
+        schedule = PruningSchedule(0.5, end_epoch=2)
+        pruning = ChannelPruning(schedule)
+        x, y = np.random.random((32, 6, 6, 1)), np.arange(32) % 3
+        model.fit(x, y, batch_size=8, epochs=schedule.epochs, verbose=0, callbacks=[pruning])
+
+        mask = pruning.masks[0]
+        self.assertEqual(int(np.sum(mask)), 4)
+        kernel, bias = model.layers[0].get_weights()
+        gamma, beta = model.layers[1].get_weights()[:2]
+        for weight in (kernel, bias, gamma, beta):
+            self.assertFalse(np.any(weight[..., ~mask]))
+        self.assertEqual(strip_pruned(model).layers[0].filters, 4)
+
+    def test_unsupported_layer(self):
+        model = keras.Sequential([
+            layers.InputLayer(input_shape=(6, 6, 1)),
+            layers.Conv2D(4, (3, 3)),
+            layers.GlobalAveragePooling2D(),
+            layers.Dense(3)
+        ])
+        with self.assertRaises(ValueError):
+            strip_pruned(model)
@@ -0,0 +1,101 @@
+from unittest import TestCase
+
+import numpy as np
+
+from simulation.data import AliasTable, ClassBalancedSampler, ClassBalancedDataGenerator, DatasetView, \
+    SimpleDataGenerator, block_shuffle
+from simulation.data.sampler import page_reads
+
+
+class AliasTableTests(TestCase):
+    def test_distribution(self):
+        weights = np.array([1., 0., 3., 6.])
+        table = AliasTable(weights)
+        draws = table.draw(200000, np.random.default_rng(0))
+        frequencies = np.bincount(draws, minlength=4) / draws.shape[0]
+        np.testing.assert_allclose(frequencies, weights / weights.sum(), atol=0.01)
+        self.assertEqual(frequencies[1], 0)
+
+    def test_invalid_weights(self):
+        with self.assertRaises(ValueError):
+            AliasTable(np.zeros(3))
+        with self.assertRaises(ValueError):
+            AliasTable(np.array([1., -1.]))
+
+
+class ClassBalancedSamplerTests(TestCase):
+    def setUp(self):
+        # Heavily imbalanced labels: 1000 samples of class 0, 10 of class 3 and 100 of class 7
+        self.labels = np.random.permutation(np.repeat([0, 3, 7], [1000, 10, 100]))
+
+    def test_uniform_classes(self):
+        sampler = ClassBalancedSampler(self.labels)
+        np.testing.assert_array_equal(sampler.classes, [0, 3, 7])
+        indices = sampler.draw(30000, np.random.default_rng(1))
+        frequencies = np.bincount(self.labels[indices], minlength=8)[[0, 3, 7]] / indices.shape[0]
+        np.testing.assert_allclose(frequencies, 1 / 3, atol=0.02)
+        # All samples of the rare class are drawn
+        self.assertEqual(np.unique(indices[self.labels[indices] == 3]).shape[0], 10)
+
+    def test_class_weights(self):
+        for weights in ({0: 1., 3: 2., 7: 1.}, np.array([1., 5., 5., 2., 5., 5., 5., 1.])):
+            sampler = ClassBalancedSampler(self.labels, weights)
+            np.testing.assert_allclose(sampler.probabilities, [.25, .5, .25])
+            indices = sampler.draw(40000, np.random.default_rng(2))
+            frequencies = np.bincount(self.labels[indices], minlength=8)[[0, 3, 7]] / indices.shape[0]
+            np.testing.assert_allclose(frequencies, [.25, .5, .25], atol=0.02)
+
+
+class ClassBalancedDataGeneratorTests(TestCase):
+    def setUp(self):
+        self.first = (np.random.randint(0, 256, (50, 8, 8), dtype=np.uint8), np.arange(50) % 2)
+        self.second = (np.random.randint(0, 256, (5, 8, 8), dtype=np.uint8), np.full(5, 2))
+
+    def test_batches(self):
+        generator = ClassBalancedDataGenerator(self.first, DatasetView(self.second), batch_size=300, seed=3)
+        self.assertEqual(len(generator), 1)
+        x, y = generator[0]
+        self.assertEqual(x.shape, (300, 8, 8, 1))
+        self.assertEqual(x.dtype, np.float32)
+        self.assertGreater(np.bincount(y)[2], 70)
+
+        # The images match their labels
+        data = np.vstack([self.first[0], self.second[0]])
+        labels = np.hstack([self.first[1], self.second[1]])
+        indices = generator.sampler.draw(300, np.random.default_rng([3, 0, 0]))
+        np.testing.assert_array_equal(x, data[indices, :, :, np.newaxis] / np.float32(255.))
+        np.testing.assert_array_equal(y, labels[indices])
+
+    def test_reproducible(self):
+        generator = ClassBalancedDataGenerator(self.first, self.second, batch_size=16, seed=4)
+        first_x, first_y = generator[1]
+        np.testing.assert_array_equal(generator[1][0], first_x)
+        generator.on_epoch_end()
+        self.assertFalse(np.array_equal(generator[1][1], first_y) and np.array_equal(generator[1][0], first_x))
+
+
+class BlockShuffleTests(TestCase):
+    def test_permutation(self):
+        rng = np.random.default_rng(5)
+        for count, block_size, window in ((1000, 64, 1), (1000, 64, 4), (999, 10, 3), (10, 32, 2)):
+            order = block_shuffle(count, rng, block_size, window)
+            np.testing.assert_array_equal(np.sort(order), np.arange(count))
+
+    def test_locality(self):
+        rng = np.random.default_rng(6)
+        order = block_shuffle(4096, rng, 64, 1)
+        # Without a window, each block stays contiguous
+        np.testing.assert_array_equal(np.diff(order.reshape(-1, 64), axis=1), 1)
+
+        permutation = page_reads(rng.permutation(20000), 256, 784)
+        blocked = page_reads(block_shuffle(20000, rng, 64, 8), 256, 784)
+        sequential = page_reads(np.arange(20000), 256, 784)
+        self.assertLess(blocked, permutation / 2)
+        self.assertLessEqual(sequential, blocked)
+        self.assertEqual(page_reads(np.arange(8), 4, 1024), 2)
+
+    def test_generator(self):
+        data = (np.random.randint(0, 256, (100, 4, 4), dtype=np.uint8), np.arange(100) % 20)
+        generator = SimpleDataGenerator(data, batch_size=10, block_size=10, shuffle_window=1, seed=7)
+        np.testing.assert_array_equal(np.sort(generator.indices), np.arange(100))
+        np.testing.assert_array_equal(generator.indices % 10, np.tile(np.arange(10), 10))
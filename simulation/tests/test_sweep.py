@@ -0,0 +1,64 @@
+from unittest import TestCase, mock
+
+from sweep import create_trials, successive_halving
+
+SPACE = {'learning_rate': [0.01, 0.1, 1.], 'batch_size': [64, 128, 256], 'width': [8]}
+
+
+class SweepTests(TestCase):
+    def run_sweep(self, accuracies, failures=(), **kwargs):
+        """Run successive halving with a stub rung, in which trial *i* reaches accuracies[i] * epochs."""
+        rungs = []
+
+        def run_rung(trials, epochs, *args):
+            rungs.append((epochs, [trial['id'] for trial in trials]))
+            for trial in trials:
+                if (trial['id'], epochs) in failures:
+                    trial.update(accuracy=float('nan'), failed=True)
+                else:
+                    trial.update(accuracy=accuracies[trial['id']] * epochs, images_per_second=1000., epochs=epochs)
+
+        trials = create_trials(SPACE)
+        with mock.patch('sweep.run_rung', side_effect=run_rung):
+            result = successive_halving(trials, "sweep/", (), (), **kwargs)
+        return result, rungs
+
+    def test_create_trials(self):
+        trials = create_trials(SPACE, seed=3)
+        self.assertEqual(len(trials), 9)
+        self.assertEqual([trial['id'] for trial in trials], list(range(9)))
+        self.assertEqual(trials[4], {'learning_rate': 0.1, 'batch_size': 128, 'width': 8, 'id': 4, 'seed': 3})
+
+        chosen = create_trials(SPACE, num_trials=4, seed=1)
+        self.assertEqual(len(chosen), 4)
+        self.assertEqual(chosen, create_trials(SPACE, num_trials=4, seed=1))
+        combinations = {(trial['learning_rate'], trial['batch_size']) for trial in chosen}
+        self.assertEqual(len(combinations), 4)
+        self.assertEqual(len(create_trials(SPACE, num_trials=20)), 9)
+
+    def test_promotion(self):
+        accuracies = [0.1, 0.5, 0.3, 0.9, 0.2, 0.8, 0.4, 0.6, 0.7]
+        result, rungs = self.run_sweep(accuracies, min_epochs=1, max_epochs=9, eta=3)
+        self.assertEqual(rungs, [(1, list(range(9))), (3, [3, 5, 8]), (9, [3])])
+        self.assertEqual([trial['id'] for trial in result], [3, 5, 8, 7, 1, 6, 2, 4, 0])
+        self.assertEqual([trial['rung'] for trial in result], [2, 1, 1, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(result[0]['epochs'], 9)
+
+    def test_max_epochs(self):
+        accuracies = [0.1, 0.5, 0.3, 0.9, 0.2, 0.8, 0.4, 0.6, 0.7]
+        _, rungs = self.run_sweep(accuracies, min_epochs=2, max_epochs=4, eta=3)
+        self.assertEqual(rungs, [(2, list(range(9))), (4, [3, 5, 8])])
+
+    def test_failed_trials(self):
+        accuracies = [0.1, 0.5, 0.3, 0.9, 0.2, 0.8, 0.4, 0.6, 0.7]
+        # The best trial fails in the second rung, another one in the first
+        result, rungs = self.run_sweep(accuracies, failures={(3, 3), (8, 1)}, min_epochs=1, max_epochs=9, eta=3)
+        self.assertEqual(rungs, [(1, list(range(9))), (3, [3, 5, 7]), (9, [5])])
+        self.assertEqual([trial['id'] for trial in result], [5, 7, 1, 6, 2, 4, 0, 3, 8])
+        self.assertTrue(all(trial.get('failed') for trial in result[-2:]))
+
+    def test_all_failed(self):
+        failures = {(i, 1) for i in range(9)}
+        result, rungs = self.run_sweep([0.5] * 9, failures=failures, min_epochs=1, max_epochs=9, eta=3)
+        self.assertEqual(rungs, [(1, list(range(9)))])
+        self.assertEqual(len(result), 9)
@@ -0,0 +1,148 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.keras as keras
+from sklearn.metrics import accuracy_score, classification_report, precision_recall_fscore_support
+
+from simulation.data import SimpleDataGenerator, ToBinaryGenerator
+from training import ConfusionMatrix, convert_to_tflite, create_interpreter, dequantize_output, evaluate, \
+    evaluate_tflite_model, quantize_input, representative_dataset
+
+
+class ConfusionMatrixTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.y_true = rng.integers(0, 5, 200)
+        # Class 3 is never predicted, so its precision is a division by zero
+        self.y_pred = np.where(rng.random(200) < 0.7, self.y_true, rng.integers(0, 5, 200))
+        self.y_pred[self.y_pred == 3] = 4
+        self.confusion = ConfusionMatrix(5)
+        for batch in np.array_split(np.arange(200), 7):
+            self.confusion.update(self.y_true[batch], self.y_pred[batch])
+
+    def test_scores(self):
+        precision, recall, f1, support = precision_recall_fscore_support(self.y_true, self.y_pred, labels=range(5),
+                                                                         zero_division=0)
+        np.testing.assert_allclose(self.confusion.precision, precision)
+        np.testing.assert_allclose(self.confusion.recall, recall)
+        np.testing.assert_allclose(self.confusion.f1, f1)
+        np.testing.assert_array_equal(self.confusion.support, support)
+        self.assertEqual(self.confusion.precision[3], 0)
+        self.assertAlmostEqual(self.confusion.accuracy, accuracy_score(self.y_true, self.y_pred))
+
+    def test_report(self):
+        expected = classification_report(self.y_true, self.y_pred, labels=range(5), zero_division=0)
+        self.assertEqual(self.confusion.report().split(), expected.split())
+
+    def test_class_without_samples(self):
+        confusion = ConfusionMatrix(3)
+        confusion.update(np.array([0, 0, 1]), np.array([0, 2, 1]))
+        np.testing.assert_array_equal(confusion.recall, [0.5, 1, 0])
+        np.testing.assert_array_equal(confusion.precision, [1, 1, 0])
+
+
+class EvaluateTests(TestCase):
+    def test_evaluate_all_samples(self):
+        x = np.random.randint(0, 256, (100, 28, 28), dtype=np.uint8)
+        y = np.arange(100) % 10
+        # Truncating generator with 10 matching and 90 other samples, which balances its batches to 20 samples
+        generator = ToBinaryGenerator((x, y), classes_to_match=0, batch_size=8, shuffle=False)
+        self.assertLessEqual(len(generator) * 8, 24)
+
+        # The model predicts the matching class for every sample
+        model = keras.Sequential([
+            keras.layers.InputLayer(input_shape=(28, 28, 1)),
+            keras.layers.Flatten(),
+            keras.layers.Dense(1, activation='sigmoid', kernel_initializer='zeros')
+        ])
+        confusion = evaluate(model, generator, binary=True)
+        self.assertEqual(confusion.matrix.sum(), 100)
+        np.testing.assert_array_equal(confusion.matrix, [[0, 90], [0, 10]])
+
+
+class TFLiteTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.model = keras.Sequential([
+            keras.layers.InputLayer(input_shape=(28, 28, 1)),
+            keras.layers.Conv2D(4, (3, 3), strides=2, activation='relu'),
+            keras.layers.Flatten(),
+            keras.layers.Dense(5)
+        ])
+        self.model.set_weights([rng.normal(0, 0.2, weight.shape) for weight in self.model.get_weights()])
+        self.x = rng.integers(0, 256, (50, 28, 28), dtype=np.uint8)
+        # The labels are the predictions of the Keras model
+        self.expected = self.model.predict(self.x[..., np.newaxis] / 255., verbose=0)
+        self.generator = SimpleDataGenerator((self.x, np.argmax(self.expected, axis=-1)), batch_size=8, shuffle=False)
+
+    def convert_uint8(self) -> bytes:
+        def representative():
+            for sample in self.generator.get_data():
+                yield [sample[np.newaxis]]
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = tf.lite.RepresentativeDataset(representative)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+        return converter.convert()
+
+    def test_evaluate_float(self):
+        content = tf.lite.TFLiteConverter.from_keras_model(self.model).convert()
+        # The batch size does not divide the number of samples, so the input tensor is resized
+        score = evaluate_tflite_model(content, self.generator, batch_size=16, num_threads=2)
+        self.assertEqual(score.confusion.matrix.sum(), 50)
+        self.assertEqual(score.accuracy, 1.0)
+        self.assertGreater(score.latency, 0)
+
+    def test_quantized_io(self):
+        interpreter = create_interpreter(self.convert_uint8(), 2)
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+        self.assertEqual(input_details["dtype"], np.uint8)
+        self.assertEqual(output_details["dtype"], np.uint8)
+
+        interpreter.resize_tensor_input(input_details["index"], [50, 28, 28, 1])
+        interpreter.allocate_tensors()
+        x = self.generator.get_data()
+        quantized = quantize_input(x, input_details)
+        self.assertEqual(quantized.dtype, np.uint8)
+        interpreter.set_tensor(input_details["index"], quantized)
+        interpreter.invoke()
+        output = dequantize_output(interpreter.get_tensor(output_details["index"]), output_details)
+        self.assertEqual(output.dtype, np.float32)
+        # A few quantization steps of the output
+        np.testing.assert_allclose(output, self.expected, atol=8 * output_details["quantization"][0])
+
+    def test_convert_to_tflite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            convert_to_tflite(self.model, directory + os.sep, self.generator, self.generator, representative_samples=20)
+            contents = {}
+            for name in ("model.tflite", "model.int8.tflite"):
+                with open(os.path.join(directory, name), "rb") as f:
+                    contents[name] = f.read()
+
+        interpreter = create_interpreter(contents["model.int8.tflite"], 1)
+        self.assertEqual(interpreter.get_input_details()[0]["dtype"], np.uint8)
+        self.assertEqual(interpreter.get_output_details()[0]["dtype"], np.uint8)
+        float_score = evaluate_tflite_model(contents["model.tflite"], self.generator)
+        int8_score = evaluate_tflite_model(contents["model.int8.tflite"], self.generator)
+        self.assertEqual(int8_score.confusion.matrix.sum(), 50)
+        self.assertGreaterEqual(int8_score.accuracy, float_score.accuracy - 0.1)
+
+    def test_representative_dataset(self):
+        labels = self.generator.get_labels()
+        first = [sample for sample, in representative_dataset(self.generator, 10, np.random.default_rng(1))()]
+        second = [sample for sample, in representative_dataset(self.generator, 10, np.random.default_rng(1))()]
+        np.testing.assert_array_equal(np.concatenate(first), np.concatenate(second))
+        # Up to the per class quota of each class, all samples of smaller classes
+        class_counts = np.bincount(labels)
+        quota = -(-10 // np.count_nonzero(class_counts))
+        data = self.generator.get_data()
+        matches = [int(np.flatnonzero(np.all(data == sample, axis=(1, 2, 3)))[0]) for sample in first]
+        np.testing.assert_array_equal(np.bincount(labels[matches], minlength=class_counts.shape[0]),
+                                      np.minimum(class_counts, quota))
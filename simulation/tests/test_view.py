@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+import numpy as np
+
+from simulation.data import DatasetView, SimpleDataGenerator, ToBinaryGenerator
+
+
+class DatasetViewTests(TestCase):
+    def setUp(self):
+        self.first = (np.random.randint(0, 256, (40, 28, 28), dtype=np.uint8), np.arange(40) % 20)
+        self.second = (np.random.randint(0, 256, (30, 28, 28), dtype=np.uint8), np.arange(30) % 20)
+        self.data = np.vstack([self.first[0], self.second[0]])
+        self.labels = np.hstack([self.first[1], self.second[1]])
+
+    def test_gather_from_multiple_sources(self):
+        view = DatasetView(self.first, self.second)
+        self.assertIs(view.sources[0], self.first[0])
+        indices = np.array([69, 0, 39, 40, 12])
+        x, y = view[indices]
+        np.testing.assert_array_equal(x, self.data[indices])
+        np.testing.assert_array_equal(y, self.labels[indices])
+        np.testing.assert_array_equal(view.gather(41), self.data[41])
+        self.assertEqual(view.shape, (70, 28, 28))
+
+    def test_filter_and_remap(self):
+        view = DatasetView(self.first, self.second, classes=range(10), label_map={5: 0})
+        mask = self.labels < 10
+        np.testing.assert_array_equal(view.gather(), self.data[mask])
+        np.testing.assert_array_equal(view.labels, np.where(self.labels[mask] == 5, 0, self.labels[mask]))
+
+        binary = view.remap(np.arange(10) % 2).drop([0])
+        self.assertTrue((binary.labels == 1).all())
+        np.testing.assert_array_equal(binary.original_labels % 2, 1)
+        self.assertEqual(len(binary.subset(np.arange(3))), 3)
+
+    def test_simple_digit_generator(self):
+        generator = SimpleDataGenerator(self.first, self.second, to_simple_digit=True, shuffle=False, batch_size=8)
+        mask = self.labels != 10
+        expected = np.where(self.labels[mask] > 10, self.labels[mask] - 10, self.labels[mask])
+        np.testing.assert_array_equal(generator.get_labels(), expected)
+        np.testing.assert_allclose(generator.get_data()[..., 0], self.data[mask] / 255., rtol=1e-6)
+        x, y = generator[1]
+        self.assertEqual(x.shape, (8, 28, 28, 1))
+        self.assertEqual(x.dtype, np.float32)
+        np.testing.assert_array_equal(y, expected[8:16])
+
+    def test_simple_digit_generator_no_zero(self):
+        generator = SimpleDataGenerator(self.first, self.second, to_simple_digit=True, no_zero=True)
+        self.assertEqual(generator.num_classes, 9)
+        self.assertEqual(set(generator.get_labels()), set(range(9)))
+
+    def test_binary_generator(self):
+        generator = ToBinaryGenerator(self.first, self.second, classes_to_match=[0, 10], classes_to_drop=5,
+                                      batch_size=8, flatten=True)
+        mask = self.labels != 5
+        np.testing.assert_array_equal(generator.get_labels(), np.isin(self.labels[mask], [0, 10]))
+        self.assertEqual(generator.get_data().shape, (mask.sum(), 28 * 28))
+        self.assertEqual(generator.lengths, [7, mask.sum() - 7])
+        x, y = generator[0]
+        self.assertEqual(x.shape, (8, 28 * 28))
+        np.testing.assert_array_equal(y, [1] * 4 + [0] * 4)
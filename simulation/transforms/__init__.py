@@ -6,10 +6,13 @@ from .noise import UniformNoise, GaussianNoise, SpeckleNoise, PoissonNoise, Salt
 from .perspective import RandomPerspectiveTransform, RandomPerspectiveTransformBackwards, RandomPerspectiveTransformX, \
     RandomPerspectiveTransformY, LensDistortion
 from .scale import Rescale, RescaleIntermediateTransforms
+from .memoize import MemoizedTransform
+from .pointwise import LookupTableTransform, GammaCorrection, Quantize, IntensityRemap
 
 __all__ = ['ImageTransform', 'Filter', 'BoxBlur', 'GaussianBlur', 'Dilate', 'DilateSoft', 'SharpenFilter',
            'ReliefFilter', 'EdgeFilter', 'UnsharpMaskingFilter3x3', 'UnsharpMaskingFilter5x5', 'UniformNoise',
            'GaussianNoise', 'SpeckleNoise', 'PoissonNoise', 'SaltAndPepperNoise', 'GrainNoise', 'EmbedInRectangle',
            'EmbedInGrid', 'JPEGEncode', 'RandomPerspectiveTransform', 'RandomPerspectiveTransformBackwards',
            'RandomPerspectiveTransformX', 'RandomPerspectiveTransformY', 'LensDistortion', 'Rescale',
-           'RescaleIntermediateTransforms']
+           'RescaleIntermediateTransforms', 'MemoizedTransform', 'LookupTableTransform', 'GammaCorrection', 'Quantize',
+           'IntensityRemap']
@@ -5,6 +5,10 @@ import numpy as np
 
 class ImageTransform(metaclass=ABCMeta):
     """Base class for all image transforms"""
+    #: True if the output of :py:meth:`apply` only depends on its input, i.e. the transform does not draw any random
+    #: numbers. Deterministic transforms may be memoized, see
+    #: :py:class:`MemoizedTransform <simulation.transforms.memoize.MemoizedTransform>`.
+    deterministic = False
 
     @abstractmethod
     def apply(self, img: np.ndarray) -> np.ndarray:
@@ -19,3 +23,19 @@ class ImageTransform(metaclass=ABCMeta):
 
         """
         pass
+
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        """
+        Apply the transformation to a batch of images. Subclasses may override this method with a vectorized
+        implementation, by default :py:meth:`apply` is called for each image.
+
+        Args:
+            imgs(:py:class:`numpy.ndarray`): The input images, as a numpy array of shape (N, H, W) or (N, H, W, C).
+
+        Returns:
+            :py:class:`numpy.ndarray`: A new array containing the transformed images.
+
+        """
+        if imgs.shape[0] == 0:
+            return imgs.copy()
+        return np.stack([self.apply(img) for img in imgs])
@@ -0,0 +1,199 @@
+"""
+Helpers to run OpenCV operations on whole batches of small images at once.
+
+For 28x28 images the fixed overhead of a single OpenCV call dominates the actual pixel work. The helpers in this module
+either pack a batch of images into a single mosaic image (for local operations like filters and morphology) or stack
+the images along the channel axis, so that only a few OpenCV calls are necessary for the whole batch.
+"""
+
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+#: Mapping of OpenCV border modes to their :py:func:`numpy.pad` counterparts.
+_PAD_MODES = {
+    cv2.BORDER_CONSTANT: 'constant',
+    cv2.BORDER_REPLICATE: 'edge',
+    cv2.BORDER_REFLECT: 'symmetric',
+    cv2.BORDER_REFLECT_101: 'reflect',
+}
+
+#: The maximum number of images packed into a single mosaic.
+MAX_MOSAIC_TILES = 4096
+
+
+def pack_mosaic(imgs: np.ndarray, border: int, border_mode=cv2.BORDER_REFLECT_101, border_value=0) -> np.ndarray:
+    """
+    Pack a batch of images into a single mosaic, with the images stacked vertically. Each image is surrounded by a
+    guard border of the given width, which is filled according to the given OpenCV border mode. Thus, any local
+    operation with a kernel radius of at most :py:data:`border` yields the same result on the mosaic as on each single
+    image.
+
+    Args:
+        imgs(:py:class:`numpy.ndarray`): A batch of images with shape (N, H, W) or (N, H, W, C).
+        border(int): The width of the guard border.
+        border_mode(int, optional): The OpenCV border mode to emulate. (Default value = cv2.BORDER_REFLECT_101)
+        border_value(Union[int, float], optional): The value for cv2.BORDER_CONSTANT. (Default value = 0)
+
+    Returns:
+        :py:class:`numpy.ndarray`: The mosaic with shape (N * (H + 2 * border), W + 2 * border) or
+            (N * (H + 2 * border), W + 2 * border, C).
+
+    """
+    if border_mode not in _PAD_MODES:
+        raise ValueError(f"Unsupported border mode: {border_mode}")
+    pad_width = [(0, 0), (border, border), (border, border)] + [(0, 0)] * (imgs.ndim - 3)
+    if border_mode == cv2.BORDER_CONSTANT:
+        padded = np.pad(imgs, pad_width, mode='constant', constant_values=border_value)
+    else:
+        padded = np.pad(imgs, pad_width, mode=_PAD_MODES[border_mode])
+    return padded.reshape((-1,) + padded.shape[2:])
+
+
+def unpack_mosaic(mosaic: np.ndarray, count: int, border: int) -> np.ndarray:
+    """
+    Unpack a mosaic created with :py:func:`pack_mosaic` and remove the guard borders.
+
+    Args:
+        mosaic(:py:class:`numpy.ndarray`): The mosaic.
+        count(int): The number of images in the mosaic.
+        border(int): The width of the guard border.
+
+    Returns:
+        :py:class:`numpy.ndarray`: A view of the images in the mosaic.
+
+    """
+    tiles = mosaic.reshape((count, -1) + mosaic.shape[1:])
+    return tiles[:, border:tiles.shape[1] - border, border:tiles.shape[2] - border]
+
+
+def apply_on_mosaic(
+        imgs: np.ndarray,
+        op: Callable[[np.ndarray], np.ndarray],
+        border: int,
+        border_mode=cv2.BORDER_REFLECT_101,
+        border_value=0
+) -> np.ndarray:
+    """
+    Apply a local OpenCV operation to a batch of images by running it on mosaics of at most
+    :py:data:`MAX_MOSAIC_TILES` images.
+
+    Args:
+        imgs(:py:class:`numpy.ndarray`): A batch of images with shape (N, H, W) or (N, H, W, C).
+        op(Callable[[numpy.ndarray], numpy.ndarray]): The operation. Must not change the image shape.
+        border(int): The width of the guard border, must be at least the radius of the operation's kernel.
+        border_mode(int, optional): The OpenCV border mode the operation uses. (Default value = cv2.BORDER_REFLECT_101)
+        border_value(Union[int, float], optional): The value for cv2.BORDER_CONSTANT. (Default value = 0)
+
+    Returns:
+        :py:class:`numpy.ndarray`: The processed images.
+
+    """
+    out = None
+    for start in range(0, imgs.shape[0], MAX_MOSAIC_TILES):
+        chunk = imgs[start:start + MAX_MOSAIC_TILES]
+        mosaic = op(pack_mosaic(chunk, border, border_mode, border_value))
+        result = unpack_mosaic(mosaic, chunk.shape[0], border)
+        if out is None:
+            out = np.empty((imgs.shape[0],) + result.shape[1:], dtype=result.dtype)
+        out[start:start + chunk.shape[0]] = result
+    return out if out is not None else imgs.copy()
+
+
+def apply_channel_stacked(
+        imgs: np.ndarray,
+        op: Callable[[np.ndarray], np.ndarray],
+        out: Optional[np.ndarray] = None,
+        max_channels=4
+) -> np.ndarray:
+    """
+    Apply an OpenCV operation which works independently on each channel (like :py:func:`cv2.resize`) to a batch of
+    images by stacking the images along the channel axis.
+
+    Note:
+        OpenCV uses channel specific code paths, which may round differently for some channel counts. With the default
+        of four channels per call the results are identical to applying the operation to each image separately. Up to
+        512 channels are possible, but not supported by every operation.
+
+    Args:
+        imgs(:py:class:`numpy.ndarray`): A batch of images with shape (N, H, W) or (N, H, W, C).
+        op(Callable[[numpy.ndarray], numpy.ndarray]): The operation.
+        out(:py:class:`numpy.ndarray`, optional): The array to write the results to. If None, a new array is allocated.
+            (Default value = None)
+        max_channels(int, optional): The maximum number of channels per call. (Default value = 4)
+
+    Returns:
+        :py:class:`numpy.ndarray`: The processed images.
+
+    """
+    count = imgs.shape[0]
+    channel_shape = imgs.shape[3:]
+    planes = imgs.reshape(imgs.shape[:3] + (-1,))
+    channels = planes.shape[3]
+    group = max(1, max_channels // channels)
+    for start in range(0, count, group):
+        chunk = planes[start:start + group]
+        stacked = np.ascontiguousarray(chunk.transpose(1, 2, 0, 3)).reshape(chunk.shape[1], chunk.shape[2], -1)
+        result = op(stacked)
+        result = result.reshape(result.shape[:2] + (chunk.shape[0], channels)).transpose(2, 0, 1, 3)
+        if out is None:
+            out = np.empty((count,) + result.shape[1:3] + channel_shape, dtype=result.dtype)
+        out[start:start + chunk.shape[0]] = result.reshape(result.shape[:3] + channel_shape)
+    return out if out is not None else imgs.copy()
+
+
+def resize_batch(
+        imgs: np.ndarray,
+        size: Tuple[int, int],
+        interpolation=cv2.INTER_LINEAR,
+        out: Optional[np.ndarray] = None,
+        max_channels: Optional[int] = None
+) -> np.ndarray:
+    """
+    Resize a batch of images with as few calls to :py:func:`cv2.resize` as possible, writing the results straight into
+    the output array.
+
+    Downscaling by integer factors with cv2.INTER_AREA or cv2.INTER_NEAREST only ever combines pixels of the same image,
+    so the whole batch is resized in a single call as one tall image of shape (N * H, W). All other resize operations
+    are done image by image, or channel stacked if :py:data:`max_channels` is given.
+
+    Note:
+        Channel stacking with :py:func:`apply_channel_stacked` only pays off for small source images, as the images
+        have to be transposed twice. Its results may differ slightly for some interpolation methods, for example
+        cv2.INTER_CUBIC from large source images.
+
+    Args:
+        imgs(:py:class:`numpy.ndarray`): A batch of images with shape (N, H, W) or (N, H, W, C).
+        size(tuple[int, int]): The new size as OpenCV *dsize*.
+        interpolation(int, optional): The OpenCV interpolation method. (Default value = cv2.INTER_LINEAR)
+        out(:py:class:`numpy.ndarray`, optional): The array to write the results to. If None, a new array is allocated.
+            (Default value = None)
+        max_channels(int, optional): If given, use :py:func:`apply_channel_stacked` with this many channels per call
+            for the general case. (Default value = None)
+
+    Returns:
+        :py:class:`numpy.ndarray`: The resized images.
+
+    """
+    size = tuple(size)
+    count, height, width = imgs.shape[:3]
+    new_shape = (count, size[1], size[0]) + imgs.shape[3:]
+    if out is None:
+        out = np.empty(new_shape, dtype=imgs.dtype)
+    if count == 0:
+        return out
+
+    if interpolation in (cv2.INTER_AREA, cv2.INTER_NEAREST) and height % size[1] == 0 and width % size[0] == 0:
+        # Integer downscale: no pixel is influenced by neighbouring images in the tall image
+        tall = np.ascontiguousarray(imgs).reshape((count * height, width) + imgs.shape[3:])
+        out[:] = cv2.resize(tall, (size[0], count * size[1]), interpolation=interpolation).reshape(new_shape)
+    elif max_channels is not None:
+        apply_channel_stacked(imgs, lambda img: cv2.resize(img, size, interpolation=interpolation), out, max_channels)
+    else:
+        for i in range(count):
+            result = cv2.resize(imgs[i], size, dst=out[i], interpolation=interpolation)
+            if result.shape != out[i].shape or not np.shares_memory(result, out[i]):
+                # OpenCV writes to a new array if the output is not contiguous
+                out[i] = result.reshape(out[i].shape)
+    return out
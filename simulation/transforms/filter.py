@@ -4,10 +4,12 @@ import cv2
 import numpy as np
 
 from simulation.transforms import ImageTransform
+from simulation.transforms.batch import apply_on_mosaic
 
 
 class Filter(ImageTransform):
     """Base class for all filtering operations."""
+    deterministic = True
 
     def __init__(self, iterations):
         """
@@ -39,6 +41,17 @@ class Filter(ImageTransform):
             img = cv2.filter2D(img.astype(np.float), -1, self.kernel)
         return img.astype(np.uint8)
 
+    @property
+    def border(self) -> int:
+        """The radius of the filter kernel, used as guard border when processing batches of images."""
+        return max(self.kernel.shape) // 2
+
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        for _ in range(self.iterations):
+            imgs = apply_on_mosaic(imgs.astype(np.float), lambda mosaic: cv2.filter2D(mosaic, -1, self.kernel),
+                                   self.border)
+        return imgs.astype(np.uint8)
+
 
 class BoxBlur(Filter):
     """Applies box blur to input images."""
@@ -60,6 +73,15 @@ class BoxBlur(Filter):
             img = cv2.blur(img, self.ksize)
         return img
 
+    @property
+    def border(self) -> int:
+        return max(self.ksize) // 2
+
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        for _ in range(self.iterations):
+            imgs = apply_on_mosaic(imgs, lambda mosaic: cv2.blur(mosaic, self.ksize), self.border)
+        return imgs
+
 
 class GaussianBlur(Filter):
     """Applies Gaussian blur to input images."""
@@ -84,6 +106,18 @@ class GaussianBlur(Filter):
             img = cv2.GaussianBlur(img, self.ksize, self.sigma)
         return img
 
+    @property
+    def border(self) -> int:
+        if 0 in self.ksize:
+            # The kernel size is computed from sigma by OpenCV, at most 4 sigma in each direction
+            return int(np.ceil(4 * self.sigma)) + 1
+        return max(self.ksize) // 2
+
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        for _ in range(self.iterations):
+            imgs = apply_on_mosaic(imgs, lambda mosaic: cv2.GaussianBlur(mosaic, self.ksize, self.sigma), self.border)
+        return imgs
+
 
 class Dilate(Filter):
     """Dilate the image using a gaussian kernel as structural element."""
@@ -105,6 +139,9 @@ class Dilate(Filter):
     def apply(self, img: np.ndarray) -> np.ndarray:
         return cv2.dilate(img, self.kernel, iterations=self.iterations)
 
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        return _dilate_batch(imgs, self.kernel, self.iterations)
+
 
 class DilateSoft(Filter):
     """Dilate the images using a Gaussian kernel as structural element."""
@@ -125,6 +162,9 @@ class DilateSoft(Filter):
     def apply(self, img: np.ndarray) -> np.ndarray:
         return cv2.dilate(img, self.kernel, iterations=self.iterations)
 
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        return _dilate_batch(imgs, self.kernel, self.iterations)
+
 
 class SharpenFilter(Filter):
     """Applies a 3x3 sharpening filter to input images."""
@@ -211,3 +251,26 @@ class UnsharpMaskingFilter5x5(Filter):
                                            [-6., -24, 476, -24, -6],
                                            [-4., -16, -24, -16, -4],
                                            [-1., -4., -6., -4., -1]], dtype=np.float)
+
+
+def _dilate_batch(imgs: np.ndarray, kernel: np.ndarray, iterations: int) -> np.ndarray:
+    """
+    Helper function to dilate a batch of images. The guard border is filled with the smallest value of the image type,
+    just like the default border of :py:func:`cv2.dilate`.
+
+    Args:
+        imgs(:py:class:`numpy.ndarray`): The images to dilate.
+        kernel(:py:class:`numpy.ndarray`): The structural element.
+        iterations(int): The number of iterations.
+
+    Returns:
+        :py:class:`numpy.ndarray`: The dilated images.
+
+    """
+    border = max(kernel.shape) // 2 * iterations
+    if np.issubdtype(imgs.dtype, np.integer):
+        border_value = np.iinfo(imgs.dtype).min
+    else:
+        border_value = -np.inf
+    return apply_on_mosaic(imgs, lambda mosaic: cv2.dilate(mosaic, kernel, iterations=iterations),
+                           border, cv2.BORDER_CONSTANT, border_value)
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+from simulation.transforms import ImageTransform
+
+
+class MemoizedTransform(ImageTransform):
+    """
+    Wraps a deterministic transform and caches its outputs in a bounded LRU cache.
+
+    Many inputs are byte-identical, for example all images of an
+    :py:class:`EmptyDataset <simulation.data.dataset.EmptyDataset>`. Inputs are identified by a BLAKE2b digest of their
+    bytes together with their shape and dtype, so the wrapped transform only runs once for each distinct input as long
+    as it stays in the cache.
+
+    The cache lives in the process that applies the transform. If the transform is sent to worker processes, each worker
+    starts with an empty cache and the hit statistics are not collected by the parent process.
+
+    """
+
+    def __init__(self, transform: ImageTransform, maxsize=1024):
+        """
+
+
+        Args:
+            transform(ImageTransform): The transform to memoize. Should be deterministic.
+            maxsize(int, optional): The maximum number of cached outputs. (Default value = 1024)
+
+        """
+        if not transform.deterministic:
+            warnings.warn(f"{transform.__class__.__name__} is not deterministic, memoizing it will repeat the same "
+                          f"random output for identical inputs.")
+        self.transform = transform
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def deterministic(self):
+        """True if the wrapped transform is deterministic."""
+        return self.transform.deterministic
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of calls to :py:meth:`apply` which were answered from the cache."""
+        calls = self.hits + self.misses
+        return self.hits / calls if calls > 0 else 0.
+
+    @staticmethod
+    def key(img: np.ndarray) -> tuple:
+        """
+        Compute the cache key of an image.
+
+        Args:
+            img(:py:class:`numpy.ndarray`): The input image.
+
+        Returns:
+            tuple: The shape, dtype and BLAKE2b digest of the image.
+
+        """
+        digest = hashlib.blake2b(np.ascontiguousarray(img), digest_size=16).digest()
+        return img.shape, img.dtype.str, digest
+
+    def apply(self, img: np.ndarray) -> np.ndarray:
+        key = self.key(img)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached.copy()
+            self.misses += 1
+
+        result = self.transform.apply(img)
+
+        with self._lock:
+            self._cache[key] = result.copy()
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return result
+
+    def clear(self):
+        """
+        Clear the cache and reset the hit statistics.
+
+        Returns:
+            None
+
+        """
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Locks cannot be pickled and workers should not receive a copy of the cache
+        del state['_lock']
+        state['_cache'] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.transform.__class__.__name__}, hits={self.hits}, " \
+               f"misses={self.misses}, hit_rate={self.hit_rate:.2%})"
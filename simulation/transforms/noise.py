@@ -1,14 +1,134 @@
+import threading
 from abc import abstractmethod, ABCMeta
-from typing import Union, Tuple
+from typing import Union, Tuple, Dict, Callable, Optional
 
 import cv2
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 
 from simulation import Color
 from simulation.transforms import ImageTransform
 
 
+class NoiseBank:
+    """
+    A large, pre-generated noise field from which noise for single images is taken as random windows.
+
+    Sampling a full noise array for every image is expensive, so the bank draws one large float32 noise field and
+    takes a window at a random offset from it for each image. Each window is also randomly flipped along both axes and,
+    for square windows, randomly transposed. After :py:attr:`reuse` windows have been taken, a new field is drawn.
+
+    The field is not pickled, so every worker process generates its own field on first use. Within a process, a bank
+    can be shared by threads: the field and its draw count are replaced under a lock, windows are taken from the
+    field without one.
+
+    """
+
+    def __init__(self, sampler: Callable[[tuple], np.ndarray], shape: Tuple[int, int] = (512, 512), reuse=4096):
+        """
+
+
+        Args:
+            sampler(Callable[[tuple], numpy.ndarray]): A function which returns noise of a given shape.
+            shape(tuple[int, int], optional): The shape of the noise field. Larger fields yield more distinct windows.
+                (Default value = (512, 512))
+            reuse(int, optional): The number of windows taken from one field before it is regenerated. This controls
+                the trade-off between speed and diversity: higher values are faster, but increase the correlation
+                between the noise of different images. If None, the field is never regenerated. (Default value = 4096)
+
+        """
+        self.sampler = sampler
+        self.shape = shape
+        self.reuse = reuse
+        self._field: Optional[np.ndarray] = None
+        self._draws = 0
+        self._lock = threading.Lock()
+
+    def draw(self, count: int, shape: tuple) -> np.ndarray:
+        """
+        Draw noise windows for a batch of images.
+
+        Args:
+            count(int): The number of windows.
+            shape(tuple): The shape of a single window.
+
+        Returns:
+            :py:class:`numpy.ndarray`: A new float32 array of shape (count,) + shape.
+
+        """
+        field = self._get_field(shape, count)
+        height, width = shape[:2]
+
+        # A read-only view of all windows of the field, indexed by their offsets
+        windows = as_strided(field, shape=(field.shape[0] - height + 1, field.shape[1] - width + 1) + tuple(shape),
+                             strides=field.strides[:2] + field.strides, writeable=False)
+        noise = windows[np.random.randint(0, windows.shape[0], count), np.random.randint(0, windows.shape[1], count)]
+
+        # Randomly flip the windows along both axes and transpose square windows
+        flip = np.random.rand(count) < 0.5
+        noise[flip] = noise[flip, ::-1]
+        flip = np.random.rand(count) < 0.5
+        noise[flip] = noise[flip, :, ::-1]
+        if height == width:
+            transpose = np.random.rand(count) < 0.5
+            noise[transpose] = noise[transpose].swapaxes(1, 2)
+        return noise
+
+    def _get_field(self, shape: tuple, count: int) -> np.ndarray:
+        """
+        Helper function which returns the current noise field and regenerates it if necessary.
+
+        Args:
+            shape(tuple): The shape of a single window.
+            count(int): The number of windows that will be taken.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The noise field.
+
+        """
+        with self._lock:
+            field = self._field
+            if field is None or field.shape[2:] != tuple(shape[2:]) \
+                    or field.shape[0] < shape[0] or field.shape[1] < shape[1] \
+                    or (self.reuse is not None and self._draws + count > self.reuse and self._draws > 0):
+                field_shape = (max(self.shape[0], shape[0]), max(self.shape[1], shape[1])) + tuple(shape[2:])
+                field = self._field = self.sampler(field_shape).astype(np.float32)
+                self._draws = 0
+            self._draws += count
+            return field
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_field'] = None
+        state['_draws'] = 0
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
 class SimpleNoise(ImageTransform, metaclass=ABCMeta):
+    """
+    Base class for noise which is independent of the image content. The noise is added in float32 and the result is
+    clipped to uint8.
+
+    """
+
+    def __init__(self, bank_shape: Optional[Tuple[int, int]] = None, bank_reuse=4096):
+        """
+
+
+        Args:
+            bank_shape(tuple[int, int], optional): If given, the noise is taken from a :py:class:`NoiseBank` of this
+                shape instead of being sampled for each image. (Default value = None)
+            bank_reuse(int, optional): The number of images that share one noise bank field, see
+                :py:attr:`NoiseBank.reuse`. (Default value = 4096)
+
+        """
+        self.bank = NoiseBank(self.noise, bank_shape, bank_reuse) if bank_shape is not None else None
+
     @abstractmethod
     def noise(self, shape: tuple):
         """
@@ -23,6 +143,30 @@ class SimpleNoise(ImageTransform, metaclass=ABCMeta):
         """
         pass
 
+    def get_noise(self, shape: tuple) -> np.ndarray:
+        """
+        Returns float32 noise for a batch of images, taken from the noise bank if it is enabled.
+
+        Args:
+            shape(tuple): The shape of the batch.
+
+        Returns:
+          :py:class:`numpy.ndarray`: A new float32 array with noise values.
+
+        """
+        if self.bank is not None:
+            return self.bank.draw(shape[0], shape[1:])
+        return self.noise(shape).astype(np.float32)
+
+    def apply(self, img: np.ndarray) -> np.ndarray:
+        return self.apply_batch(img[np.newaxis])[0]
+
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        img = imgs.astype(np.float32)
+        np.add(img, self.get_noise(img.shape), out=img)
+        np.clip(img, 0, 255, out=img)
+        return img.astype(np.uint8)
+
 
 class UniformNoise(SimpleNoise):
     """
@@ -33,28 +177,25 @@ class UniformNoise(SimpleNoise):
 
     """
 
-    def __init__(self, low=-16, high=16):
+    def __init__(self, low=-16, high=16, bank_shape: Optional[Tuple[int, int]] = None, bank_reuse=4096):
         """
         
 
         Args:
             low(float, optional): Lower bound of the uniform distribution. (Default value = -16)
             high(float, optional): Upper bound of the uniform distribution. (Default value = 16)
+            bank_shape(tuple[int, int], optional): If given, use a :py:class:`NoiseBank` of this shape.
+                (Default value = None)
+            bank_reuse(int, optional): The number of images that share one noise bank field. (Default value = 4096)
 
         """
-        super().__init__()
+        super().__init__(bank_shape, bank_reuse)
         self.low = low
         self.high = high
 
     def noise(self, shape: tuple):
         return np.random.uniform(self.low, self.high, shape)
 
-    def apply(self, img: np.ndarray) -> np.ndarray:
-        noise = self.noise(img.shape)
-        img = img.astype(np.float) + noise
-        img = np.clip(img, 0, 255)
-        return img
-
 
 class GaussianNoise(SimpleNoise):
     """
@@ -65,28 +206,25 @@ class GaussianNoise(SimpleNoise):
 
     """
 
-    def __init__(self, mu=0.0, sigma=4.0):
+    def __init__(self, mu=0.0, sigma=4.0, bank_shape: Optional[Tuple[int, int]] = None, bank_reuse=4096):
         """
         
 
         Args:
             mu(float, optional): The mean of the Gaussian. (Default value = 0.0)
             sigma(float, optional): The standard deviation of the Gaussian. (Default value = 4.0)
+            bank_shape(tuple[int, int], optional): If given, use a :py:class:`NoiseBank` of this shape.
+                (Default value = None)
+            bank_reuse(int, optional): The number of images that share one noise bank field. (Default value = 4096)
 
         """
-        super().__init__()
+        super().__init__(bank_shape, bank_reuse)
         self.mu = mu
         self.sigma = sigma
 
     def noise(self, shape: tuple):
         return np.random.normal(self.mu, self.sigma, shape)
 
-    def apply(self, img: np.ndarray) -> np.ndarray:
-        noise = self.noise(img.shape)
-        img = img.astype(np.float) + noise
-        img = np.clip(img, 0, 255)
-        return img.astype(np.uint8)
-
 
 class SpeckleNoise(GaussianNoise):
     """
@@ -97,24 +235,28 @@ class SpeckleNoise(GaussianNoise):
 
     """
 
-    def __init__(self, mu=0., sigma=4.0):
+    def __init__(self, mu=0., sigma=4.0, bank_shape: Optional[Tuple[int, int]] = None, bank_reuse=4096):
         """
         
 
         Args:
             mu(float, optional): The mean of the Gaussian. (Default value = 0.)
             sigma(float, optional): The standard deviation of the Gaussian. (Default value = 4.0)
+            bank_shape(tuple[int, int], optional): If given, use a :py:class:`NoiseBank` of this shape.
+                (Default value = None)
+            bank_reuse(int, optional): The number of images that share one noise bank field. (Default value = 4096)
 
         """
-        super().__init__(mu, sigma)
+        super().__init__(mu, sigma, bank_shape, bank_reuse)
         self.mu /= 255.
         self.sigma /= 255.
 
-    def apply(self, img: np.ndarray) -> np.ndarray:
-        noise = self.noise(img.shape)
-        img = img.astype(np.float)
-        img += img * noise
-        img = np.clip(img, 0, 255)
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        img = imgs.astype(np.float32)
+        noise = self.get_noise(img.shape)
+        np.multiply(img, noise, out=noise)
+        np.add(img, noise, out=img)
+        np.clip(img, 0, 255, out=img)
         return img.astype(np.uint8)
 
 
@@ -126,12 +268,32 @@ class PoissonNoise(ImageTransform):
 
     """
 
+    #: Lookup table of the relative intensity of each uint8 value.
+    INTENSITIES = np.arange(256, dtype=np.float) / 255.
+
+    #: Lookup tables from event counts to uint8 values, one row for each noise scale 2 ** i, i in [0, 8].
+    OUTPUT_LUTS = np.clip(np.arange(257)[np.newaxis] / 2. ** np.arange(9)[:, np.newaxis] * 255, 0, 255) \
+        .astype(np.uint8)
+
     def apply(self, img: np.ndarray) -> np.ndarray:
-        img = img.astype(np.float) / 255.
-        noise = 2 ** np.ceil(np.log2(len(np.unique(img))))
-        noisy = np.random.poisson(img * noise) / float(noise) * 255
-        noisy = np.clip(noisy, 0, 255)
-        return noisy.astype(np.uint8)
+        return self.apply_batch(img[np.newaxis])[0]
+
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        if imgs.size == 0:
+            return imgs.astype(np.uint8)
+        if imgs.dtype != np.uint8:
+            imgs = np.clip(imgs, 0, 255).astype(np.uint8)
+        count = imgs.shape[0]
+
+        # Count the distinct values of every image with a single histogram instead of sorting each image
+        offsets = (np.arange(count, dtype=np.int64) * 256).reshape((-1,) + (1,) * (imgs.ndim - 1))
+        histograms = np.bincount((imgs + offsets).ravel(), minlength=count * 256).reshape(count, 256)
+        scales = np.ceil(np.log2(np.count_nonzero(histograms, axis=1))).astype(np.int64)
+
+        # Only the poisson sampling itself requires floating point values
+        rates = self.INTENSITIES[imgs] * (2. ** scales).reshape(offsets.shape)
+        events = np.minimum(np.random.poisson(rates), 256)
+        return self.OUTPUT_LUTS[scales.reshape(offsets.shape), events]
 
 
 class SaltAndPepperNoise(ImageTransform):
@@ -216,6 +378,8 @@ class EmbedInRectangle(ImageTransform):
     Then, a rectangle is drawn at the half the :py:attr:`inset` distance to the border. Finally, the a random crop to
     the original image shape is performed and the new image is returned.
 
+    The rectangle only depends on the image shape, so it is drawn once per shape and cached as an overlay template.
+
     """
 
     def __init__(self, inset=0.1, thickness=1):
@@ -231,19 +395,81 @@ class EmbedInRectangle(ImageTransform):
         self.inset = inset
         self.offset = inset / 2
         self.thickness = thickness
+        self._templates: Dict[tuple, Tuple[np.ndarray, np.ndarray]] = {}
 
     def apply(self, img: np.ndarray) -> np.ndarray:
-        grid_image, offset_x, offset_y = self.expand_image(img)
+        return self.apply_batch(img[np.newaxis])[0]
 
-        grid_image[offset_x:offset_x + img.shape[0], offset_y:offset_y + img.shape[1]] = img
-        cv2.rectangle(grid_image, (offset_x, offset_y),
-                      (grid_image.shape[0] - offset_x - 1, grid_image.shape[1] - offset_y - 1),
-                      Color.WHITE.value, thickness=self.thickness)
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        if imgs.shape[0] == 0:
+            return imgs.copy()
+        shape = imgs.shape[1:]
+        mask, overlay = self.get_template(shape)
+        offset_x, offset_y = self.get_offsets(shape)
+
+        # Insert all images into empty canvases and add the overlay
+        dtype = np.uint8 if self.inset > 0 else imgs.dtype
+        grid_images = np.zeros((imgs.shape[0],) + overlay.shape, dtype=dtype)
+        grid_images[:, offset_x:offset_x + shape[0], offset_y:offset_y + shape[1]] = imgs
+        grid_images[:, mask] = overlay[mask]
 
         if self.inset > 0:
-            return self.random_crop(grid_image, img.shape)
+            return self.random_crop_batch(grid_images, shape)
         else:
-            return grid_image
+            return grid_images
+
+    def draw_overlay(self, grid_image: np.ndarray, offset_x: int, offset_y: int, color=Color.WHITE.value):
+        """
+        Draw the rectangle onto an expanded image.
+
+        Args:
+            grid_image(:py:class:`numpy.ndarray`): The expanded image, see :py:meth:`expand_image`.
+            offset_x(int): The offset of the original image along the x-axis.
+            offset_y(int): The offset of the original image along the y-axis.
+            color(tuple, optional): The color of the rectangle. (Default value = Color.WHITE.value)
+
+        Returns:
+            None
+
+        """
+        cv2.rectangle(grid_image, (offset_x, offset_y),
+                      (grid_image.shape[0] - offset_x - 1, grid_image.shape[1] - offset_y - 1),
+                      color, thickness=self.thickness)
+
+    def get_template(self, shape: tuple) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the overlay template for images of the given shape. The template is only drawn once per shape.
+
+        Args:
+            shape(tuple): The shape of the original images.
+
+        Returns:
+            tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]: A boolean mask of the overlay pixels and the
+                expanded image containing only the overlay.
+
+        """
+        template = self._templates.get(shape)
+        if template is None:
+            overlay, offset_x, offset_y = self.expand_image(np.zeros(shape, dtype=np.uint8))
+            self.draw_overlay(overlay, offset_x, offset_y)
+            mask = np.zeros(overlay.shape[:2], dtype=np.uint8)
+            self.draw_overlay(mask, offset_x, offset_y, 1)
+            template = mask.astype(bool), overlay
+            self._templates[shape] = template
+        return template
+
+    def get_offsets(self, shape: tuple) -> Tuple[int, int]:
+        """
+        Get the offsets of the original image in the expanded image.
+
+        Args:
+            shape(tuple): The shape of the original image.
+
+        Returns:
+            tuple[int, int]: The offsets along the x- and y-axis.
+
+        """
+        return int(abs(self.offset * shape[0])), int(abs(self.offset * shape[1]))
 
     def expand_image(self, img):
         """
@@ -272,7 +498,7 @@ class EmbedInRectangle(ImageTransform):
             grid_image_shape = img.shape
 
         grid_image = np.full(grid_image_shape, 0, dtype=np.uint8)
-        offset_x, offset_y = int(abs(self.offset * img.shape[0])), int(abs(self.offset * img.shape[1]))
+        offset_x, offset_y = self.get_offsets(img.shape)
 
         if self.inset > 0:
             grid_image[offset_x:offset_x + img.shape[0], offset_y:offset_y + img.shape[1]] = img
@@ -299,6 +525,27 @@ class EmbedInRectangle(ImageTransform):
         offset_y = np.random.randint(0, offset[1])
         return grid_img[offset_x:offset_x + shape[0], offset_y:offset_y + shape[1]]
 
+    @staticmethod
+    def random_crop_batch(grid_imgs: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+        """
+        Randomly crops each of the input images to the given shape, using a single gather operation.
+
+        Args:
+              grid_imgs(:py:class:`numpy.ndarray`): Input images to be cropped.
+              shape(tuple[int, int]): The new shape.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The cropped images.
+
+        """
+        count = grid_imgs.shape[0]
+        offset = np.array(grid_imgs.shape[1:3]) - np.array(shape[:2])
+        offset_x = np.random.randint(0, offset[0], count)
+        offset_y = np.random.randint(0, offset[1], count)
+        rows = offset_x[:, np.newaxis] + np.arange(shape[0])
+        cols = offset_y[:, np.newaxis] + np.arange(shape[1])
+        return grid_imgs[np.arange(count)[:, np.newaxis, np.newaxis], rows[:, :, np.newaxis], cols[:, np.newaxis, :]]
+
 
 class EmbedInGrid(EmbedInRectangle):
     """
@@ -321,27 +568,33 @@ class EmbedInGrid(EmbedInRectangle):
         """
         super().__init__(inset, thickness)
 
-    def apply(self, img: np.ndarray) -> np.ndarray:
-        grid_image, offset_x, offset_y = self.expand_image(img)
+    def draw_overlay(self, grid_image: np.ndarray, offset_x: int, offset_y: int, color=Color.WHITE.value):
+        """
+        Draw the grid lines onto an expanded image.
+
+        Args:
+            grid_image(:py:class:`numpy.ndarray`): The expanded image, see :py:meth:`expand_image`.
+            offset_x(int): The offset of the original image along the x-axis.
+            offset_y(int): The offset of the original image along the y-axis.
+            color(tuple, optional): The color of the grid lines. (Default value = Color.WHITE.value)
+
+        Returns:
+            None
 
-        # Draw grid lines
-        cv2.line(grid_image, (offset_x, 0), (offset_x, grid_image.shape[0]), Color.WHITE.value, self.thickness)
+        """
+        cv2.line(grid_image, (offset_x, 0), (offset_x, grid_image.shape[0]), color, self.thickness)
         cv2.line(grid_image, (grid_image.shape[0] - offset_x - 1, 0),
                  (grid_image.shape[0] - offset_x - 1, grid_image.shape[0]),
-                 Color.WHITE.value, self.thickness)
-        cv2.line(grid_image, (0, offset_y), (grid_image.shape[1], offset_y), Color.WHITE.value, self.thickness)
+                 color, self.thickness)
+        cv2.line(grid_image, (0, offset_y), (grid_image.shape[1], offset_y), color, self.thickness)
         cv2.line(grid_image, (0, grid_image.shape[1] - offset_y - 1),
                  (grid_image.shape[1], grid_image.shape[1] - offset_y - 1),
-                 Color.WHITE.value, self.thickness)
-
-        if self.inset > 0:
-            return self.random_crop(grid_image, img.shape)
-        else:
-            return grid_image
+                 color, self.thickness)
 
 
 class JPEGEncode(ImageTransform):
     """Encode and subsequently decode the input image using the JPEG algorithm with the supplied :py:attr:`quality`."""
+    deterministic = True
 
     def __init__(self, quality=80):
         """
@@ -132,6 +132,7 @@ class RandomPerspectiveTransformY(RandomPerspectiveTransform):
 
 class LensDistortion(ImageTransform):
     """Applies camera lens distortion to input images."""
+    deterministic = True
 
     def __init__(self, focal_lengths: Tuple[float, float] = None, dist_coeffs: Iterable[float] = None,
                  principal_point: Tuple[int, int] = None):
@@ -0,0 +1,133 @@
+from abc import abstractmethod, ABCMeta
+
+import cv2
+import numpy as np
+
+from simulation.transforms import ImageTransform
+
+
+class LookupTableTransform(ImageTransform, metaclass=ABCMeta):
+    """
+    Base class for pointwise intensity transforms.
+
+    The transform is expressed as a 256-entry lookup table, which is computed once and applied to uint8 images with
+    :py:func:`cv2.LUT`. Thus, images stay in uint8 and no float conversion is necessary.
+
+    """
+    deterministic = True
+
+    def __init__(self):
+        self.lut: np.ndarray = np.empty(0, dtype=np.uint8)
+
+    @abstractmethod
+    def mapping(self, values: np.ndarray) -> np.ndarray:
+        """
+        The pointwise mapping of this transform, evaluated once to create the lookup table.
+
+        Args:
+            values(:py:class:`numpy.ndarray`): All 256 intensity values as a float array.
+
+        Returns:
+            :py:class:`numpy.ndarray`: The new intensity values. They will be rounded and clipped to uint8.
+
+        """
+        pass
+
+    def update_lut(self):
+        """
+        (Re-)compute the lookup table from :py:meth:`mapping`. Must be called after changing the parameters of the
+        transform.
+
+        Returns:
+            None
+
+        """
+        values = self.mapping(np.arange(256, dtype=np.float))
+        self.lut = np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+    def apply(self, img: np.ndarray) -> np.ndarray:
+        return cv2.LUT(_as_uint8(img), self.lut)
+
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        imgs = np.ascontiguousarray(_as_uint8(imgs))
+        if imgs.size == 0:
+            return imgs.copy()
+        # Apply the table to all images at once by viewing the batch as a single tall image
+        result = cv2.LUT(imgs.reshape((-1,) + imgs.shape[2:]), self.lut)
+        return result.reshape(imgs.shape)
+
+
+class GammaCorrection(LookupTableTransform):
+    """Applies gamma correction to input images."""
+
+    def __init__(self, gamma=1.0):
+        """
+
+
+        Args:
+            gamma(float, optional): The gamma value. Values below 1 brighten, values above 1 darken the images.
+                (Default value = 1.0)
+
+        """
+        super().__init__()
+        self.gamma = gamma
+        self.update_lut()
+
+    def mapping(self, values: np.ndarray) -> np.ndarray:
+        return 255. * (values / 255.) ** self.gamma
+
+
+class Quantize(LookupTableTransform):
+    """Reduces the number of intensity levels of input images."""
+
+    def __init__(self, levels=8):
+        """
+
+
+        Args:
+            levels(int, optional): The number of equally spaced intensity levels, at least 2. (Default value = 8)
+
+        """
+        super().__init__()
+        self.levels = levels
+        self.update_lut()
+
+    def mapping(self, values: np.ndarray) -> np.ndarray:
+        return np.floor(values * self.levels / 256.) * (255. / (self.levels - 1))
+
+
+class IntensityRemap(LookupTableTransform):
+    """Linearly maps the full intensity range of input images to a given range, for example to reduce contrast."""
+
+    def __init__(self, low=0, high=255):
+        """
+
+
+        Args:
+            low(int, optional): The new value for black. (Default value = 0)
+            high(int, optional): The new value for white. (Default value = 255)
+
+        """
+        super().__init__()
+        self.low = low
+        self.high = high
+        self.update_lut()
+
+    def mapping(self, values: np.ndarray) -> np.ndarray:
+        return self.low + values * (self.high - self.low) / 255.
+
+
+def _as_uint8(img: np.ndarray) -> np.ndarray:
+    """
+    Helper function which clips and converts an image to uint8, if necessary.
+
+    Args:
+        img(:py:class:`numpy.ndarray`): The image.
+
+    Returns:
+        :py:class:`numpy.ndarray`: The image as uint8.
+
+    """
+    if img.dtype == np.uint8:
+        return img
+    return np.clip(img, 0, 255).astype(np.uint8)
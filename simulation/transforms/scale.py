@@ -4,6 +4,7 @@ import cv2
 import numpy as np
 
 from simulation.transforms import ImageTransform
+from simulation.transforms.batch import resize_batch
 
 
 class Rescale(ImageTransform):
@@ -12,6 +13,7 @@ class Rescale(ImageTransform):
     and consecutively scaling it back to its original size again.
 
     """
+    deterministic = True
 
     def __init__(self, size: Tuple[int, int], inter_initial=cv2.INTER_AREA, inter_consecutive=cv2.INTER_LINEAR):
         """
@@ -36,6 +38,12 @@ class Rescale(ImageTransform):
         img = cv2.resize(img, orig_size, interpolation=self.inter_consecutive)
         return img
 
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        orig_size = tuple(imgs.shape[1:3])
+        imgs = resize_batch(imgs, self.size, self.inter_initial)
+        imgs = resize_batch(imgs, orig_size, self.inter_consecutive)
+        return imgs
+
 
 class RescaleIntermediateTransforms(Rescale):
     """
@@ -67,6 +75,11 @@ class RescaleIntermediateTransforms(Rescale):
         super().__init__(size, inter_initial, inter_consecutive)
         self.intermediate_transforms = intermediate_transforms
 
+    @property
+    def deterministic(self):
+        """True if all intermediate transforms are deterministic."""
+        return all(transform.deterministic for transform in self.intermediate_transforms)
+
     def add_transforms(self, *transforms: ImageTransform):
         """
         Add a sequence of intermediate transforms.
@@ -90,3 +103,14 @@ class RescaleIntermediateTransforms(Rescale):
 
         img = cv2.resize(img, orig_size, interpolation=self.inter_consecutive)
         return img
+
+    def apply_batch(self, imgs: np.ndarray) -> np.ndarray:
+        orig_size = tuple(imgs.shape[1:3])
+        imgs = resize_batch(imgs, self.size, self.inter_initial)
+
+        # Apply intermediate transforms
+        for transform in self.intermediate_transforms:
+            imgs = transform.apply_batch(imgs)
+
+        imgs = resize_batch(imgs, orig_size, self.inter_consecutive)
+        return imgs
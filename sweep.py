@@ -0,0 +1,337 @@
+import itertools
+import json
+import multiprocessing as mp
+import os
+import queue
+import traceback
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.keras as keras
+
+from generate_datasets import load_datasets, TRANSFORMED_DATASET_NAMES
+from simulation.data.data_generator import SimpleDataGenerator
+from simulation.data.dataset import CharacterDataset
+from simulation.data.executor import available_cpus, shared_empty
+from training import build_cnn, configure_devices, ThroughputLogger
+
+#: The default search space, each combination of values is one trial.
+SEARCH_SPACE = {
+    'learning_rate': [0.003, 0.01, 0.03, 0.1],
+    'batch_size': [64, 128, 256],
+    'width': [8, 16],
+}
+
+
+def share_dataset(dataset: CharacterDataset) -> CharacterDataset:
+    """
+    Move the arrays of a dataset into shared memory, so processes forked afterwards read the same copy of the images.
+
+    Args:
+        dataset(:py:class:`simulation.data.dataset.CharacterDataset`): The dataset, which is modified in place.
+
+    Returns:
+        :py:class:`simulation.data.dataset.CharacterDataset`: The dataset.
+
+    """
+    for name in ("train_x", "train_y", "test_x", "test_y"):
+        array = getattr(dataset, name)
+        shared = shared_empty(array.shape, array.dtype)
+        shared[:] = array
+        setattr(dataset, name, shared)
+    return dataset
+
+
+def create_trials(space: Dict[str, Sequence] = None, num_trials: Optional[int] = None, seed=0) -> List[dict]:
+    """
+    Create the trials of a grid search space.
+
+    Args:
+        space(dict[str, Sequence]): The values of each hyperparameter. If None, use :py:data:`SEARCH_SPACE`.
+            (Default value = None)
+        num_trials(int, optional): If given, randomly choose this many combinations instead of all.
+            (Default value = None)
+        seed(int): The seed for choosing the combinations and for the trials' sample order. (Default value = 0)
+
+    Returns:
+        list[dict]: The trials, each with an ``id``, a ``seed`` and a value for each hyperparameter.
+
+    """
+    space = space if space is not None else SEARCH_SPACE
+    combinations = list(itertools.product(*space.values()))
+    rng = np.random.default_rng(seed)
+    if num_trials is not None and num_trials < len(combinations):
+        combinations = [combinations[i] for i in np.sort(rng.choice(len(combinations), num_trials, replace=False))]
+    return [dict(zip(space.keys(), values), id=i, seed=seed) for i, values in enumerate(combinations)]
+
+
+def _run_trial(
+        trial: dict,
+        epochs: int,
+        directory: str,
+        cpus: List[int],
+        train: tuple,
+        dev: tuple,
+        to_simple_digit: bool,
+        results: mp.Queue
+):
+    """
+    Helper function which trains a trial in a forked process up to the given number of epochs, continuing from its
+    weights and sample order of the last rung. The validation accuracy is put into the result queue.
+
+    Args:
+        trial(dict): The trial.
+        epochs(int): The total number of epochs to train the trial for.
+        directory(str): The sweep directory.
+        cpus(list[int]): The CPUs the process is pinned to.
+        train(tuple): The training datasets.
+        dev(tuple): The validation datasets.
+        to_simple_digit(bool): If true, train simple 9 + 1 class digit recognition.
+        results(multiprocessing.Queue): The queue for the result.
+
+    Returns:
+        None
+
+    """
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpus)
+        configure_devices(len(cpus), 1)
+        tf.get_logger().setLevel('ERROR')
+
+        train_generator = SimpleDataGenerator(*train, batch_size=trial['batch_size'], shuffle=True,
+                                              to_simple_digit=to_simple_digit, seed=trial['seed'])
+        dev_generator = SimpleDataGenerator(*dev, batch_size=256, shuffle=False, to_simple_digit=to_simple_digit)
+        train_generator.load_state_dict({'seed': trial['seed'], 'epoch': trial['epochs'], 'cursor': 0})
+
+        model = build_cnn(train_generator.num_classes, trial['width'])
+        model.compile(
+            loss=keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+            optimizer=keras.optimizers.Adadelta(trial['learning_rate']),
+            metrics=['accuracy']
+        )
+        weights_path = os.path.join(directory, f"trial-{trial['id']}.h5")
+        if trial['epochs'] > 0:
+            model.load_weights(weights_path)
+        history = model.fit(
+            train_generator, validation_data=dev_generator,
+            epochs=epochs, initial_epoch=trial['epochs'],
+            shuffle=False, verbose=0,
+            callbacks=[ThroughputLogger(train_generator.batch_size)]
+        )
+        model.save_weights(weights_path)
+        results.put((trial['id'], {
+            'accuracy': float(history.history['val_accuracy'][-1]),
+            'images_per_second': float(np.mean(history.history['images_per_second']))
+        }))
+    except Exception:
+        results.put((trial['id'], {'error': traceback.format_exc()}))
+
+
+def run_rung(
+        trials: List[dict],
+        epochs: int,
+        directory: str,
+        train: tuple,
+        dev: tuple,
+        to_simple_digit: bool,
+        threads_per_trial: int
+):
+    """
+    Train trials up to the given number of epochs, running one forked process per trial in parallel. Each process is
+    pinned to its own set of CPUs and sizes its TensorFlow thread pool to it. The trials are updated with their
+    validation accuracy, throughput and epoch count.
+
+    Args:
+        trials(list[dict]): The trials.
+        epochs(int): The total number of epochs to train each trial for.
+        directory(str): The sweep directory.
+        train(tuple): The training datasets.
+        dev(tuple): The validation datasets.
+        to_simple_digit(bool): If true, train simple 9 + 1 class digit recognition.
+        threads_per_trial(int): The number of CPUs of each trial.
+
+    Returns:
+        None
+
+    """
+    try:
+        cpus = sorted(os.sched_getaffinity(0))[:available_cpus()]
+    except AttributeError:
+        cpus = list(range(available_cpus()))
+    slots = [cpus[i:i + threads_per_trial] for i in range(0, len(cpus) - threads_per_trial + 1, threads_per_trial)]
+    slots = slots or [cpus]
+
+    context = mp.get_context('fork')
+    results = context.Queue()
+    pending = list(trials)
+    running: Dict[int, tuple] = {}
+    by_id = {trial['id']: trial for trial in trials}
+    while pending or running:
+        while pending and len(running) < len(slots):
+            trial = pending.pop(0)
+            slot = next(slot for slot in slots if all(slot is not used for _, used in running.values()))
+            process = context.Process(target=_run_trial, args=(trial, epochs, directory, slot, train, dev,
+                                                               to_simple_digit, results))
+            process.start()
+            running[trial['id']] = (process, slot)
+        try:
+            trial_id, result = results.get(timeout=1)
+        except queue.Empty:
+            # A process killed e.g. by the OOM killer can not report its result
+            dead = [trial_id for trial_id, (process, _) in running.items()
+                    if not process.is_alive() and process.exitcode != 0]
+            if not dead:
+                continue
+            trial_id, result = dead[0], {'error': f"Exit code {running[dead[0]][0].exitcode}"}
+        process, _ = running.pop(trial_id)
+        process.join()
+        trial = by_id[trial_id]
+        if 'error' in result:
+            print(f"Trial {trial_id} failed:\n{result['error']}")
+            trial.update(accuracy=float('nan'), failed=True)
+        else:
+            trial.update(result, epochs=epochs)
+            print(f"Trial {trial_id} after {epochs} epochs: accuracy {trial['accuracy']:.4f}, "
+                  f"{trial['images_per_second']:.0f} images/s")
+
+
+def successive_halving(
+        trials: List[dict],
+        directory: str,
+        train: tuple,
+        dev: tuple,
+        to_simple_digit=False,
+        min_epochs=1,
+        max_epochs=9,
+        eta=3,
+        threads_per_trial=2
+) -> List[dict]:
+    """
+    Run trials with successive halving: all trials are trained for *min_epochs* epochs, then only the best 1 / *eta* of
+    them continue for *eta* times as many epochs in total, until *max_epochs* is reached. Poor trials are terminated
+    early this way, so most of the compute goes to the promising ones.
+
+    Args:
+        trials(list[dict]): The trials, see :py:func:`create_trials`.
+        directory(str): The sweep directory for the trial weights.
+        train(tuple): The training datasets.
+        dev(tuple): The validation datasets, which rank the trials.
+        to_simple_digit(bool): If true, train simple 9 + 1 class digit recognition. (Default value = False)
+        min_epochs(int): The number of epochs of the first rung. (Default value = 1)
+        max_epochs(int): The number of epochs of the last rung. (Default value = 9)
+        eta(int): The factor by which the number of trials is reduced and the epochs are increased in each rung.
+            (Default value = 3)
+        threads_per_trial(int): The number of CPUs of each trial. (Default value = 2)
+
+    Returns:
+        list[dict]: All trials with their results, the best first. Failed trials come last.
+
+    """
+    for trial in trials:
+        trial.update(epochs=0, rung=0)
+    survivors = list(trials)
+    epochs, rung = min_epochs, 0
+    while True:
+        print(f"Rung {rung}: training {len(survivors)} trials for {epochs} epochs")
+        run_rung(survivors, epochs, directory, train, dev, to_simple_digit, threads_per_trial)
+        for trial in survivors:
+            trial['rung'] = rung
+        if epochs >= max_epochs or len(survivors) == 1:
+            break
+        survivors = sorted((trial for trial in survivors if not trial.get('failed')),
+                           key=lambda trial: trial['accuracy'], reverse=True)[:max(1, len(survivors) // eta)]
+        if not survivors:
+            break
+        epochs, rung = min(epochs * eta, max_epochs), rung + 1
+    # Failed trials come last, the others by the last rung they reached and their accuracy
+    return sorted(trials, key=lambda trial: (not trial.get('failed'), trial['rung'],
+                                             -1. if trial.get('failed') else trial['accuracy']), reverse=True)
+
+
+def write_results(directory: str, trials: List[dict], space: Dict[str, Sequence]):
+    """
+    Write the sweep results as ``results.json`` and ``results.md`` into the sweep directory.
+
+    Args:
+        directory(str): The sweep directory.
+        trials(list[dict]): The trials, as returned by :py:func:`successive_halving`.
+        space(dict[str, Sequence]): The search space.
+
+    Returns:
+        None
+
+    """
+    with open(os.path.join(directory, "results.json"), "w") as f:
+        json.dump(trials, f, indent=2)
+
+    lines = [
+        "# Hyperparameter sweep",
+        "",
+        "| Trial | " + " | ".join(space.keys()) + " | Epochs | Accuracy | Throughput (images/s) |",
+        "|---:|" + "---:|" * len(space) + "---:|---:|---:|"
+    ]
+    for trial in trials:
+        lines.append(f"| {trial['id']} | " + " | ".join(str(trial[key]) for key in space.keys()) +
+                     f" | {trial['epochs']} | {trial.get('accuracy', float('nan')):.4f} | "
+                     f"{trial.get('images_per_second', float('nan')):.0f} |")
+    with open(os.path.join(directory, "results.md"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def sweep(
+        directory="sweep/",
+        space: Dict[str, Sequence] = None,
+        num_trials: Optional[int] = None,
+        to_simple_digit=False,
+        min_epochs=1,
+        max_epochs=9,
+        eta=3,
+        threads_per_trial=2,
+        seed=0
+) -> List[dict]:
+    """
+    Run a hyperparameter sweep of :py:func:`build_cnn <training.build_cnn>` models. The datasets are loaded once and
+    moved into shared memory before the trial processes are forked, so all trials share one copy of the images. The
+    trials are trained on the synthetic training data and ranked by their accuracy on the real training data's test
+    split, using :py:func:`successive_halving`.
+
+    Args:
+        directory(str): The directory for the trial weights and the results. (Default value = "sweep/")
+        space(dict[str, Sequence]): The values of ``learning_rate``, ``batch_size`` and ``width``. If None, use
+            :py:data:`SEARCH_SPACE`. (Default value = None)
+        num_trials(int, optional): If given, randomly choose this many combinations of the search space.
+            (Default value = None)
+        to_simple_digit(bool): If true, train simple 9 + 1 class digit recognition. (Default value = False)
+        min_epochs(int): The number of epochs of the first rung. (Default value = 1)
+        max_epochs(int): The number of epochs of the last rung. (Default value = 9)
+        eta(int): The reduction factor of successive halving. (Default value = 3)
+        threads_per_trial(int): The number of CPUs of each trial, so ``available CPUs / threads_per_trial`` trials run
+            in parallel. (Default value = 2)
+        seed(int): The seed of the sweep. (Default value = 0)
+
+    Returns:
+        list[dict]: All trials with their results, the best first.
+
+    """
+    os.makedirs(directory, exist_ok=True)
+    space = space if space is not None else SEARCH_SPACE
+
+    print("Loading data..")
+    concat_machine, concat_hand, concat_out, real_training = [
+        share_dataset(dataset) for dataset in load_datasets(TRANSFORMED_DATASET_NAMES[:4])
+    ]
+    train = (concat_machine.train, concat_hand.train, concat_out.train)
+    dev = (real_training.test,)
+
+    trials = create_trials(space, num_trials, seed)
+    trials = successive_halving(trials, directory, train, dev, to_simple_digit, min_epochs, max_epochs, eta,
+                                threads_per_trial)
+    write_results(directory, trials, space)
+    return trials
+
+
+if __name__ == '__main__':
+    best = sweep("sweep/")[0]
+    print("Best trial", best)
@@ -1,21 +1,160 @@
+import hashlib
+import json
 import os
-from typing import Tuple
+import time
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
 
 import numpy as np
 import tensorflow as tf
 import tensorflow.keras as keras
 from matplotlib import pyplot as plt
-from sklearn.metrics import classification_report
 from tensorflow.keras import Model, Sequential
 from tensorflow.keras import layers
 from tensorflow.keras import models
 from tensorflow.keras.callbacks import EarlyStopping
 
 from generate_datasets import load_datasets, TRANSFORMED_DATASET_NAMES
-from simulation.data.data_generator import SimpleDataGenerator, BaseDataGenerator
+from pruning import ChannelPruning, max_output_difference, PruningSchedule, strip_pruned
+from simulation.data.data_generator import SimpleDataGenerator, BaseDataGenerator, GeneratorCheckpoint
+from simulation.data.executor import available_cpus
 
+#: The training batch size if a GPU is available.
+GPU_BATCH_SIZE = 256
 
-def train_cnn(path="model/", to_simple_digit=False, epochs=100, ft_epochs=100, learning_rate=0.01):
+#: The training batch size on CPUs. Check the ``images_per_second`` of :py:class:`ThroughputLogger` before changing it.
+CPU_BATCH_SIZE = 64
+
+
+def configure_devices(intra_op_threads: Optional[int] = None, inter_op_threads=2, jit=False) -> bool:
+    """
+    Configure TensorFlow for the available devices. If there are GPUs, memory growth is enabled for all of them.
+    The thread pools are sized for the CPUs this process may actually use, as TensorFlow otherwise sizes them for all
+    CPUs of the machine, ignoring container CPU quotas.
+
+    This must be called before TensorFlow runs any operation.
+
+    Args:
+        intra_op_threads(int, optional): The number of threads used within an operation, e.g. a convolution. If None,
+            use all available CPUs. (Default value = None)
+        inter_op_threads(int): The number of threads running independent operations. The models are mostly
+            sequential, so few threads suffice. (Default value = 2)
+        jit(bool): If True, enable XLA JIT compilation, which fuses the small operations of the models.
+            (Default value = False)
+
+    Returns:
+        bool: True if a GPU is available.
+
+    """
+    gpus = tf.config.list_physical_devices('GPU')
+    for gpu in gpus:
+        tf.config.experimental.set_memory_growth(gpu, True)
+    tf.config.threading.set_intra_op_parallelism_threads(
+        intra_op_threads if intra_op_threads is not None else available_cpus()
+    )
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    tf.config.optimizer.set_jit(jit)
+    return len(gpus) > 0
+
+
+def default_batch_size(gpu_batch_size=GPU_BATCH_SIZE) -> int:
+    """
+    Get the training batch size for the available devices.
+
+    Args:
+        gpu_batch_size(int): The batch size if a GPU is available. (Default value = GPU_BATCH_SIZE)
+
+    Returns:
+        int: The given batch size if a GPU is available, else :py:data:`CPU_BATCH_SIZE`.
+
+    """
+    return gpu_batch_size if tf.config.list_physical_devices('GPU') else CPU_BATCH_SIZE
+
+
+class ThroughputLogger(keras.callbacks.Callback):
+    """
+    Logs the number of trained images per second of each epoch, not counting the validation. The value is added to the
+    epoch logs as ``images_per_second``, so Keras prints it with the other metrics and records it in the history.
+    """
+
+    def __init__(self, batch_size: int):
+        """
+
+
+        Args:
+            batch_size(int): The batch size of the training generator.
+
+        """
+        super().__init__()
+        self.batch_size = batch_size
+        self.batches = 0
+        self.start = 0.
+        self.duration = 0.
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.batches = 0
+        self.start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.batches += 1
+        self.duration = time.perf_counter() - self.start
+
+    def on_epoch_end(self, epoch, logs=None):
+        images_per_second = self.batches * self.batch_size / max(self.duration, 1e-9)
+        if logs is not None:
+            logs['images_per_second'] = images_per_second
+
+
+def build_cnn(num_classes: int, width=16, dense_units=128) -> Sequential:
+    """
+    Build the CNN model: four convolution blocks, each doubling the number of channels, and a three-layer MLP which
+    outputs logits.
+
+    Args:
+        num_classes(int): The number of classes.
+        width(int): The number of channels of the first convolution. (Default value = 16)
+        dense_units(int): The number of units of the hidden dense layers. (Default value = 128)
+
+    Returns:
+        Sequential: The model.
+
+    """
+    model = Sequential()
+    model.add(layers.InputLayer(input_shape=(28, 28, 1)))
+    model.add(layers.Conv2D(width, (3, 3), padding='same'))  # 28x28x16
+    model.add(layers.BatchNormalization())
+    model.add(layers.Activation('relu'))
+    model.add(layers.MaxPooling2D(pool_size=(2, 2)))  # 14x14x16
+    model.add(layers.Conv2D(2 * width, (3, 3)))  # 12x12x32
+    model.add(layers.BatchNormalization())
+    model.add(layers.Activation('relu'))
+    model.add(layers.MaxPooling2D(pool_size=(2, 2)))  # 6x6x32
+    model.add(layers.Conv2D(4 * width, (3, 3)))  # 4x4x64
+    model.add(layers.BatchNormalization())
+    model.add(layers.Activation('relu'))
+    model.add(layers.MaxPooling2D(pool_size=(2, 2)))  # 2x2x64
+    model.add(layers.Conv2D(8 * width, (3, 3), padding='same'))  # 2x2x64
+    model.add(layers.BatchNormalization())
+    model.add(layers.Activation('relu'))
+    model.add(layers.MaxPooling2D(pool_size=(2, 2)))  # 1x1x128
+    model.add(layers.Flatten())  # 64
+    model.add(layers.Dense(dense_units, activation='relu'))
+    model.add(layers.Dropout(0.25))
+    model.add(layers.Dense(dense_units, activation='relu'))
+    model.add(layers.Dense(num_classes))
+    return model
+
+
+def train_cnn(
+        path="model/",
+        to_simple_digit=False,
+        epochs=100,
+        ft_epochs=100,
+        learning_rate=0.01,
+        save_freq=100,
+        batch_size: Optional[int] = None,
+        pruning: Optional[PruningSchedule] = None,
+        dataset_names: List[str] = TRANSFORMED_DATASET_NAMES
+):
     """
     Train the CNN model and save it under the given path. The method first loads the models using
     :py:doc:`generate_datasets.py <training.generate_datasets.py>` methods. Then the model is trained, saved and finally
@@ -24,6 +163,15 @@ def train_cnn(path="model/", to_simple_digit=False, epochs=100, ft_epochs=100, l
     Training is run in two steps: It is first trained with synthetic data and then finetuned with real data. Early
     stopping is used to prevent overfitting.
 
+    Both steps are checkpointed under the given path with a
+    :py:class:`GeneratorCheckpoint <simulation.data.data_generator.GeneratorCheckpoint>`. If the training is
+    interrupted, calling this method again resumes it from the last checkpoint on the same sample order.
+
+    If a pruning schedule is given, the finetuned model is saved as ``model.unpruned.h5`` and finetuned once more with
+    :py:class:`ChannelPruning <pruning.ChannelPruning>`. Early stopping only starts once the target fraction has been
+    pruned and finetuned for one epoch. The pruned channels are then removed and the smaller model is compared with
+    the unpruned model and saved as ``model.h5``.
+
     Args:
         path(str): The directory to save the trained model to. (Default value = "model/")
         to_simple_digit(bool): If true, convert the datasets to simple 9 + 1 class digit recognition.
@@ -31,6 +179,13 @@ def train_cnn(path="model/", to_simple_digit=False, epochs=100, ft_epochs=100, l
         epochs(int): The number of epochs. (Default value = 100)
         ft_epochs: The number of finetuning epochs. (Default value = 100)
         learning_rate: The learning rate for the Adadelta optimizer. (Default value = 0.01)
+        save_freq(int): Save a checkpoint every this many batches and at the end of each epoch.
+            (Default value = 100)
+        batch_size(int, optional): The batch size. If None, use :py:func:`default_batch_size`. (Default value = None)
+        pruning(PruningSchedule, optional): If given, prune the model after finetuning. (Default value = None)
+        dataset_names(list[str]): The file names of the machine written, handwritten, out, real training and real
+            validation datasets, e.g. :py:data:`MINED_DATASET_NAMES <mining.MINED_DATASET_NAMES>`.
+            (Default value = TRANSFORMED_DATASET_NAMES)
 
     Returns:
         None
@@ -39,9 +194,9 @@ def train_cnn(path="model/", to_simple_digit=False, epochs=100, ft_epochs=100, l
     os.makedirs(path, exist_ok=True)
 
     print("Loading data..")
-    concat_machine, concat_hand, concat_out, real_training, real_validation = load_datasets(TRANSFORMED_DATASET_NAMES)
+    concat_machine, concat_hand, concat_out, real_training, real_validation = load_datasets(dataset_names)
 
-    batch_size = 256
+    batch_size = batch_size if batch_size is not None else default_batch_size()
     train_generator = SimpleDataGenerator(
         concat_machine.train, concat_hand.train, concat_out.train,
         batch_size=batch_size,
@@ -77,80 +232,204 @@ def train_cnn(path="model/", to_simple_digit=False, epochs=100, ft_epochs=100, l
         to_simple_digit=to_simple_digit
     )
 
-    # Run training on the GPU
-    with tf.device('/GPU:0'):
-        # Keras Model
-        print("Creating model..")
-        model = Sequential()
-        model.add(layers.InputLayer(input_shape=(28, 28, 1)))
-        model.add(layers.Conv2D(16, (3, 3), padding='same'))  # 28x28x16
-        model.add(layers.BatchNormalization())
-        model.add(layers.Activation('relu'))
-        model.add(layers.MaxPooling2D(pool_size=(2, 2)))  # 14x14x16
-        model.add(layers.Conv2D(32, (3, 3)))  # 12x12x32
-        model.add(layers.BatchNormalization())
-        model.add(layers.Activation('relu'))
-        model.add(layers.MaxPooling2D(pool_size=(2, 2)))  # 6x6x32
-        model.add(layers.Conv2D(64, (3, 3)))  # 4x4x64
-        model.add(layers.BatchNormalization())
-        model.add(layers.Activation('relu'))
-        model.add(layers.MaxPooling2D(pool_size=(2, 2)))  # 2x2x64
-        model.add(layers.Conv2D(128, (3, 3), padding='same'))  # 2x2x64
-        model.add(layers.BatchNormalization())
-        model.add(layers.Activation('relu'))
-        model.add(layers.MaxPooling2D(pool_size=(2, 2)))  # 1x1x128
-        model.add(layers.Flatten())  # 64
-        model.add(layers.Dense(128, activation='relu'))
-        model.add(layers.Dropout(0.25))
-        model.add(layers.Dense(128, activation='relu'))
-        model.add(layers.Dense(train_generator.num_classes))
-
-        # Hyperparameters
-
-        print("Compiling model..")
+    # Keras Model
+    print("Creating model..")
+    model = build_cnn(train_generator.num_classes)
+
+    # Hyperparameters
+
+    print("Compiling model..")
+    model.compile(
+        loss=keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+        optimizer=keras.optimizers.Adadelta(learning_rate),
+        metrics=['accuracy']
+    )
+    print(model.summary())
+
+    print("Training model on")
+    config = {'datasets': dataset_names, 'to_simple_digit': to_simple_digit}
+    fit_resumable(model, train_generator, dev_generator, epochs, path + "checkpoint.train", save_freq, config=config)
+
+    print("Finetuning model")
+    fit_resumable(model, ft_train_generator, ft_dev_generator, ft_epochs, path + "checkpoint.ft", save_freq,
+                  config=config)
+
+    if pruning is not None:
+        print("Pruning model")
+        models.save_model(model, path + "model.unpruned.h5")
+        unpruned = models.load_model(path + "model.unpruned.h5")
+        # Fresh generators, so the pruning schedule starts at epoch 0
+        prune_train_generator = SimpleDataGenerator(real_training.train, batch_size=batch_size, shuffle=True,
+                                                    to_simple_digit=to_simple_digit)
+        prune_dev_generator = SimpleDataGenerator(real_training.test, batch_size=batch_size, shuffle=True,
+                                                  to_simple_digit=to_simple_digit)
+        fit_resumable(model, prune_train_generator, prune_dev_generator, max(ft_epochs, pruning.epochs),
+                      path + "checkpoint.prune", save_freq, callbacks=[ChannelPruning(pruning)],
+                      min_epochs=pruning.epochs, config=dict(config, pruning=pruning._asdict()))
+
+        masked, model = model, strip_pruned(model)
+        print(f"Stripped pruned channels, max. output difference {max_output_difference(masked, model):.2e}")
         model.compile(
             loss=keras.losses.SparseCategoricalCrossentropy(from_logits=True),
             optimizer=keras.optimizers.Adadelta(learning_rate),
             metrics=['accuracy']
         )
-        print(model.summary())
+        compare_tflite_models({"unpruned": unpruned, "pruned": model}, test_generator)
+
+    print("Saving keras model")
+    models.save_model(model, path + "model.h5")
 
-        print("Training model on")
+    print("Evaluating keras model")
+    print("Training dev", dict(zip(model.metrics_names, model.evaluate(dev_generator))))
+    print("Finetuning dev", dict(zip(model.metrics_names, model.evaluate(ft_dev_generator))))
+    print("Test", dict(zip(model.metrics_names, model.evaluate(test_generator))))
+    evaluate(model, test_generator)
+
+
+def fit_resumable(
+        model: Model,
+        train_generator: BaseDataGenerator,
+        dev_generator: BaseDataGenerator,
+        epochs: int,
+        checkpoint_path: str,
+        save_freq=100,
+        monitor='val_accuracy',
+        callbacks: Optional[List[keras.callbacks.Callback]] = None,
+        min_epochs=0,
+        config: Optional[dict] = None
+):
+    """
+    Train a model with early stopping and checkpoints, resuming from the last checkpoint if there is one.
+
+    An interrupted epoch is finished first, skipping the batches which were already trained on. Early stopping starts
+    anew after resuming and after the first *min_epochs* epochs, which are always trained. If the checkpoint marks the
+    training as finished, only the final weights are restored. The throughput of each epoch is logged with a
+    :py:class:`ThroughputLogger`.
+
+    A checkpoint is only resumed if it was saved by the same training: the same model architecture, optimizer
+    configuration, training and validation labels, batch size, epochs and additional configuration. Otherwise, the
+    model is trained from the start.
+
+    Args:
+        model(Model): The compiled model.
+        train_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator for training.
+        dev_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator for validation.
+        epochs(int): The number of epochs.
+        checkpoint_path(str): The path prefix of the checkpoint files.
+        save_freq(int): Save a checkpoint every this many batches and at the end of each epoch.
+            (Default value = 100)
+        monitor(str): The metric monitored by early stopping. (Default value = 'val_accuracy')
+        callbacks(list[tensorflow.keras.callbacks.Callback], optional): Additional callbacks, called after early
+            stopping. (Default value = None)
+        min_epochs(int): The number of epochs before early stopping may stop the training or restore weights, e.g.
+            :py:attr:`PruningSchedule.epochs <pruning.PruningSchedule.epochs>`. (Default value = 0)
+        config(dict, optional): Additional JSON serializable configuration of the training which is not captured by
+            the model and generators, e.g. the dataset names. (Default value = None)
+
+    Returns:
+        None
+
+    """
+    fingerprint = _fingerprint(model, train_generator, dev_generator, dict(
+        config if config is not None else {}, epochs=epochs, min_epochs=min_epochs, monitor=monitor
+    ))
+    checkpoint = GeneratorCheckpoint(train_generator, checkpoint_path, save_freq=save_freq, fingerprint=fingerprint)
+    state = checkpoint.load(model)
+    if state is not None and state['finished']:
+        return
+    throughput = ThroughputLogger(train_generator.batch_size)
+    callbacks = callbacks if callbacks is not None else []
+    initial_epoch = train_generator.epoch
+    if train_generator.cursor > 0:
+        print(f"Resuming epoch {initial_epoch + 1} at batch {train_generator.cursor}")
         model.fit(
             train_generator, validation_data=dev_generator,
-            epochs=epochs,
-            callbacks=[
-                EarlyStopping(monitor='val_accuracy', restore_best_weights=True, patience=3, min_delta=0.0001),
-            ]
+            epochs=initial_epoch + 1, initial_epoch=initial_epoch,
+            shuffle=False, callbacks=[checkpoint, throughput] + callbacks
         )
+        initial_epoch += 1
 
-        print("Finetuning model")
+    if initial_epoch < min(min_epochs, epochs):
         model.fit(
-            ft_train_generator, validation_data=ft_dev_generator,
-            epochs=ft_epochs,
-            callbacks=[
-                EarlyStopping(monitor='val_accuracy', restore_best_weights=True, patience=3, min_delta=0.0001),
-            ]
+            train_generator, validation_data=dev_generator,
+            epochs=min(min_epochs, epochs), initial_epoch=initial_epoch,
+            shuffle=False, callbacks=[checkpoint, throughput] + callbacks
         )
+        initial_epoch = min(min_epochs, epochs)
 
-        print("Saving keras model")
-        models.save_model(model, path + "model.h5")
+    model.fit(
+        train_generator, validation_data=dev_generator,
+        epochs=epochs, initial_epoch=initial_epoch,
+        shuffle=False,
+        callbacks=[
+            checkpoint,
+            throughput,
+            EarlyStopping(monitor=monitor, restore_best_weights=True, patience=3, min_delta=0.0001),
+        ] + callbacks
+    )
+    checkpoint.save(train_generator.epoch, 0, finished=True)
+
+
+def _fingerprint(model: Model, train_generator: BaseDataGenerator, dev_generator: BaseDataGenerator,
+                 config: dict) -> str:
+    """
+    Helper function to compute the fingerprint of a training configuration for :py:func:`fit_resumable`. Layer names
+    are left out, as they depend on the number of models created before.
+
+    Args:
+        model(Model): The compiled model.
+        train_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator for training.
+        dev_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator for validation.
+        config(dict): Additional configuration of the training.
+
+    Returns:
+        str: The SHA-1 digest of the configuration.
+
+    """
+    def labels_digest(generator: BaseDataGenerator) -> str:
+        return hashlib.sha1(np.ascontiguousarray(generator.get_labels()).tobytes()).hexdigest()
 
-        print("Evaluating keras model")
-        print("Training dev", dict(zip(model.metrics_names, model.evaluate(dev_generator))))
-        print("Finetuning dev", dict(zip(model.metrics_names, model.evaluate(ft_dev_generator))))
-        print("Test", dict(zip(model.metrics_names, model.evaluate(test_generator))))
-        evaluate(model, test_generator)
+    content = {
+        'layers': [[type(layer).__name__, dict(layer.get_config(), name=None)] for layer in model.layers],
+        'optimizer': dict(model.optimizer.get_config(), name=None),
+        'batch_size': train_generator.batch_size,
+        'train_labels': labels_digest(train_generator),
+        'dev_labels': labels_digest(dev_generator),
+        'config': config
+    }
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
 
 
-def convert_to_tflite(model: Model, path: str, test_generator: BaseDataGenerator, binary=False):
+def convert_to_tflite(
+        model: Model,
+        path: str,
+        test_generator: BaseDataGenerator,
+        representative_generator: BaseDataGenerator,
+        binary=False,
+        representative_samples=500,
+        integer_type=tf.uint8,
+        seed=0
+):
     """
-    Converts a Keras model to a tf.lite byte model.
+    Converts a Keras model to tf.lite byte models and compares them on the test files. Three models are created: a
+    float model, a dynamic range quantized model and a full integer quantized model, which also computes in integers
+    and takes integer input. The latter is calibrated with a class balanced sample of the representative generator,
+    which must not overlap with the test files.
+
+    TensorFlow versions before 2.3 can not convert models with integer input and output, the full integer model then
+    takes and returns floats.
 
     Args:
         model(tensorflow.keras.Model): The Keras model to convert.
         path(str): The directory path for the model.
         test_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator for test files.
+        representative_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator of the
+            calibration data for the full integer model, e.g. of the training split.
+        binary(bool): If True, the given model is a binary recognition model. (Default value = False)
+        representative_samples(int): The number of calibration samples. (Default value = 500)
+        integer_type(tf.dtypes.DType): The input and output type of the full integer model, ``tf.uint8`` or
+            ``tf.int8``. (Default value = tf.uint8)
+        seed(int): The seed for drawing the calibration samples. (Default value = 0)
 
     Returns:
         None
@@ -159,77 +438,334 @@ def convert_to_tflite(model: Model, path: str, test_generator: BaseDataGenerator
     print("Converting to TFLite model")
     converter: tf.lite.TFLiteConverter = tf.lite.TFLiteConverter.from_keras_model(model)
     tflite_float_model = converter.convert()
-    with open(path + "model.tflite", "wb") as f:
-        f.write(tflite_float_model)
-    tflite_float_score = evaluate_tflite_model(tflite_float_model, test_generator, binary=binary)
-    print(f"TFLite model accurracy: {tflite_float_score :0.02f}")
+
     print("Converting to quantized TFLite model")
     converter: tf.lite.TFLiteConverter = tf.lite.TFLiteConverter.from_keras_model(model)
     converter.optimizations = [tf.lite.Optimize.DEFAULT]
     tflite_quantized_model = converter.convert()
-    with open(path + "model.quantized.tflite", "wb") as f:
-        f.write(tflite_quantized_model)
-    tflite_quantized_score = evaluate_tflite_model(tflite_quantized_model, test_generator, binary=binary)
-    print(f"TFLite quantized model accurracy: {tflite_quantized_score :0.02f}")
-
 
-def evaluate_tflite_model(tflite_model_content: bytes, test_generator: BaseDataGenerator, binary=False) -> float:
+    print("Converting to full integer TFLite model")
+    converter: tf.lite.TFLiteConverter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = tf.lite.RepresentativeDataset(representative_dataset(
+        representative_generator, representative_samples, np.random.default_rng(seed)
+    ))
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = integer_type
+    converter.inference_output_type = integer_type
+    try:
+        tflite_int8_model = converter.convert()
+    except ValueError:
+        # TensorFlow versions before 2.3 only support float input and output with the Keras model converter
+        print("Integer input and output are not supported, keeping float input and output")
+        converter.inference_input_type = tf.float32
+        converter.inference_output_type = tf.float32
+        tflite_int8_model = converter.convert()
+
+    variants = (
+        ("float", "model.tflite", tflite_float_model),
+        ("quantized", "model.quantized.tflite", tflite_quantized_model),
+        ("int8", "model.int8.tflite", tflite_int8_model)
+    )
+    print(f"{'model':>10} {'size':>10} {'accuracy':>9} {'latency':>12}")
+    for name, file_name, content in variants:
+        with open(path + file_name, "wb") as f:
+            f.write(content)
+        score = evaluate_tflite_model(content, test_generator, binary=binary)
+        print(f"{name:>10} {len(content) / 1024:8.1f}kB {score.accuracy:9.4f} {score.latency * 1e6:10.1f}us")
+
+
+def representative_dataset(
+        generator: BaseDataGenerator,
+        samples=500,
+        rng: Optional[np.random.Generator] = None
+) -> Callable[[], Iterator[List[np.ndarray]]]:
     """
-    Evaluate a tf.lite model with the given *test_generator*.
+    Create a representative dataset for the calibration of full integer quantization. The same number of samples is
+    drawn at random from each class, or all samples of a class if it is smaller.
 
     Args:
-        tflite_model_content(bytes): The tf.lite model content, output of TFLiteConverter.convert().
-        test_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator for test files.
+        generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator to sample.
+        samples(int): The total number of samples. (Default value = 500)
+        rng(:py:class:`numpy.random.Generator`, optional): The random generator. If None, use a generator seeded
+            with 0. (Default value = None)
 
     Returns:
-        The accuracy of the tf.lite model on the test files.
+        Callable[[], Iterator[list[numpy.ndarray]]]: A function which yields single samples as converter input.
 
     """
-    test_images = test_generator.get_data()
-    test_labels = test_generator.get_labels()
+    labels = generator.get_labels()
+    classes = np.unique(labels)
+    quota = -(-samples // max(1, classes.shape[0]))
+    rng = rng if rng is not None else np.random.default_rng(0)
+    indices = [rng.choice(np.flatnonzero(labels == cls), min(quota, np.sum(labels == cls)), replace=False)
+               for cls in classes]
+    indices = rng.permutation(np.concatenate(indices))[:samples] if indices else np.zeros(0, dtype=np.int64)
+
+    def dataset() -> Iterator[List[np.ndarray]]:
+        data = generator.gather(indices)
+        for sample in data:
+            yield [sample[np.newaxis].astype(np.float32)]
+
+    return dataset
+
+
+class TFLiteScore(NamedTuple):
+    """The result of :py:func:`evaluate_tflite_model`."""
+    #: The accuracy on the test files.
+    accuracy: float
+    #: The confusion matrix of the predictions.
+    confusion: 'ConfusionMatrix'
+    #: The mean inference time per image in seconds.
+    latency: float
+
+
+def evaluate_tflite_model(
+        tflite_model_content: bytes,
+        test_generator: BaseDataGenerator,
+        binary=False,
+        batch_size=256,
+        num_threads: Optional[int] = None
+) -> TFLiteScore:
+    """
+    Evaluate a tf.lite model with the given *test_generator*. The input tensor of the interpreter is resized, so the
+    test files are run in contiguous batches. Each sample is evaluated exactly once, see
+    :py:meth:`iterate_samples <simulation.data.data_generator.BaseDataGenerator.iterate_samples>`.
 
-    # Initialize TFLite interpreter using the model.
-    interpreter = tf.lite.Interpreter(model_content=tflite_model_content)
-    interpreter.allocate_tensors()
-    input_tensor_index = interpreter.get_input_details()[0]["index"]
-    output = interpreter.tensor(interpreter.get_output_details()[0]["index"])
+    Args:
+        tflite_model_content(bytes): The tf.lite model content, output of TFLiteConverter.convert().
+        test_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator for test files.
+        binary(bool): If True, the given model is a binary recognition model. (Default value = False)
+        batch_size(int): The number of images per interpreter invocation. (Default value = 256)
+        num_threads(int, optional): The number of interpreter threads. If None, use all available CPUs.
+            (Default value = None)
 
-    # Run predictions on every image in the "test" dataset.
-    prediction_digits = []
-    for test_image in test_images:
-        # Pre-processing: add batch dimension and convert to float32 to match with
-        # the model's input digit format.
-        test_image = np.expand_dims(test_image, axis=0).astype(np.float32)
-        interpreter.set_tensor(input_tensor_index, test_image)
+    Returns:
+        TFLiteScore: The accuracy, confusion matrix and mean latency per image of the tf.lite model on the test files.
 
-        # Run inference.
+    """
+    interpreter = create_interpreter(tflite_model_content, num_threads or available_cpus())
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()[0]
+    output_index = output_details["index"]
+
+    confusion = ConfusionMatrix(2 if binary else test_generator.num_classes)
+    current_size, duration = 0, 0.
+    for x, y_true in test_generator.iterate_samples(batch_size):
+        # Only reallocate the tensors when the batch size changes, which is at most twice
+        if x.shape[0] != current_size:
+            interpreter.resize_tensor_input(input_details["index"], [x.shape[0]] + list(input_details["shape"][1:]))
+            interpreter.allocate_tensors()
+            current_size = x.shape[0]
+        interpreter.set_tensor(input_details["index"], quantize_input(x, input_details))
+
+        start = time.perf_counter()
         interpreter.invoke()
+        duration += time.perf_counter() - start
 
-        # Post-processing: remove batch dimension and find the digit with highest
-        # probability.
+        output = dequantize_output(interpreter.get_tensor(output_index), output_details)
         if binary:
-            digit = int(output()[0] >= 0.5)
+            y_pred = (output >= 0.5).astype(np.int64).reshape(-1)
         else:
-            digit = np.argmax(output()[0])
-        prediction_digits.append(digit)
+            y_pred = np.argmax(output, axis=-1)
+        confusion.update(y_true, y_pred)
+
+    count = max(1, int(confusion.matrix.sum()))
+    return TFLiteScore(confusion.accuracy, confusion, duration / count)
+
+
+def compare_tflite_models(
+        candidates: Dict[str, Model],
+        test_generator: BaseDataGenerator,
+        binary=False
+) -> Dict[str, TFLiteScore]:
+    """
+    Convert Keras models to float tf.lite models and compare their size, accuracy and latency on the test files.
+
+    Args:
+        candidates(dict[str, tensorflow.keras.Model]): The Keras models by name.
+        test_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator for test files.
+        binary(bool): If True, the given models are binary recognition models. (Default value = False)
+
+    Returns:
+        dict[str, TFLiteScore]: The score of each model.
 
-    # Compare prediction results with ground truth labels to calculate accuracy.
-    accurate_count = 0
-    for index in range(len(prediction_digits)):
-        if prediction_digits[index] == test_labels[index]:
-            accurate_count += 1
-    accuracy = accurate_count * 1.0 / len(prediction_digits)
+    """
+    scores = {}
+    print(f"{'model':>10} {'parameters':>10} {'size':>10} {'accuracy':>9} {'latency':>12}")
+    for name, model in candidates.items():
+        content = tf.lite.TFLiteConverter.from_keras_model(model).convert()
+        scores[name] = evaluate_tflite_model(content, test_generator, binary=binary)
+        print(f"{name:>10} {model.count_params():>10} {len(content) / 1024:8.1f}kB {scores[name].accuracy:9.4f} "
+              f"{scores[name].latency * 1e6:10.1f}us")
+    return scores
+
+
+def create_interpreter(tflite_model_content: bytes, num_threads: int) -> tf.lite.Interpreter:
+    """
+    Create a tf.lite interpreter with the given number of threads.
 
-    return accuracy
+    Args:
+        tflite_model_content(bytes): The tf.lite model content.
+        num_threads(int): The number of interpreter threads.
 
+    Returns:
+        tf.lite.Interpreter: The interpreter.
+
+    """
+    try:
+        return tf.lite.Interpreter(model_content=tflite_model_content, num_threads=num_threads)
+    except TypeError:
+        # TensorFlow versions before 2.3 do not support setting the number of threads
+        return tf.lite.Interpreter(model_content=tflite_model_content)
+
+
+def quantize_input(x: np.ndarray, details: dict) -> np.ndarray:
+    """
+    Convert float input to the input type of a tf.lite model, quantizing it if necessary.
 
-def evaluate(
+    Args:
+        x(:py:class:`numpy.ndarray`): The float input.
+        details(dict): The input details of the interpreter.
+
+    Returns:
+        :py:class:`numpy.ndarray`: The model input.
+
+    """
+    dtype = np.dtype(details["dtype"])
+    if not np.issubdtype(dtype, np.integer):
+        return x.astype(dtype, copy=False)
+    scale, zero_point = details["quantization"]
+    info = np.iinfo(dtype)
+    return np.clip(np.rint(x / scale + zero_point), info.min, info.max).astype(dtype)
+
+
+def dequantize_output(output: np.ndarray, details: dict) -> np.ndarray:
+    """
+    Convert the output of a tf.lite model to floats, dequantizing it if necessary.
+
+    Args:
+        output(:py:class:`numpy.ndarray`): The model output.
+        details(dict): The output details of the interpreter.
+
+    Returns:
+        :py:class:`numpy.ndarray`: The float output.
+
+    """
+    if not np.issubdtype(output.dtype, np.integer):
+        return output
+    scale, zero_point = details["quantization"]
+    return (output.astype(np.float32) - zero_point) * scale
+
+
+class ConfusionMatrix:
+    """
+    A confusion matrix which is accumulated batch by batch, so evaluation needs constant memory. Rows are true labels,
+    columns predicted labels. Per-class precision, recall and F1 score are derived from it.
+    """
+
+    def __init__(self, num_classes: int):
+        """
+
+
+        Args:
+            num_classes(int): The number of classes.
+
+        """
+        self.num_classes = num_classes
+        self.matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+
+    def update(self, y_true: np.ndarray, y_pred: np.ndarray):
+        """
+        Add a batch of predictions to the matrix.
+
+        Args:
+            y_true(:py:class:`numpy.ndarray`): True labels.
+            y_pred(:py:class:`numpy.ndarray`): Predicted labels.
+
+        Returns:
+            None
+
+        """
+        y_true = np.asarray(y_true, dtype=np.int64).ravel()
+        y_pred = np.asarray(y_pred, dtype=np.int64).ravel()
+        pairs = y_true * self.num_classes + y_pred
+        self.matrix += np.bincount(pairs, minlength=self.num_classes ** 2).reshape(self.matrix.shape)
+
+    @property
+    def support(self) -> np.ndarray:
+        """The number of samples of each true class."""
+        return self.matrix.sum(axis=1)
+
+    @property
+    def accuracy(self) -> float:
+        """The fraction of correct predictions."""
+        return float(np.trace(self.matrix) / max(1, self.matrix.sum()))
+
+    @property
+    def precision(self) -> np.ndarray:
+        """The precision of each class, 0 for classes which were never predicted."""
+        return _safe_divide(np.diag(self.matrix), self.matrix.sum(axis=0))
+
+    @property
+    def recall(self) -> np.ndarray:
+        """The recall of each class, 0 for classes without samples."""
+        return _safe_divide(np.diag(self.matrix), self.support)
+
+    @property
+    def f1(self) -> np.ndarray:
+        """The F1 score of each class."""
+        precision, recall = self.precision, self.recall
+        return _safe_divide(2 * precision * recall, precision + recall)
+
+    def report(self) -> str:
+        """
+        Format the per-class scores, the accuracy and their averages in the style of scikit-learn's
+        ``classification_report``.
+
+        Returns:
+            str: The report.
+
+        """
+        scores = np.stack([self.precision, self.recall, self.f1], axis=1)
+        support = self.support
+        total = int(support.sum())
+        lines = [f"{'':>12} {'precision':>9} {'recall':>9} {'f1-score':>9} {'support':>9}", ""]
+        for cls in range(self.num_classes):
+            lines.append(f"{cls:>12} " + " ".join(f"{score:9.2f}" for score in scores[cls]) + f" {support[cls]:>9}")
+        lines.append("")
+        lines.append(f"{'accuracy':>12} {'':>9} {'':>9} {self.accuracy:9.2f} {total:>9}")
+        averages = (("macro avg", scores.mean(axis=0)), ("weighted avg", _safe_divide(support @ scores, total)))
+        for name, average in averages:
+            lines.append(f"{name:>12} " + " ".join(f"{score:9.2f}" for score in average) + f" {total:>9}")
+        return "\n".join(lines)
+
+
+def _safe_divide(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Helper function to divide arrays, with 0 as result for divisions by 0.
+
+    Args:
+        a(:py:class:`numpy.ndarray`): The dividend.
+        b(:py:class:`numpy.ndarray`): The divisor.
+
+    Returns:
+        :py:class:`numpy.ndarray`: The quotient.
+
+    """
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    return np.divide(a, b, out=np.zeros(np.broadcast(a, b).shape), where=b != 0)
+
+
+def predict_batches(
         model: Model,
         test_generator: BaseDataGenerator,
         binary=False
-) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
     """
-    Evaluate a given model with the given generator.
+    Predict the labels of all samples of the given generator, one batch at a time. The samples are read with
+    :py:meth:`iterate_samples <simulation.data.data_generator.BaseDataGenerator.iterate_samples>`, so each sample is
+    predicted exactly once, even if the generator balances its batches.
 
     Args:
         model(tensorflow.keras.Model): The Keras model to evaluate.
@@ -237,21 +773,38 @@ def evaluate(
         binary(bool): If True, the given model is a binary recognition model. (Default value = False)
 
     Returns:
-        tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]: Images, true labels and
-            predicted labels as arrays.
+        Iterator[tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]]: Images,
+            true labels and predicted labels of each batch.
 
     """
-    x = test_generator.get_data()
-    y_true = test_generator.get_labels()
-    if binary:
-        y_pred = (model.predict(x) >= 0.5).astype(np.int).squeeze()
-    else:
-        y_pred = np.array(model.predict_classes(x))
+    for x, y_true in test_generator.iterate_samples():
+        output = np.asarray(model.predict_on_batch(x))
+        if binary:
+            y_pred = (output >= 0.5).astype(np.int64).reshape(-1)
+        else:
+            y_pred = np.argmax(output, axis=-1)
+        yield x, y_true, y_pred
 
-    # print(list(zip(model.metrics_names, model.evaluate_generator(test_generator))))
-    print(classification_report(y_true, y_pred))
-    print(f"{p}/{t}" + ("!" if p != t else "") for p, t in zip(y_pred, y_true))
-    return x, y_true, y_pred
+
+def evaluate(model: Model, test_generator: BaseDataGenerator, binary=False) -> ConfusionMatrix:
+    """
+    Evaluate a given model with the given generator. The generator is evaluated batch by batch and the results are
+    accumulated in a confusion matrix, so the memory stays constant for test sets of any size.
+
+    Args:
+        model(tensorflow.keras.Model): The Keras model to evaluate.
+        test_generator(:py:class:`simulation.data.data_generator.BaseDataGenerator`): The generator for test files.
+        binary(bool): If True, the given model is a binary recognition model. (Default value = False)
+
+    Returns:
+        ConfusionMatrix: The confusion matrix of the predictions.
+
+    """
+    confusion = ConfusionMatrix(2 if binary else test_generator.num_classes)
+    for _, y_true, y_pred in predict_batches(model, test_generator, binary):
+        confusion.update(y_true, y_pred)
+    print(confusion.report())
+    return confusion
 
 
 def evaluate_and_plot(model: Model, test_generator: BaseDataGenerator, binary=False):
@@ -267,11 +820,20 @@ def evaluate_and_plot(model: Model, test_generator: BaseDataGenerator, binary=Fa
         None
 
     """
-    x, y_true, y_pred = evaluate(model, test_generator, binary)
-    y = get_labels(y_true, y_pred)
-    zipped = list(zip(x, y))
-    for idx in range(0, len(zipped), 81):
-        plot_9x9_grid(zipped[idx:idx + 81], f"{'binary' if binary else 'full'}_validation_set_{idx // 81 + 1}")
+    confusion = ConfusionMatrix(2 if binary else test_generator.num_classes)
+    title = f"{'binary' if binary else 'full'}_validation_set"
+    zipped, grids = [], 0
+    for x, y_true, y_pred in predict_batches(model, test_generator, binary):
+        confusion.update(y_true, y_pred)
+        zipped.extend(zip(x, get_labels(y_true, y_pred)))
+        # Plot full grids as soon as they are available, only keeping the remaining images
+        while len(zipped) >= 81:
+            grids += 1
+            plot_9x9_grid(zipped[:81], f"{title}_{grids}")
+            zipped = zipped[81:]
+    if zipped:
+        plot_9x9_grid(zipped, f"{title}_{grids + 1}")
+    print(confusion.report())
 
 
 def load_and_evaluate(filepath="model_simple_finetuning/cnn_model.ft.final.hdf5"):
@@ -336,34 +898,39 @@ def plot_9x9_grid(zipped: zip, title: str):
     plt.tight_layout(0.1, rect=(0, 0, 0.8, 1))
     fig, axes = plt.subplots(9, 9, figsize=(9, 12))
     fig.suptitle(title, y=0.995)
-    tuples = iter(zipped)
-    for i in range(9):
-        for j in range(9):
-            img, label = tuples.__next__()
-            axes[i][j].imshow(img.squeeze(), cmap="gray")
-            axes[i][j].axis('off')
-            axes[i][j].set_title(str(label))
+    for ax in axes.ravel():
+        ax.axis('off')
+    # The last grid of a test set may not be full
+    for ax, (img, label) in zip(axes.ravel(), zipped):
+        ax.imshow(img.squeeze(), cmap="gray")
+        ax.set_title(str(label))
     plt.savefig(f"{title.replace(' ', '_')}.png")
     plt.show()
 
 
 if __name__ == '__main__':
     tf.get_logger().setLevel('ERROR')
-    physical_devices = tf.config.list_physical_devices('GPU')
-    tf.config.experimental.set_memory_growth(physical_devices[0], True)
+    configure_devices()
 
     # Train 10 class model
     train_cnn("model_simple_finetuning/", True)
-    validation = load_datasets([TRANSFORMED_DATASET_NAMES[-1]])[0]
+    real_training, validation = load_datasets(TRANSFORMED_DATASET_NAMES[-2:])
     test_generator = SimpleDataGenerator(
         validation.test,
         batch_size=64,
         shuffle=False,
         to_simple_digit=True
     )
+    representative_generator = SimpleDataGenerator(
+        real_training.train,
+        batch_size=64,
+        shuffle=False,
+        to_simple_digit=True
+    )
     model = models.load_model("model_simple_finetuning/model.h5")
     # evaluate(model, test_generator)
-    convert_to_tflite(model, "model_simple_finetuning/", test_generator)
+    convert_to_tflite(model, "model_simple_finetuning/", test_generator,
+                      representative_generator=representative_generator)
 
     # Train 20 class model
     train_cnn("model_full_finetuning/", False)
@@ -373,6 +940,13 @@ if __name__ == '__main__':
         shuffle=False,
         to_simple_digit=False
     )
+    representative_generator = SimpleDataGenerator(
+        real_training.train,
+        batch_size=64,
+        shuffle=False,
+        to_simple_digit=False
+    )
     model = models.load_model("model_full_finetuning/model.h5")
     # evaluate(model, test_generator)
-    convert_to_tflite(model, "model_full_finetuning/", test_generator)
+    convert_to_tflite(model, "model_full_finetuning/", test_generator,
+                      representative_generator=representative_generator)
@@ -1,5 +1,5 @@
 import os
-from typing import List, Union
+from typing import List, Optional, Union
 
 import tensorflow as tf
 import tensorflow.keras as keras
@@ -11,7 +11,9 @@ from tensorflow.keras.layers import Conv2D, BatchNormalization, Activation, MaxP
 
 from generate_datasets import load_datasets, TRANSFORMED_DATASET_NAMES
 from simulation.data.data_generator import ToBinaryGenerator
-from training import evaluate, convert_to_tflite
+from pruning import ChannelPruning, max_output_difference, PruningSchedule, strip_pruned
+from training import evaluate, compare_tflite_models, convert_to_tflite, configure_devices, default_batch_size, \
+    ThroughputLogger
 
 
 def train_binary_model(
@@ -20,7 +22,9 @@ def train_binary_model(
         ft_epochs=100,
         learning_rate=0.01,
         classes_to_match: Union[int, List[int]] = 0,
-        classes_to_drop: Union[int, List[int]] = None
+        classes_to_drop: Union[int, List[int]] = None,
+        batch_size: Optional[int] = None,
+        pruning: Optional[PruningSchedule] = None
 ):
     """
     Train a smaller binary model for empty/not empty classification and save it under the given path. The method first
@@ -30,6 +34,11 @@ def train_binary_model(
     Training is run in two steps: It is first trained with synthetic data and then finetuned with real data. Early
     stopping is used to prevent overfitting.
 
+    If a pruning schedule is given, the finetuned model is saved as ``model.unpruned.h5`` and finetuned once more with
+    :py:class:`ChannelPruning <pruning.ChannelPruning>`. Early stopping only starts once the target fraction has been
+    pruned and finetuned for one epoch. The pruned channels are then removed and the smaller model is compared with
+    the unpruned model and saved as ``model.h5``.
+
     Args:
         path(str): The directory to save the trained model to.
         epochs(int): The number of epochs. (Default value = 100)
@@ -37,6 +46,10 @@ def train_binary_model(
         learning_rate: The learning rate for the Adadelta optimizer. (Default value = 0.01)
         classes_to_match(Union[int, list[int]]): The classes to match as class 1. (Default value = 0)
         classes_to_drop(Union[int, list[int]]): The classes to drop from the dataset. (Default value = None)
+        batch_size(int, optional): The batch size. If None, use
+            :py:func:`default_batch_size <training.default_batch_size>` with a GPU batch size of 192.
+            (Default value = None)
+        pruning(PruningSchedule, optional): If given, prune the model after finetuning. (Default value = None)
 
     Returns:
         None
@@ -45,7 +58,7 @@ def train_binary_model(
     os.makedirs(path, exist_ok=True)
     concat_machine, concat_hand, concat_out, real_training, real_validation = load_datasets(TRANSFORMED_DATASET_NAMES)
 
-    batch_size = 192
+    batch_size = batch_size if batch_size is not None else default_batch_size(192)
     train_generator = ToBinaryGenerator(
         concat_machine.train, concat_hand.train, concat_out.train,
         classes_to_match=classes_to_match,
@@ -90,88 +103,122 @@ def train_binary_model(
         shuffle=False
     )
 
-    # Run training on the GPU
-    with tf.device('/GPU:0'):
-        # Keras Model
-        print("Creating model..")
-        model = Sequential()
-        model.add(Conv2D(16, (5, 5), strides=2,
-                         input_shape=(28, 28, 1)))
-        model.add(BatchNormalization())
-        model.add(Activation('relu'))
-        model.add(MaxPooling2D(pool_size=(4, 4)))
-        model.add(Conv2D(32, (2, 2)))
-        model.add(BatchNormalization())
-        model.add(Activation('relu'))
-        model.add(MaxPooling2D(pool_size=(2, 2)))
-        model.add(Flatten())  # 32
-        model.add(Dense(64, activation='relu'))
-        model.add(Dropout(0.25))
-        model.add(Dense(64, activation='relu'))
-        model.add(Dense(1, activation='sigmoid'))
-
-        # def mean_pred(_, y):
-        #     return keras.backend.mean(y)
-
-        print("Compiling model..")
-        model.compile(
-            loss=keras.losses.BinaryCrossentropy(from_logits=True),
-            optimizer=keras.optimizers.Adadelta(learning_rate),
-            metrics=[keras.metrics.binary_accuracy, 'mse'],
-        )
-        print(model.summary())
+    # Keras Model
+    print("Creating model..")
+    model = Sequential()
+    model.add(Conv2D(16, (5, 5), strides=2,
+                     input_shape=(28, 28, 1)))
+    model.add(BatchNormalization())
+    model.add(Activation('relu'))
+    model.add(MaxPooling2D(pool_size=(4, 4)))
+    model.add(Conv2D(32, (2, 2)))
+    model.add(BatchNormalization())
+    model.add(Activation('relu'))
+    model.add(MaxPooling2D(pool_size=(2, 2)))
+    model.add(Flatten())  # 32
+    model.add(Dense(64, activation='relu'))
+    model.add(Dropout(0.25))
+    model.add(Dense(64, activation='relu'))
+    model.add(Dense(1, activation='sigmoid'))
+
+    # def mean_pred(_, y):
+    #     return keras.backend.mean(y)
+
+    print("Compiling model..")
+    model.compile(
+        loss=keras.losses.BinaryCrossentropy(from_logits=True),
+        optimizer=keras.optimizers.Adadelta(learning_rate),
+        metrics=[keras.metrics.binary_accuracy, 'mse'],
+    )
+    print(model.summary())
+
+    print("Training model")
+    model.fit_generator(
+        train_generator, validation_data=dev_generator,
+        epochs=epochs,
+        callbacks=[
+            ThroughputLogger(batch_size),
+            EarlyStopping(monitor='val_accuracy', restore_best_weights=True, patience=3, min_delta=0.0001),
+        ]
+    )
 
-        print("Training model")
+    print("Finetuning model")
+    model.fit_generator(
+        ft_train_generator, validation_data=ft_train_generator,
+        epochs=ft_epochs,
+        callbacks=[
+            ThroughputLogger(batch_size),
+            EarlyStopping(monitor='val_accuracy', restore_best_weights=True, patience=3, min_delta=0.0001),
+        ]
+    )
+
+    if pruning is not None:
+        print("Pruning model")
+        models.save_model(model, path + "model.unpruned.h5", save_format='h5')
+        unpruned = models.load_model(path + "model.unpruned.h5")
+        # No early stopping until the target fraction has been pruned and finetuned for one epoch
+        channel_pruning = ChannelPruning(pruning)
         model.fit_generator(
-            train_generator, validation_data=dev_generator,
-            epochs=epochs,
-            callbacks=[
-                EarlyStopping(monitor='val_accuracy', restore_best_weights=True, patience=3, min_delta=0.0001),
-            ]
+            ft_train_generator, validation_data=ft_dev_generator,
+            epochs=pruning.epochs,
+            callbacks=[ThroughputLogger(batch_size), channel_pruning]
         )
-
-        print("Finetuning model")
         model.fit_generator(
-            ft_train_generator, validation_data=ft_train_generator,
-            epochs=ft_epochs,
+            ft_train_generator, validation_data=ft_dev_generator,
+            epochs=max(ft_epochs, pruning.epochs), initial_epoch=pruning.epochs,
             callbacks=[
+                ThroughputLogger(batch_size),
                 EarlyStopping(monitor='val_accuracy', restore_best_weights=True, patience=3, min_delta=0.0001),
+                channel_pruning
             ]
         )
 
-        models.save_model(model, path + "model.h5", save_format='h5')
+        masked, model = model, strip_pruned(model)
+        print(f"Stripped pruned channels, max. output difference {max_output_difference(masked, model):.2e}")
+        model.compile(
+            loss=keras.losses.BinaryCrossentropy(from_logits=True),
+            optimizer=keras.optimizers.Adadelta(learning_rate),
+            metrics=[keras.metrics.binary_accuracy, 'mse'],
+        )
+        compare_tflite_models({"unpruned": unpruned, "pruned": model}, test_generator, binary=True)
+
+    models.save_model(model, path + "model.h5", save_format='h5')
 
-        print("Evaluating")
-        print("Training dev", list(zip(model.metrics_names, model.evaluate_generator(dev_generator))))
-        print("Finetuning dev", list(zip(model.metrics_names, model.evaluate_generator(ft_dev_generator))))
-        print("Test", list(zip(model.metrics_names, model.evaluate_generator(test_generator))))
-        evaluate(model, test_generator, binary=True)
+    print("Evaluating")
+    print("Training dev", list(zip(model.metrics_names, model.evaluate_generator(dev_generator))))
+    print("Finetuning dev", list(zip(model.metrics_names, model.evaluate_generator(ft_dev_generator))))
+    print("Test", list(zip(model.metrics_names, model.evaluate_generator(test_generator))))
+    evaluate(model, test_generator, binary=True)
 
 
 if __name__ == '__main__':
     tf.get_logger().setLevel('ERROR')
-    physical_devices = tf.config.list_physical_devices('GPU')
-    tf.config.experimental.set_memory_growth(physical_devices[0], True)
+    configure_devices()
 
     # Train empty vs. not-empty classifier
     train_binary_model("model_empty_finetuning/")
 
-    validation = load_datasets([TRANSFORMED_DATASET_NAMES[-1]])[0]
+    real_training, validation = load_datasets(TRANSFORMED_DATASET_NAMES[-2:])
     test_generator = ToBinaryGenerator(
         validation.test,
         classes_to_match=0,
         batch_size=64,
         shuffle=False
     )
+    representative_generator = ToBinaryGenerator(
+        real_training.train,
+        classes_to_match=0,
+        batch_size=64,
+        shuffle=False
+    )
     model = models.load_model("model_empty_finetuning/model.h5")
     # evaluate(model, test_generator)
-    convert_to_tflite(model, "model_empty_finetuning/", test_generator, binary=True)
+    convert_to_tflite(model, "model_empty_finetuning/", test_generator, representative_generator, binary=True)
 
     # Train handwritten vs. machine-written classifier
     classes_to_match = list(range(1, 10))
     train_binary_model("model_hand_finetuning/", classes_to_match=classes_to_match)
 
-    validation = load_datasets([TRANSFORMED_DATASET_NAMES[-1]])[0]
     test_generator = ToBinaryGenerator(
         validation.test,
         classes_to_match=classes_to_match,
@@ -179,6 +226,13 @@ if __name__ == '__main__':
         batch_size=64,
         shuffle=False
     )
+    representative_generator = ToBinaryGenerator(
+        real_training.train,
+        classes_to_match=classes_to_match,
+        classes_to_drop=0,
+        batch_size=64,
+        shuffle=False
+    )
     model = models.load_model("model_hand_finetuning/model.h5")
     # evaluate(model, test_generator)
-    convert_to_tflite(model, "model_hand_finetuning/", test_generator, binary=True)
+    convert_to_tflite(model, "model_hand_finetuning/", test_generator, representative_generator, binary=True)
@@ -0,0 +1,312 @@
+import os
+from typing import Optional, Tuple
+
+import h5py
+import numpy as np
+import tensorflow as tf
+import tensorflow.keras as keras
+from tensorflow.keras import Model, Sequential
+from tensorflow.keras import layers
+from tensorflow.keras import models
+
+from benchmark import benchmark, CELLS_PER_FRAME, write_report
+from generate_datasets import load_datasets, TRANSFORMED_DATASET_NAMES
+from simulation.data.data_generator import Dataset, SimpleDataGenerator, to_model_input
+from training import configure_devices, convert_to_tflite, default_batch_size, evaluate, fit_resumable
+
+
+class DistillationDataGenerator(SimpleDataGenerator):
+    """
+    A :py:class:`SimpleDataGenerator <simulation.data.data_generator.SimpleDataGenerator>` which pairs each sample with
+    the cached logits of a teacher model. The target of a batch is a float array with the class label in the first
+    column, followed by the teacher logits, as expected by :py:class:`DistillationLoss`.
+    """
+
+    def __init__(self, *datasets: Dataset, teacher_logits: np.ndarray, **kwargs):
+        """
+
+
+        Args:
+            datasets(tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]): The input datasets as a sequence of
+                (data, label) tuples.
+            teacher_logits(:py:class:`numpy.ndarray`): The teacher logits of all samples in dataset order, as returned
+                by :py:func:`cache_teacher_logits`.
+            kwargs: Arbitrary :py:class:`SimpleDataGenerator <simulation.data.data_generator.SimpleDataGenerator>`
+                arguments.
+
+        """
+        super().__init__(*datasets, **kwargs)
+        if teacher_logits.shape[0] != len(self.view):
+            raise ValueError(f"Got {teacher_logits.shape[0]} teacher logits for {len(self.view)} samples!")
+        self.teacher_logits = teacher_logits
+
+    def __getitem__(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generate one batch of data.
+
+        Args:
+            index(int): The batch number.
+
+        Returns:
+            Tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]: A tuple of a 4-dimensional array and the
+                targets of shape (batch size, 1 + number of classes).
+
+        """
+        index += self.cursor
+        indices = self.indices[index * self.batch_size:(index + 1) * self.batch_size]
+        x = to_model_input(self.view.gather(indices), self.flatten)
+        y = np.hstack([self.labels[indices, np.newaxis], self.teacher_logits[indices]]).astype(np.float32)
+        return x, y
+
+
+class DistillationLoss(keras.losses.Loss):
+    """
+    The knowledge distillation loss: a weighted sum of the cross entropy with the teacher's softened class
+    distribution and the cross entropy with the true labels. The targets are the class label followed by the teacher
+    logits, see :py:class:`DistillationDataGenerator`.
+    """
+
+    def __init__(self, temperature=4., alpha=0.9, name="distillation_loss"):
+        """
+
+
+        Args:
+            temperature(float): The temperature softening both class distributions. (Default value = 4.)
+            alpha(float): The weight of the teacher loss, the label loss is weighted by ``1 - alpha``.
+                (Default value = 0.9)
+            name(str): The name of the loss. (Default value = "distillation_loss")
+
+        """
+        super().__init__(name=name)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def call(self, y_true, y_pred):
+        labels = tf.cast(y_true[:, 0], tf.int32)
+        teacher = tf.nn.softmax(y_true[:, 1:] / self.temperature)
+        soft = keras.losses.categorical_crossentropy(teacher, y_pred / self.temperature, from_logits=True)
+        hard = keras.losses.sparse_categorical_crossentropy(labels, y_pred, from_logits=True)
+        # Scale the soft loss by T^2, so its gradients keep their magnitude for any temperature
+        return self.alpha * self.temperature ** 2 * soft + (1 - self.alpha) * hard
+
+    def get_config(self):
+        config = super().get_config()
+        config.update(temperature=self.temperature, alpha=self.alpha)
+        return config
+
+
+def label_accuracy(y_true, y_pred):
+    """
+    The accuracy of the student with respect to the class labels in the first column of the distillation targets.
+
+    Args:
+        y_true(tf.Tensor): The distillation targets.
+        y_pred(tf.Tensor): The student logits.
+
+    Returns:
+        tf.Tensor: The accuracy of each sample.
+
+    """
+    return keras.metrics.sparse_categorical_accuracy(y_true[:, :1], y_pred)
+
+
+def build_student(num_classes: int, width=8) -> Model:
+    """
+    Build the compact student model. After a regular first convolution, it uses depthwise-separable convolutions with
+    a fraction of the teacher's channels and global average pooling instead of the dense layers.
+
+    Args:
+        num_classes(int): The number of classes.
+        width(int): The number of channels of the first convolution, doubled in each following block.
+            (Default value = 8)
+
+    Returns:
+        Model: The student model, which outputs logits.
+
+    """
+    model = Sequential()
+    model.add(layers.InputLayer(input_shape=(28, 28, 1)))
+    model.add(layers.Conv2D(width, (3, 3), padding='same'))  # 28x28x8
+    model.add(layers.BatchNormalization())
+    model.add(layers.Activation('relu'))
+    model.add(layers.MaxPooling2D(pool_size=(2, 2)))  # 14x14x8
+    for filters in (2 * width, 4 * width):
+        model.add(layers.SeparableConv2D(filters, (3, 3), padding='same'))  # 14x14x16, 7x7x32
+        model.add(layers.BatchNormalization())
+        model.add(layers.Activation('relu'))
+        model.add(layers.MaxPooling2D(pool_size=(2, 2)))  # 7x7x16, 3x3x32
+    model.add(layers.SeparableConv2D(8 * width, (3, 3), padding='same'))  # 3x3x64
+    model.add(layers.BatchNormalization())
+    model.add(layers.Activation('relu'))
+    model.add(layers.GlobalAveragePooling2D())  # 64
+    model.add(layers.Dense(num_classes))
+    return model
+
+
+def cache_teacher_logits(teacher: Model, generator: SimpleDataGenerator, file_path: str, key: str) -> np.ndarray:
+    """
+    Compute the teacher logits of all samples of a generator once and cache them in an HDF5 file, so the teacher does
+    not run in every epoch. The cache is recomputed if the sample count or the teacher's number of classes changed.
+    Delete the cache file after retraining the teacher.
+
+    Args:
+        teacher(Model): The teacher model, which outputs logits.
+        generator(:py:class:`simulation.data.data_generator.SimpleDataGenerator`): The generator of the samples. It
+            must not shuffle, so the logits are in dataset order.
+        file_path(str): The path of the HDF5 cache file.
+        key(str): The name of the logits in the cache file.
+
+    Returns:
+        :py:class:`numpy.ndarray`: The teacher logits of all samples in dataset order.
+
+    """
+    if generator.shuffle:
+        raise ValueError("The generator must not shuffle!")
+    num_classes = teacher.output_shape[-1]
+    with h5py.File(file_path, "a") as f:
+        if key in f and f[key].shape == (len(generator.view), num_classes):
+            return f[key][:]
+        logits = np.empty((len(generator.view), num_classes), dtype=np.float32)
+        for index in range(len(generator)):
+            x, _ = generator[index]
+            logits[index * generator.batch_size:index * generator.batch_size + x.shape[0]] = teacher.predict_on_batch(x)
+        if key in f:
+            del f[key]
+        f.create_dataset(key, data=logits)
+    return logits
+
+
+def train_student(
+        path="model_student/",
+        teacher_path="model_full_finetuning/",
+        to_simple_digit=False,
+        epochs=100,
+        ft_epochs=100,
+        learning_rate=0.01,
+        temperature=4.,
+        alpha=0.9,
+        width=8,
+        save_freq=100,
+        batch_size: Optional[int] = None
+):
+    """
+    Train a compact student model against the logits of a trained :py:func:`train_cnn <training.train_cnn>` teacher
+    and save it under the given path. Like the teacher, it is first trained with synthetic data and then finetuned with
+    real data. The teacher logits are cached in ``teacher_logits.hdf5`` under the given path.
+
+    Finally, the student is evaluated, exported as tf.lite models with
+    :py:func:`convert_to_tflite <training.convert_to_tflite>` and benchmarked next to the teacher.
+
+    Args:
+        path(str): The directory to save the student to. (Default value = "model_student/")
+        teacher_path(str): The directory of the teacher, which must match ``to_simple_digit``.
+            (Default value = "model_full_finetuning/")
+        to_simple_digit(bool): If true, convert the datasets to simple 9 + 1 class digit recognition.
+            (Default value = False)
+        epochs(int): The number of epochs. (Default value = 100)
+        ft_epochs: The number of finetuning epochs. (Default value = 100)
+        learning_rate: The learning rate for the Adadelta optimizer. (Default value = 0.01)
+        temperature(float): The distillation temperature. (Default value = 4.)
+        alpha(float): The weight of the teacher loss. (Default value = 0.9)
+        width(int): The width of the student, see :py:func:`build_student`. (Default value = 8)
+        save_freq(int): Save a checkpoint every this many batches and at the end of each epoch.
+            (Default value = 100)
+        batch_size(int, optional): The batch size. If None, use
+            :py:func:`default_batch_size <training.default_batch_size>`. (Default value = None)
+
+    Returns:
+        None
+
+    """
+    os.makedirs(path, exist_ok=True)
+
+    print("Loading data..")
+    concat_machine, concat_hand, concat_out, real_training, real_validation = load_datasets(TRANSFORMED_DATASET_NAMES)
+    teacher = models.load_model(teacher_path + "model.h5", compile=False)
+
+    batch_size = batch_size if batch_size is not None else default_batch_size()
+    splits = {
+        "train": (concat_machine.train, concat_hand.train, concat_out.train),
+        "dev": (concat_machine.test, concat_hand.test, concat_out.test),
+        "ft_train": (real_training.train,),
+        "ft_dev": (real_training.test,)
+    }
+    generators = {}
+    for key, datasets in splits.items():
+        print(f"Computing teacher logits for {key}..")
+        logits = cache_teacher_logits(
+            teacher,
+            SimpleDataGenerator(*datasets, batch_size=batch_size, shuffle=False, to_simple_digit=to_simple_digit),
+            path + "teacher_logits.hdf5",
+            key
+        )
+        generators[key] = DistillationDataGenerator(*datasets, teacher_logits=logits, batch_size=batch_size,
+                                                    shuffle=True, to_simple_digit=to_simple_digit)
+
+    test_generator = SimpleDataGenerator(real_validation.test, batch_size=batch_size, shuffle=False,
+                                         to_simple_digit=to_simple_digit)
+
+    print("Creating model..")
+    model = build_student(test_generator.num_classes, width)
+    model.compile(
+        loss=DistillationLoss(temperature, alpha),
+        optimizer=keras.optimizers.Adadelta(learning_rate),
+        metrics=[label_accuracy]
+    )
+    print(model.summary())
+
+    print("Training model on")
+    config = {'teacher_path': teacher_path, 'to_simple_digit': to_simple_digit, 'temperature': temperature,
+              'alpha': alpha}
+    fit_resumable(model, generators["train"], generators["dev"], epochs, path + "checkpoint.train", save_freq,
+                  monitor='val_label_accuracy', config=config)
+
+    print("Finetuning model")
+    fit_resumable(model, generators["ft_train"], generators["ft_dev"], ft_epochs, path + "checkpoint.ft", save_freq,
+                  monitor='val_label_accuracy', config=config)
+
+    print("Saving keras model")
+    models.save_model(model, path + "model.h5", include_optimizer=False)
+
+    print("Evaluating keras model")
+    print("Teacher")
+    evaluate(teacher, test_generator)
+    print("Student")
+    evaluate(model, test_generator)
+
+    representative_generator = SimpleDataGenerator(real_training.train, batch_size=batch_size, shuffle=False,
+                                                   to_simple_digit=to_simple_digit)
+    convert_to_tflite(model, path, test_generator, representative_generator=representative_generator)
+    compare_with_teacher(path, teacher_path)
+
+
+def compare_with_teacher(path: str, teacher_path: str, budget_ms=1000 / 30):
+    """
+    Benchmark the student and the teacher models and print their sizes and latencies for the cells of a frame side by
+    side. The student's benchmark report is written to its directory.
+
+    Args:
+        path(str): The directory of the student.
+        teacher_path(str): The directory of the teacher.
+        budget_ms(float): The latency budget per frame in milliseconds. (Default value = 1000 / 30)
+
+    Returns:
+        None
+
+    """
+    results = {name: benchmark(directory, batch_sizes=(CELLS_PER_FRAME,))
+               for name, directory in (("teacher", teacher_path), ("student", path))}
+    write_report(path, results["student"], budget_ms)
+
+    print(f"{'model':>8} {'file':>24} {'size':>10} {'threads':>8} {'p50':>10} {'p99':>10}")
+    for name, directory in (("teacher", teacher_path), ("student", path)):
+        for result in results[name]:
+            size = os.path.getsize(os.path.join(directory, result['model'])) / 1024
+            print(f"{name:>8} {result['model']:>24} {size:8.1f}kB {str(result['threads'] or '-'):>8} "
+                  f"{result['p50_ms']:8.2f}ms {result['p99_ms']:8.2f}ms")
+
+
+if __name__ == '__main__':
+    tf.get_logger().setLevel('ERROR')
+    configure_devices()
+    train_student("model_student/", "model_full_finetuning/", to_simple_digit=False)
@@ -0,0 +1,279 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.keras as keras
+from tensorflow.keras import Model
+from tensorflow.keras import layers
+from tensorflow.keras import models
+
+from generate_datasets import load_datasets, TRANSFORMED_DATASET_NAMES
+from simulation.data.data_generator import Dataset, SimpleDataGenerator
+from simulation.data.dataset import CLASS_EMPTY, CLASS_OUT
+from simulation.data.executor import available_cpus
+from training import ConfusionMatrix, configure_devices, create_interpreter, default_batch_size, dequantize_output, \
+    fit_resumable, quantize_input
+
+#: Lookup table of the 20 dataset classes to the 10 simple digit classes, mapping handwritten to machine written digits.
+DIGIT_LUT = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9])
+
+
+class MultiHeadDataGenerator(SimpleDataGenerator):
+    """
+    A :py:class:`SimpleDataGenerator <simulation.data.data_generator.SimpleDataGenerator>` which derives the labels of
+    all three heads from the 20 dataset classes: the simple digit class, whether the cell is empty and whether the digit
+    is handwritten. The 'out' class is dropped.
+    """
+
+    def __init__(self, *datasets: Dataset, **kwargs):
+        """
+
+
+        Args:
+            datasets(tuple[:py:class:`numpy.ndarray`, :py:class:`numpy.ndarray`]): The input datasets as a sequence of
+                (data, label) tuples.
+            kwargs: Arbitrary :py:class:`SimpleDataGenerator <simulation.data.data_generator.SimpleDataGenerator>`
+                arguments, except for ``to_simple_digit`` and ``no_zero``.
+
+        """
+        super().__init__(*datasets, **kwargs)
+        self.view = self.view.drop([CLASS_OUT])
+        self.labels = self.view.labels
+        self.num_classes = 10
+        self.shuffle_indices()
+
+    def __getitem__(self, index: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Generate one batch of data.
+
+        Args:
+            index(int): The batch number.
+
+        Returns:
+            Tuple[:py:class:`numpy.ndarray`, dict[str, :py:class:`numpy.ndarray`]]: A tuple of a 4-dimensional array and
+                the labels of each head.
+
+        """
+        x, y = super().__getitem__(index)
+        return x, split_labels(y)
+
+
+def split_labels(y: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Derive the labels of all heads from the 20 dataset classes.
+
+    Args:
+        y(:py:class:`numpy.ndarray`): The dataset classes.
+
+    Returns:
+        dict[str, :py:class:`numpy.ndarray`]: The labels of each head.
+
+    """
+    return {
+        "digit": DIGIT_LUT[y],
+        "empty": (y == CLASS_EMPTY).astype(np.float32),
+        "hand": (y > CLASS_OUT).astype(np.float32)
+    }
+
+
+def build_model(num_classes=10) -> Tuple[Model, Model]:
+    """
+    Build the multi-head model: the convolutional trunk of the digit model with a digit, an empty and a handwritten
+    head. The trained model outputs logits, the inference model shares its weights and outputs the probabilities of the
+    binary heads.
+
+    Args:
+        num_classes(int): The number of digit classes. (Default value = 10)
+
+    Returns:
+        tuple[Model, Model]: The training and the inference model.
+
+    """
+    inputs = layers.Input(shape=(28, 28, 1))
+    x = inputs
+    for filters, padding in ((16, 'same'), (32, 'valid'), (64, 'valid'), (128, 'same')):
+        x = layers.Conv2D(filters, (3, 3), padding=padding)(x)
+        x = layers.BatchNormalization()(x)
+        x = layers.Activation('relu')(x)
+        x = layers.MaxPooling2D(pool_size=(2, 2))(x)
+    trunk = layers.Flatten()(x)
+
+    digit = layers.Dense(128, activation='relu')(trunk)
+    digit = layers.Dropout(0.25)(digit)
+    digit = layers.Dense(128, activation='relu')(digit)
+    digit = layers.Dense(num_classes, name="digit")(digit)
+    binary_outputs, probabilities = [], []
+    for name in ("empty", "hand"):
+        head = layers.Dense(32, activation='relu')(trunk)
+        binary_outputs.append(layers.Dense(1, name=name)(head))
+        probabilities.append(layers.Activation('sigmoid', name=f"{name}_probability")(binary_outputs[-1]))
+
+    model = Model(inputs, [digit] + binary_outputs)
+    inference_model = Model(inputs, [digit] + probabilities)
+    return model, inference_model
+
+
+def train_multihead(path="model_multihead/", epochs=100, ft_epochs=100, learning_rate=0.01,
+                    loss_weights: Dict[str, float] = None, batch_size: Optional[int] = None):
+    """
+    Train the multi-head model, which replaces the digit model and both binary models, and save it under the given
+    path. All heads are trained jointly in one pass over the data with one loss per head.
+
+    Training is run in two steps like :py:func:`train_cnn <training.train_cnn>`: It is first trained with synthetic data
+    and then finetuned with real data. Early stopping monitors the accuracy of the digit head.
+
+    Args:
+        path(str): The directory to save the trained model to. (Default value = "model_multihead/")
+        epochs(int): The number of epochs. (Default value = 100)
+        ft_epochs: The number of finetuning epochs. (Default value = 100)
+        learning_rate: The learning rate for the Adadelta optimizer. (Default value = 0.01)
+        loss_weights(dict[str, float]): The weight of the loss of each head. If None, all losses have the same weight.
+            (Default value = None)
+        batch_size(int, optional): The batch size. If None, use
+            :py:func:`default_batch_size <training.default_batch_size>`.
+            (Default value = None)
+
+    Returns:
+        None
+
+    """
+    os.makedirs(path, exist_ok=True)
+
+    print("Loading data..")
+    concat_machine, concat_hand, concat_out, real_training, real_validation = load_datasets(TRANSFORMED_DATASET_NAMES)
+
+    batch_size = batch_size if batch_size is not None else default_batch_size()
+    train_generator = MultiHeadDataGenerator(concat_machine.train, concat_hand.train, concat_out.train,
+                                             batch_size=batch_size)
+    dev_generator = MultiHeadDataGenerator(concat_machine.test, concat_hand.test, concat_out.test,
+                                           batch_size=batch_size)
+    ft_train_generator = MultiHeadDataGenerator(real_training.train, batch_size=batch_size)
+    ft_dev_generator = MultiHeadDataGenerator(real_training.test, batch_size=batch_size)
+    test_generator = MultiHeadDataGenerator(real_validation.test, batch_size=batch_size, shuffle=False)
+
+    print("Creating model..")
+    model, inference_model = build_model(train_generator.num_classes)
+    model.compile(
+        loss={
+            "digit": keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+            "empty": keras.losses.BinaryCrossentropy(from_logits=True),
+            "hand": keras.losses.BinaryCrossentropy(from_logits=True)
+        },
+        loss_weights=loss_weights,
+        optimizer=keras.optimizers.Adadelta(learning_rate),
+        metrics={
+            "digit": ['accuracy'],
+            "empty": [keras.metrics.BinaryAccuracy(threshold=0.)],
+            "hand": [keras.metrics.BinaryAccuracy(threshold=0.)]
+        }
+    )
+    print(model.summary())
+
+    print("Training model on")
+    fit_resumable(model, train_generator, dev_generator, epochs, path + "checkpoint.train",
+                  monitor='val_digit_accuracy', config={'loss_weights': loss_weights})
+
+    print("Finetuning model")
+    fit_resumable(model, ft_train_generator, ft_dev_generator, ft_epochs, path + "checkpoint.ft",
+                  monitor='val_digit_accuracy', config={'loss_weights': loss_weights})
+
+    print("Saving keras model")
+    models.save_model(inference_model, path + "model.h5")
+
+    print("Evaluating keras model")
+    print("Test", dict(zip(model.metrics_names, model.evaluate(test_generator))))
+    convert_multihead_to_tflite(inference_model, path, test_generator)
+
+
+def convert_multihead_to_tflite(inference_model: Model, path: str, test_generator: MultiHeadDataGenerator):
+    """
+    Convert the multi-head inference model to a float and a quantized tf.lite model with three outputs and report the
+    accuracy of each head.
+
+    Args:
+        inference_model(Model): The inference model from :py:func:`build_model`.
+        path(str): The directory path for the model.
+        test_generator(MultiHeadDataGenerator): The generator for test files.
+
+    Returns:
+        None
+
+    """
+    for name, optimizations in (("model.tflite", []), ("model.quantized.tflite", [tf.lite.Optimize.DEFAULT])):
+        converter: tf.lite.TFLiteConverter = tf.lite.TFLiteConverter.from_keras_model(inference_model)
+        converter.optimizations = optimizations
+        content = converter.convert()
+        with open(path + name, "wb") as f:
+            f.write(content)
+        scores = evaluate_multihead_tflite(content, inference_model, test_generator)
+        print(f"{name}: " + ", ".join(f"{head} accuracy {score.accuracy:0.04f}" for head, score in scores.items()))
+
+
+def evaluate_multihead_tflite(
+        tflite_model_content: bytes,
+        inference_model: Model,
+        test_generator: MultiHeadDataGenerator
+) -> Dict[str, ConfusionMatrix]:
+    """
+    Evaluate each head of a multi-head tf.lite model batch by batch.
+
+    The converter does not keep the output order of the Keras model, so the interpreter outputs are matched to the heads
+    by comparing them with the Keras model's outputs on the first batch.
+
+    Args:
+        tflite_model_content(bytes): The tf.lite model content.
+        inference_model(Model): The Keras inference model the tf.lite model was converted from.
+        test_generator(MultiHeadDataGenerator): The generator for test files.
+
+    Returns:
+        dict[str, ConfusionMatrix]: The confusion matrix of each head.
+
+    """
+    interpreter = create_interpreter(tflite_model_content, available_cpus())
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()
+    confusions = {"digit": ConfusionMatrix(test_generator.num_classes), "empty": ConfusionMatrix(2),
+                  "hand": ConfusionMatrix(2)}
+
+    order: List[int] = []
+    for index in range(len(test_generator)):
+        x, y = test_generator[index]
+        interpreter.resize_tensor_input(input_details["index"], list(x.shape))
+        interpreter.allocate_tensors()
+        interpreter.set_tensor(input_details["index"], quantize_input(x, input_details))
+        interpreter.invoke()
+        outputs = [dequantize_output(interpreter.get_tensor(details["index"]), details) for details in output_details]
+        if not order:
+            order = _match_outputs(outputs, [np.asarray(output) for output in inference_model.predict_on_batch(x)])
+
+        digit, empty, hand = (outputs[i] for i in order)
+        confusions["digit"].update(y["digit"], np.argmax(digit, axis=-1))
+        confusions["empty"].update(y["empty"], empty.reshape(-1) >= 0.5)
+        confusions["hand"].update(y["hand"], hand.reshape(-1) >= 0.5)
+    return confusions
+
+
+def _match_outputs(outputs: List[np.ndarray], expected: List[np.ndarray]) -> List[int]:
+    """
+    Helper function to find the interpreter output of each Keras model output.
+
+    Args:
+        outputs(list[:py:class:`numpy.ndarray`]): The interpreter outputs.
+        expected(list[:py:class:`numpy.ndarray`]): The Keras model outputs.
+
+    Returns:
+        list[int]: The index of the interpreter output for each Keras model output.
+
+    """
+    order = []
+    for target in expected:
+        candidates = [i for i, output in enumerate(outputs) if output.shape == target.shape and i not in order]
+        order.append(min(candidates, key=lambda i: float(np.abs(outputs[i] - target).mean())))
+    return order
+
+
+if __name__ == '__main__':
+    tf.get_logger().setLevel('ERROR')
+    configure_devices()
+    train_multihead("model_multihead/")